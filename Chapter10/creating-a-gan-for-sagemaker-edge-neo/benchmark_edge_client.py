@@ -0,0 +1,87 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from edge_client import EdgeClient, EdgeConnection
+from edge_server import EdgeServer, load_runtime
+
+# Requests/sec and latency of the original JSON exchange (one connection per inference)
+# against the binary protocol over new, pooled and batched connections, all served by the
+# local stand-in server.
+
+
+def measure(label, count, call, images_per_call=1, threads=1):
+    latencies = []
+
+    def timed(i):
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(count):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(timed, range(count)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    rate = count * images_per_call / elapsed
+    print(f"{label:<40} {rate:9.0f} images/sec  p50={p50 * 1000:7.3f}ms  p99={p99 * 1000:7.3f}ms")
+    return rate
+
+
+def one_shot_json(path, latent):
+    connection = EdgeConnection(path)
+    try:
+        return connection.infer_json(latent)
+    finally:
+        connection.close()
+
+
+def one_shot_binary(path, latent):
+    connection = EdgeConnection(path)
+    try:
+        return connection.infer(latent)[0]
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--model', type=str, default=None, help=".pt/.onnx artifact or gan_generator.pth")
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    latents = np.random.default_rng(0).standard_normal((args.requests, 100), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'edge.sock')
+        server = EdgeServer(load_runtime(args.model), path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        expected = one_shot_json(path, latents[0])
+        assert np.allclose(expected, one_shot_binary(path, latents[0]), atol=1e-6)
+
+        n = args.requests
+        baseline = measure("JSON, connection per request", n, lambda i: one_shot_json(path, latents[i]))
+        measure("binary, connection per request", n, lambda i: one_shot_binary(path, latents[i]))
+        with EdgeClient(path, pool_size=args.threads) as client:
+            measure("JSON, pooled connection", n, lambda i: client.infer_json(latents[i]))
+            pooled = measure("binary, pooled connection", n, lambda i: client.infer(latents[i]))
+            batched = measure(f"binary, batch of {args.batch_size}", n // args.batch_size,
+                              lambda i: client.infer_batch(latents[i * args.batch_size:(i + 1) * args.batch_size]),
+                              images_per_call=args.batch_size)
+            measure(f"binary, pooled, {args.threads} threads", n, lambda i: client.infer(latents[i]),
+                    threads=args.threads)
+        print(f"pooled binary {pooled / baseline:.1f}x and batched {batched / baseline:.1f}x the JSON path")
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from gan_mnist import Generator
+from generator_export import BatchingServer, GeneratorRuntime, export_all, fidelity, load_generator
+
+# Latency per image and images/sec of the original generator and every exported artifact
+# for batch sizes 1 to 256, plus output fidelity against the original model.
+
+
+def untrained_generator(latent_dim):
+    # Random weights with BatchNorm statistics from a few train-mode batches, so folding has
+    # something non-trivial to fold
+    generator = Generator(latent_dim)
+    with torch.no_grad():
+        for _ in range(20):
+            generator(torch.randn(256, latent_dim))
+    return generator.eval()
+
+
+def throughput(runtime, latents, batch_size, min_seconds):
+    batch = latents[:batch_size]
+    runtime.generate(batch)
+    runs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        runtime.generate(batch)
+        runs += 1
+    elapsed = time.perf_counter() - start
+    return elapsed / (runs * batch_size) * 1000, runs * batch_size / elapsed
+
+
+def served(runtime, latents, clients):
+    server = BatchingServer(runtime)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(lambda z: server.submit(z).result(), latents))
+    return len(latents) / (time.perf_counter() - start), server.batches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-dir', type=str, default=None, help="Directory with gan_generator.pth")
+    parser.add_argument('--latent_dim', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=0.5, help="Minimum time per measurement")
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads)
+    if args.model_dir:
+        generator = load_generator(os.path.join(args.model_dir, 'gan_generator.pth'), args.latent_dim)
+    else:
+        generator = untrained_generator(args.latent_dim)
+
+    latents = np.random.default_rng(0).standard_normal((256, args.latent_dim), dtype=np.float32)
+    batch_sizes = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+    with tempfile.TemporaryDirectory() as output_dir:
+        runtimes = {'eager fp32': GeneratorRuntime.from_model(generator)}
+        paths = export_all(generator, output_dir, args.latent_dim)
+        for name, path in paths.items():
+            runtimes[name] = GeneratorRuntime(path, threads=args.threads)
+
+        reference = runtimes['eager fp32'].generate(latents)
+        print(f"{'runtime':<17} {'max_abs':>8} {'mean_abs':>9} {'psnr':>8}")
+        for name, runtime in runtimes.items():
+            result = fidelity(reference, runtime.generate(latents))
+            print(f"{name:<17} {result['max_abs']:8.5f} {result['mean_abs']:9.6f} {result['psnr_db']:6.1f}dB")
+
+        print(f"\n{'ms/image':<17}" + "".join(f"{b:>9}" for b in batch_sizes))
+        rates = {}
+        for name, runtime in runtimes.items():
+            results = [throughput(runtime, latents, b, args.seconds) for b in batch_sizes]
+            rates[name] = [rate for _, rate in results]
+            print(f"{name:<17}" + "".join(f"{latency:9.4f}" for latency, _ in results))
+        print(f"\n{'images/sec':<17}" + "".join(f"{b:>9}" for b in batch_sizes))
+        for name, values in rates.items():
+            print(f"{name:<17}" + "".join(f"{rate:9.0f}" for rate in values))
+
+        fastest = max(rates, key=lambda name: rates[name][-1])
+        rate, batches = served(runtimes[fastest], latents, clients=32)
+        print(f"\nBatchingServer({fastest}), 256 single-image requests from 32 threads: "
+              f"{rate:.0f} images/sec in {batches} batches")
@@ -0,0 +1,59 @@
+import argparse
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+# Trains gan_mnist.py for one epoch per configuration and reports samples/sec at 1, 4 and
+# all cores. MNIST is replaced by random digits written in the same idx format, so
+# torchvision finds the files and nothing is downloaded.
+
+
+def write_synthetic_mnist(data_dir, count):
+    raw = os.path.join(data_dir, 'MNIST', 'raw')
+    os.makedirs(raw, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for prefix, n in (('train', count), ('t10k', 1000)):
+        images = rng.integers(0, 256, (n, 28, 28), dtype=np.uint8)
+        labels = rng.integers(0, 10, n, dtype=np.uint8)
+        with open(os.path.join(raw, f'{prefix}-images-idx3-ubyte'), 'wb') as f:
+            f.write(struct.pack('>IIII', 0x803, n, 28, 28) + images.tobytes())
+        with open(os.path.join(raw, f'{prefix}-labels-idx1-ubyte'), 'wb') as f:
+            f.write(struct.pack('>II', 0x801, n) + labels.tobytes())
+
+
+def run(data_dir, *options):
+    command = [sys.executable, 'gan_mnist.py', '--n_epochs', '1', '--data-dir', data_dir, *options]
+    output = subprocess.run(command, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return float(re.findall(r'\[(\d+) samples/sec\]', output)[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=12800)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--compile', action='store_true')
+    args = parser.parse_args()
+
+    cores = sorted({1, 4, os.cpu_count()})
+    print(f"{os.cpu_count()} cores available; configurations above that are oversubscribed")
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_synthetic_mnist(data_dir, args.samples)
+        batch = ['--batch_size', str(args.batch_size)]
+        baseline = run(data_dir, '--threads', '1', *batch)
+        print(f"{'DataLoader + transforms, 1 thread':<40} {baseline:8.0f} samples/sec")
+        result = run(data_dir, '--threads', '1', '--num_workers', '2', *batch)
+        print(f"{'DataLoader, 2 workers, 1 thread':<40} {result:8.0f} samples/sec")
+        extra = ['--compile'] if args.compile else []
+        for n in cores:
+            result = run(data_dir, '--fast', '--threads', str(n), *batch, *extra)
+            print(f"{f'--fast, {n} thread(s)':<40} {result:8.0f} samples/sec ({result / baseline:.1f}x)")
+        for n in cores:
+            if n > 1:
+                result = run(data_dir, '--fast', '--nprocs', str(n), *batch, *extra)
+                print(f"{f'--fast, DDP gloo x{n}':<40} {result:8.0f} samples/sec ({result / baseline:.1f}x)")
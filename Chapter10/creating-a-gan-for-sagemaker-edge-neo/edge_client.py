@@ -0,0 +1,152 @@
+import json
+import queue
+import socket
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+# Client for the edge inference socket. The binary protocol frames every message with a fixed
+# little-endian header followed by the raw float32 tensor, so latents and images are sent and
+# received without any encoding step:
+#   request:  magic, model name length, reserved, batch, latent dim | model name | float32 latents
+#   response: magic, status, reserved, rows, columns | float32 images (status 0)
+#                                                    | utf-8 error of `columns` bytes (status 1)
+# The legacy JSON protocol of the original example (native-endian length prefix, latin1
+# encoded tensor) is kept in infer_json for agents that only speak that.
+
+SOCKET_PATH = '/tmp/sagemaker_edge_agent_example.sock'
+MODEL_NAME = 'gan-mnist-model'
+MODEL_VERSION = '1.0'
+MAGIC = b'GAN1'
+HEADER = struct.Struct('<4sHHII')
+LEGACY_LENGTH = struct.Struct('I')
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+class EdgeInferenceError(Exception):
+    pass
+
+
+def recv_exact(sock, size, buffer=None):
+    # recv() returns whatever has arrived; keep reading until size bytes are in the buffer
+    buffer = buffer if buffer is not None else bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:size])
+        if count == 0:
+            raise ConnectionError(f"Connection closed after {received} of {size} bytes")
+        received += count
+    return buffer
+
+
+def send_buffers(sock, buffers):
+    # Scatter/gather send of the header and the tensor memory, finishing any partial write
+    views = [memoryview(b).cast('B') for b in buffers]
+    total = sum(len(v) for v in views)
+    sent = sock.sendmsg(views)
+    if sent < total:
+        data = b"".join(bytes(v) for v in views)
+        sock.sendall(data[sent:])
+
+
+class EdgeConnection:
+    def __init__(self, path=SOCKET_PATH, timeout=10.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def infer(self, latents, model_name=MODEL_NAME):
+        # latents: float32 array (batch, latent_dim); returns (batch, image_size) float32
+        latents = np.ascontiguousarray(latents, dtype=np.float32)
+        if latents.ndim == 1:
+            latents = latents[None, :]
+        name = model_name.encode('utf-8')
+        header = HEADER.pack(MAGIC, len(name), 0, latents.shape[0], latents.shape[1])
+        send_buffers(self.sock, [header, name, latents])
+
+        magic, status, _, rows, columns = HEADER.unpack(recv_exact(self.sock, HEADER.size))
+        if magic != MAGIC:
+            raise EdgeInferenceError(f"Unexpected response header {magic!r}")
+        if status != STATUS_OK:
+            raise EdgeInferenceError(recv_exact(self.sock, columns).decode('utf-8'))
+        buffer = recv_exact(self.sock, rows * columns * 4)
+        return np.frombuffer(buffer, dtype=np.float32).reshape(rows, columns)
+
+    def infer_json(self, latent, model_name=MODEL_NAME, model_version=MODEL_VERSION):
+        request = {
+            "model_name": model_name,
+            "model_version": model_version,
+            "input_tensor": np.ascontiguousarray(latent, dtype=np.float32).tobytes().decode('latin1')
+        }
+        request_bytes = json.dumps(request).encode('utf-8')
+        self.sock.sendall(LEGACY_LENGTH.pack(len(request_bytes)) + request_bytes)
+        response_length = LEGACY_LENGTH.unpack(recv_exact(self.sock, LEGACY_LENGTH.size))[0]
+        response = json.loads(recv_exact(self.sock, response_length).decode('utf-8'))
+        if 'error' in response:
+            raise EdgeInferenceError(response['error'])
+        return np.asarray(response['outputs'], dtype=np.float32)
+
+    def close(self):
+        self.sock.close()
+
+
+class EdgeClient:
+    # Keeps up to pool_size persistent connections; each call borrows one, so the client can
+    # be shared between threads. A connection that fails mid-request is discarded.
+    def __init__(self, path=SOCKET_PATH, pool_size=4, timeout=10.0, model_name=MODEL_NAME):
+        self.path = path
+        self.timeout = timeout
+        self.model_name = model_name
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = EdgeConnection(self.path, self.timeout)
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def infer(self, latent):
+        # One latent vector -> one image
+        with self.connection() as connection:
+            return connection.infer(latent, self.model_name)[0]
+
+    def infer_batch(self, latents, batch_size=64):
+        # Many latents per request; returns (len(latents), image_size)
+        latents = np.ascontiguousarray(latents, dtype=np.float32)
+        # The image size comes from the agent's response, so an empty batch has no shape to return
+        if latents.ndim != 2 or len(latents) == 0:
+            raise ValueError(f"infer_batch needs a non-empty (batch, latent_dim) array, got shape {latents.shape}")
+        with self.connection() as connection:
+            parts = [connection.infer(latents[i:i + batch_size], self.model_name)
+                     for i in range(0, len(latents), batch_size)]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def infer_json(self, latent):
+        with self.connection() as connection:
+            return connection.infer_json(latent, self.model_name)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,44 +1,28 @@
+import os
 import numpy as np
-import json
-import socket
-import struct
 import matplotlib.pyplot as plt
 
-# Generate a random latent vector
-input_data = np.random.randn(1, 100).astype('float32')
-
-# Serialize input data
-payload = input_data.tobytes()
-
-# Send data to the agent over Unix socket
-sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-sock.connect('/tmp/sagemaker_edge_agent_example.sock')
+from edge_client import SOCKET_PATH, EdgeClient
 
-# Send inference request
-request = {
-    "model_name": "gan-mnist-model",
-    "model_version": "1.0",
-    "input_tensor": payload.decode('latin1')  # Decode to handle bytes in JSON
-}
+# EDGE_PROTOCOL=json speaks the agent's original JSON framing; binary needs an agent or the
+# edge_server.py stand-in that understands the framed float32 protocol
+PROTOCOL = os.environ.get('EDGE_PROTOCOL', 'json')
 
-request_bytes = json.dumps(request).encode('utf-8')
-message_length = struct.pack('I', len(request_bytes))
-sock.sendall(message_length + request_bytes)
+# Generate a random latent vector
+input_data = np.random.randn(1, 100).astype('float32')
 
-# Receive response
-response_length_bytes = sock.recv(4)
-response_length = struct.unpack('I', response_length_bytes)[0]
-response_bytes = sock.recv(response_length)
-response = json.loads(response_bytes.decode('utf-8'))
+# Send the inference request to the agent over the Unix socket and read the full response
+with EdgeClient(os.environ.get('EDGE_SOCKET', SOCKET_PATH)) as client:
+    if PROTOCOL == 'binary':
+        outputs = client.infer(input_data[0])
+    else:
+        outputs = client.infer_json(input_data[0])
 
 # Extract generated image
-generated_image = np.array(response['outputs']).reshape(28, 28)
+generated_image = np.array(outputs).reshape(28, 28)
 
 # Display the image
 plt.imshow(generated_image, cmap='gray')
 plt.title('Generated Image')
 plt.axis('off')
 plt.show()
-
-# Close the socket connection
-sock.close()
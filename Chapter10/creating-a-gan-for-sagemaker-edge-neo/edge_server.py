@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import socketserver
+
+import numpy as np
+
+from edge_client import (HEADER, LEGACY_LENGTH, MAGIC, SOCKET_PATH, STATUS_ERROR, STATUS_OK, recv_exact,
+                         send_buffers)
+from generator_export import BatchingServer, GeneratorRuntime, load_generator
+
+# Local stand-in for the edge agent socket, serving the Generator for development and
+# benchmarks. Each connection may carry any number of requests. The first four bytes of a
+# request are the binary protocol's magic or else the legacy JSON length prefix.
+
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class EdgeRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                prefix = recv_exact(self.request, 4)
+            except ConnectionError:
+                return
+            if bytes(prefix) == MAGIC:
+                self.handle_binary(prefix)
+            else:
+                self.handle_json(prefix)
+
+    def generate(self, latents):
+        if self.server.batcher is not None:
+            return self.server.batcher.submit(latents).result()
+        return self.server.runtime.generate(latents)
+
+    def handle_binary(self, prefix):
+        header = prefix + recv_exact(self.request, HEADER.size - 4)
+        _, name_length, _, batch, latent_dim = HEADER.unpack(header)
+        recv_exact(self.request, name_length)
+        if batch * latent_dim * 4 > MAX_REQUEST_BYTES:
+            raise ConnectionError(f"Request of {batch}x{latent_dim} exceeds the size limit")
+        latents = np.frombuffer(recv_exact(self.request, batch * latent_dim * 4), dtype=np.float32)
+        try:
+            images = self.generate(latents.reshape(batch, latent_dim)).reshape(batch, -1)
+        except Exception as error:
+            message = str(error).encode('utf-8')
+            send_buffers(self.request, [HEADER.pack(MAGIC, STATUS_ERROR, 0, 0, len(message)), message])
+            return
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        send_buffers(self.request, [HEADER.pack(MAGIC, STATUS_OK, 0, *images.shape), images])
+
+    def handle_json(self, prefix):
+        length = LEGACY_LENGTH.unpack(prefix)[0]
+        if length > MAX_REQUEST_BYTES:
+            raise ConnectionError(f"Request of {length} bytes exceeds the size limit")
+        request = json.loads(recv_exact(self.request, length).decode('utf-8'))
+        try:
+            latent = np.frombuffer(request['input_tensor'].encode('latin1'), dtype=np.float32)
+            response = {'outputs': self.generate(latent.reshape(1, -1)).reshape(-1).tolist()}
+        except Exception as error:
+            response = {'error': str(error)}
+        response_bytes = json.dumps(response).encode('utf-8')
+        self.request.sendall(LEGACY_LENGTH.pack(len(response_bytes)) + response_bytes)
+
+
+class EdgeServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, runtime, path=SOCKET_PATH, batch_requests=False):
+        # batch_requests coalesces requests from concurrent connections into one model call
+        if os.path.exists(path):
+            os.unlink(path)
+        self.runtime = runtime
+        self.batcher = BatchingServer(runtime) if batch_requests else None
+        super().__init__(path, EdgeRequestHandler)
+
+
+def load_runtime(model_path, latent_dim=100):
+    # An exported artifact (.pt/.onnx), a state_dict (.pth), or untrained weights when None
+    if model_path and not model_path.endswith('.pth'):
+        return GeneratorRuntime(model_path)
+    if model_path:
+        return GeneratorRuntime.from_model(load_generator(model_path, latent_dim))
+    from gan_mnist import Generator
+
+    return GeneratorRuntime.from_model(Generator(latent_dim).eval())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the GAN generator on a Unix socket")
+    parser.add_argument('--socket', type=str, default=SOCKET_PATH)
+    parser.add_argument('--model', type=str, default=None, help=".pt/.onnx artifact or gan_generator.pth")
+    parser.add_argument('--latent_dim', type=int, default=100)
+    parser.add_argument('--batch-requests', action='store_true')
+    args = parser.parse_args()
+
+    with EdgeServer(load_runtime(args.model, args.latent_dim), args.socket, args.batch_requests) as server:
+        print(f"Serving on {args.socket}")
+        server.serve_forever()
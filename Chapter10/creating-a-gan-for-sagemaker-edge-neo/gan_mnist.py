@@ -1,9 +1,15 @@
 import argparse
+import contextlib
+import itertools
 import os
+import time
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 from torchvision import datasets, transforms
 from torch import nn, optim
-from torch.utils.data import DataLoader
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler
 
 class Generator(nn.Module):
     def __init__(self, latent_dim=100, img_shape=(1, 28, 28)):
@@ -48,18 +54,90 @@ class Discriminator(nn.Module):
         validity = self.model(img_flat)
         return validity
 
-def train(args):
+IMAGE_SHAPE = (1, 28, 28)
+
+
+def mnist_cache(data_dir):
+    # The training images decoded once into a raw uint8 file (N x 1 x 28 x 28) and memory-mapped
+    # afterwards, so epochs and worker processes share the page cache instead of running
+    # ToTensor/Normalize on every sample
+    path = os.path.join(data_dir, 'mnist_train_uint8.bin')
+    if not os.path.exists(path):
+        dataset = datasets.MNIST(data_dir, train=True, download=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        dataset.data.numpy().tofile(tmp_path)
+        os.replace(tmp_path, path)
+    image_size = IMAGE_SHAPE[0] * IMAGE_SHAPE[1] * IMAGE_SHAPE[2]
+    count = os.path.getsize(path) // image_size
+    images = torch.from_file(path, shared=True, size=count * image_size, dtype=torch.uint8)
+    return images.view(count, *IMAGE_SHAPE)
+
+class TensorLoader:
+    # Batches sliced out of the uint8 cache into preallocated float buffers. The yielded batch
+    # is overwritten by the next one. With several processes every rank takes its own stride
+    # of the same seeded permutation, like DistributedSampler.
+    def __init__(self, images, batch_size, rank=0, world_size=1, seed=0):
+        self.images = images
+        self.batch_size = batch_size
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.epoch = 0
+        self.raw = torch.empty(batch_size, *images.shape[1:], dtype=torch.uint8)
+        self.batch = torch.empty(batch_size, *images.shape[1:])
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return -(-(len(self.images) // self.world_size) // self.batch_size)
+
+    def batches(self, start=0):
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        order = torch.randperm(len(self.images), generator=generator)
+        order = order[:len(order) - len(order) % self.world_size][self.rank::self.world_size]
+        for offset in range(start * self.batch_size, len(order), self.batch_size):
+            index = order[offset:offset + self.batch_size]
+            raw = torch.index_select(self.images, 0, index, out=self.raw[:len(index)])
+            # Same values as ToTensor followed by Normalize([0.5], [0.5])
+            yield self.batch[:len(index)].copy_(raw).mul_(2 / 255).sub_(1)
+
+def epoch_batches(dataloader, start):
+    if isinstance(dataloader, TensorLoader):
+        return dataloader.batches(start)
+    return (imgs for imgs, _ in itertools.islice(dataloader, start, None))
+
+def save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+def train(args, rank=0, world_size=1):
+    if world_size > 1:
+        os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+        os.environ.setdefault('MASTER_PORT', str(args.master_port))
+        dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    threads = args.threads or (max(1, os.cpu_count() // world_size) if world_size > 1 else 0)
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(args.seed + rank)
+
     # Configure data loader
-    os.makedirs('/tmp/data', exist_ok=True)
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize([0.5], [0.5])
-    ])
-    dataset = datasets.MNIST('/tmp/data', train=True, download=True, transform=transform)
-    dataloader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True)
+    if args.fast:
+        dataloader = TensorLoader(mnist_cache(args.data_dir), args.batch_size, rank, world_size, args.seed)
+    else:
+        transform = transforms.Compose([
+            transforms.ToTensor(),
+            transforms.Normalize([0.5], [0.5])
+        ])
+        dataset = datasets.MNIST(args.data_dir, train=True, download=True, transform=transform)
+        # Seeded so a resumed run sees the same batch order
+        sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, seed=args.seed)
+        dataloader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler,
+                                num_workers=args.num_workers, persistent_workers=args.num_workers > 0)
 
     # Initialize models
-    generator = Generator()
+    generator = Generator(args.latent_dim)
     discriminator = Discriminator()
 
     # Loss function
@@ -69,38 +147,91 @@ def train(args):
     optimizer_G = optim.Adam(generator.parameters(), lr=args.lr)
     optimizer_D = optim.Adam(discriminator.parameters(), lr=args.lr)
 
-    Tensor = torch.FloatTensor
+    # Resume from the last checkpoint
+    checkpoint_path = os.path.join(args.checkpoint_dir, 'checkpoint.pth') if args.checkpoint_dir else None
+    start_epoch, start_batch = 0, 0
+    if checkpoint_path and args.resume and os.path.exists(checkpoint_path):
+        state = torch.load(checkpoint_path)
+        generator.load_state_dict(state['generator'])
+        discriminator.load_state_dict(state['discriminator'])
+        optimizer_G.load_state_dict(state['optimizer_G'])
+        optimizer_D.load_state_dict(state['optimizer_D'])
+        start_epoch, start_batch = state['epoch'], state['batch']
+        if rank == 0:
+            print(f"Resuming from {checkpoint_path} at epoch {start_epoch + 1}, batch {start_batch}")
+
+    def checkpoint(epoch, batch):
+        if checkpoint_path and rank == 0:
+            save_checkpoint(checkpoint_path, {
+                'generator': generator.state_dict(),
+                'discriminator': discriminator.state_dict(),
+                'optimizer_G': optimizer_G.state_dict(),
+                'optimizer_D': optimizer_D.state_dict(),
+                'epoch': epoch,
+                'batch': batch
+            })
 
-    for epoch in range(args.n_epochs):
-        for i, (imgs, _) in enumerate(dataloader):
-            # Adversarial ground truths
-            valid = torch.ones(imgs.size(0), 1).type(Tensor)
-            fake = torch.zeros(imgs.size(0), 1).type(Tensor)
+    g_model, d_model = generator, discriminator
+    sync_discriminator = contextlib.nullcontext
+    if world_size > 1:
+        g_model, d_model = DistributedDataParallel(generator), DistributedDataParallel(discriminator)
+        # The generator step backpropagates through the discriminator; those gradients are
+        # discarded, so there is no point all-reducing them
+        sync_discriminator = d_model.no_sync
+    if args.compile:
+        g_model, d_model = torch.compile(g_model), torch.compile(d_model)
 
-            # Configure input
-            real_imgs = imgs.type(Tensor)
+    # Adversarial ground truths and the latent batch, allocated once and sliced for a short last batch
+    valid = torch.ones(args.batch_size, 1)
+    fake = torch.zeros(args.batch_size, 1)
+    z = torch.empty(args.batch_size, args.latent_dim)
+
+    if args.checkpoint_dir and rank == 0:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    samples = 0
+    start_time = time.perf_counter()
+    for epoch in range(start_epoch, args.n_epochs):
+        (dataloader if args.fast else dataloader.sampler).set_epoch(epoch)
+        for i, real_imgs in enumerate(epoch_batches(dataloader, start_batch), start_batch):
+            n = real_imgs.size(0)
 
             # Train Generator
             optimizer_G.zero_grad()
-            z = torch.randn(imgs.size(0), args.latent_dim).type(Tensor)
-            gen_imgs = generator(z)
-            g_loss = adversarial_loss(discriminator(gen_imgs), valid)
-            g_loss.backward()
+            gen_imgs = g_model(torch.randn(n, args.latent_dim, out=z[:n]))
+            with sync_discriminator():
+                g_loss = adversarial_loss(d_model(gen_imgs), valid[:n])
+                g_loss.backward()
             optimizer_G.step()
 
-            # Train Discriminator
+            # Train Discriminator on real and generated images in one forward pass
             optimizer_D.zero_grad()
-            real_loss = adversarial_loss(discriminator(real_imgs), valid)
-            fake_loss = adversarial_loss(discriminator(gen_imgs.detach()), fake)
+            validity = d_model(torch.cat([real_imgs, gen_imgs.detach()]))
+            real_loss = adversarial_loss(validity[:n], valid[:n])
+            fake_loss = adversarial_loss(validity[n:], fake[:n])
             d_loss = (real_loss + fake_loss) / 2
             d_loss.backward()
             optimizer_D.step()
 
-        print(f"[Epoch {epoch+1}/{args.n_epochs}] [D loss: {d_loss.item()}] [G loss: {g_loss.item()}]")
+            samples += n
+            if args.checkpoint_steps and (i + 1) % args.checkpoint_steps == 0:
+                checkpoint(epoch, i + 1)
+
+        start_batch = 0
+        checkpoint(epoch + 1, 0)
+        if rank == 0:
+            throughput = samples * world_size / (time.perf_counter() - start_time)
+            print(f"[Epoch {epoch+1}/{args.n_epochs}] [D loss: {d_loss.item()}] [G loss: {g_loss.item()}] "
+                  f"[{throughput:.0f} samples/sec]")
 
     # Save the generator model
-    os.makedirs(args.model_dir, exist_ok=True)
-    torch.save(generator.state_dict(), os.path.join(args.model_dir, 'gan_generator.pth'))
+    if rank == 0 and args.model_dir:
+        os.makedirs(args.model_dir, exist_ok=True)
+        torch.save(generator.state_dict(), os.path.join(args.model_dir, 'gan_generator.pth'))
+    if world_size > 1:
+        dist.destroy_process_group()
+
+def train_worker(rank, args):
+    train(args, rank, args.nprocs)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -110,10 +241,39 @@ if __name__ == '__main__':
     parser.add_argument('--batch_size', type=int, default=64)
     parser.add_argument('--lr', type=float, default=0.0002)
     parser.add_argument('--latent_dim', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+
+    # CPU performance: --fast trains from the memory-mapped uint8 cache with the tensor loader
+    parser.add_argument('--fast', action='store_true')
+    parser.add_argument('--num_workers', type=int, default=0, help="DataLoader workers when not using --fast")
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op threads per process; 0 keeps the default")
+    parser.add_argument('--compile', action='store_true', help="Wrap both models in torch.compile")
+    parser.add_argument('--nprocs', type=int, default=1, help="DistributedDataParallel processes (gloo)")
+    parser.add_argument('--master_port', type=int, default=29500)
+
+    # Checkpointing: every --checkpoint_steps steps (0: only at the end of each epoch)
+    parser.add_argument('--checkpoint_steps', type=int, default=0)
+    parser.add_argument('--resume', action='store_true')
 
     # SageMaker parameters
     parser.add_argument('--model-dir', type=str, default=os.environ.get('SM_MODEL_DIR'))
+    parser.add_argument('--data-dir', type=str, default='/tmp/data')
+    parser.add_argument('--checkpoint-dir', type=str, default=None,
+                        help="e.g. /opt/ml/checkpoints, which SageMaker syncs to checkpoint_s3_uri")
 
     args = parser.parse_args()
 
-    train(args)
\ No newline at end of file
+    # Download and build the cache once, before any worker process reads it
+    os.makedirs(args.data_dir, exist_ok=True)
+    if args.fast:
+        mnist_cache(args.data_dir)
+    else:
+        datasets.MNIST(args.data_dir, train=True, download=True)
+
+    if 'WORLD_SIZE' in os.environ:
+        # Launched by torchrun
+        train(args, int(os.environ['RANK']), int(os.environ['WORLD_SIZE']))
+    elif args.nprocs > 1:
+        mp.spawn(train_worker, args=(args,), nprocs=args.nprocs)
+    else:
+        train(args)
@@ -0,0 +1,217 @@
+import argparse
+import copy
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+from torch import nn
+
+from gan_mnist import Generator
+
+# Turns the trained gan_generator.pth into inference artifacts: BatchNorm folded into the
+# preceding Linear layers, traced and frozen TorchScript, ONNX, and dynamically quantized
+# int8 variants of both. GeneratorRuntime serves latent -> image batches from any of them on
+# the local CPU, and BatchingServer coalesces concurrent requests into those batches.
+
+ARTIFACTS = {
+    'torchscript': 'gan_generator.pt',
+    'torchscript-int8': 'gan_generator_int8.pt',
+    'onnx': 'gan_generator.onnx',
+    'onnx-int8': 'gan_generator_int8.onnx'
+}
+
+
+def load_generator(path, latent_dim=100):
+    generator = Generator(latent_dim)
+    generator.load_state_dict(torch.load(path, map_location='cpu'))
+    return generator.eval()
+
+
+def fold_linear_bn(linear, bn):
+    # Eval-mode BatchNorm is y = (x - mean) * gamma / sqrt(var + eps) + beta, a per-feature
+    # affine map that can be applied to the Linear weight and bias directly
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    fused = nn.Linear(linear.in_features, linear.out_features)
+    with torch.no_grad():
+        fused.weight.copy_(linear.weight * scale[:, None])
+        bias = linear.bias if linear.bias is not None else torch.zeros_like(bn.running_mean)
+        fused.bias.copy_((bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+
+def fold_batchnorm(generator):
+    # Returns an eval-mode copy of the generator without BatchNorm layers
+    folded = copy.deepcopy(generator).eval()
+    layers = []
+    for layer in folded.model:
+        if isinstance(layer, nn.BatchNorm1d) and layers and isinstance(layers[-1], nn.Linear):
+            layers[-1] = fold_linear_bn(layers[-1], layer)
+        else:
+            layers.append(layer)
+    folded.model = nn.Sequential(*layers)
+    return folded
+
+
+def quantize_int8(model):
+    # Weights stored as int8, activations quantized per batch at run time
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def example_latent(latent_dim=100, batch_size=8):
+    return torch.randn(batch_size, latent_dim)
+
+
+def export_torchscript(model, path, latent_dim=100):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_latent(latent_dim))
+    traced = torch.jit.freeze(traced.eval())
+    traced.save(path)
+    return path
+
+
+def export_onnx(model, path, latent_dim=100):
+    torch.onnx.export(model, (example_latent(latent_dim),), path, input_names=['latent_vector'],
+                      output_names=['image'], dynamic_axes={'latent_vector': {0: 'batch'}, 'image': {0: 'batch'}},
+                      opset_version=17, dynamo=False)
+    return path
+
+
+def quantize_onnx(path, quantized_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def export_all(generator, output_dir, latent_dim=100, onnx=True):
+    # Writes every artifact it can; ONNX needs the onnx and onnxruntime packages
+    os.makedirs(output_dir, exist_ok=True)
+    folded = fold_batchnorm(generator)
+    paths = {
+        'torchscript': export_torchscript(folded, os.path.join(output_dir, ARTIFACTS['torchscript']), latent_dim),
+        'torchscript-int8': export_torchscript(quantize_int8(folded), os.path.join(
+            output_dir, ARTIFACTS['torchscript-int8']), latent_dim)
+    }
+    if onnx:
+        paths['onnx'] = export_onnx(folded, os.path.join(output_dir, ARTIFACTS['onnx']), latent_dim)
+        paths['onnx-int8'] = quantize_onnx(paths['onnx'], os.path.join(output_dir, ARTIFACTS['onnx-int8']))
+    return paths
+
+
+class GeneratorRuntime:
+    # Local CPU inference over one exported artifact. generate() takes float32 latents of any
+    # batch size and returns float32 images in [-1, 1], running at most max_batch at a time.
+    def __init__(self, path, max_batch=256, threads=0):
+        self.path = path
+        self.max_batch = max_batch
+        if path.endswith('.onnx'):
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+            self._run = lambda z: self.session.run(None, {'latent_vector': z})[0]
+        else:
+            if threads:
+                torch.set_num_threads(threads)
+            self.module = torch.jit.load(path, map_location='cpu').eval()
+            self._run = self._run_torchscript
+
+    @classmethod
+    def from_model(cls, model, max_batch=256):
+        # Eager or already-scripted module, e.g. the original generator for comparisons
+        runtime = cls.__new__(cls)
+        runtime.path = None
+        runtime.max_batch = max_batch
+        runtime.module = model.eval()
+        runtime._run = runtime._run_torchscript
+        return runtime
+
+    def _run_torchscript(self, z):
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(z)).numpy()
+
+    def generate(self, latents):
+        latents = np.ascontiguousarray(latents, dtype=np.float32)
+        if len(latents) <= self.max_batch:
+            return self._run(latents)
+        return np.concatenate([self._run(latents[i:i + self.max_batch])
+                               for i in range(0, len(latents), self.max_batch)])
+
+    def sample(self, count, latent_dim=100, seed=None):
+        return self.generate(np.random.default_rng(seed).standard_normal((count, latent_dim), dtype=np.float32))
+
+
+class BatchingServer:
+    # Coalesces concurrent single-image requests: the worker takes whatever is queued, waiting
+    # up to max_wait_ms for more, and runs it as one batch of at most max_batch latents
+    def __init__(self, runtime, max_batch=64, max_wait_ms=2):
+        self.runtime = runtime
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.worker = threading.Thread(target=self._serve, daemon=True)
+        self.worker.start()
+
+    def submit(self, latent):
+        # latent has shape (latent_dim,) or (n, latent_dim); the future resolves to its images
+        future = Future()
+        self.requests.put((np.atleast_2d(np.asarray(latent, dtype=np.float32)), future))
+        return future
+
+    def _serve(self):
+        while True:
+            pending = [self.requests.get()]
+            size = len(pending[0][0])
+            try:
+                while size < self.max_batch:
+                    request = self.requests.get(timeout=self.max_wait)
+                    pending.append(request)
+                    size += len(request[0])
+            except queue.Empty:
+                pass
+            try:
+                images = self.runtime.generate(np.concatenate([latent for latent, _ in pending]))
+            except Exception as error:
+                for _, future in pending:
+                    future.set_exception(error)
+                continue
+            self.batches += 1
+            offset = 0
+            for latent, future in pending:
+                future.set_result(images[offset:offset + len(latent)])
+                offset += len(latent)
+
+
+def fidelity(reference, candidate):
+    # Error of candidate images against the original model's, both in [-1, 1]
+    error = np.abs(reference - candidate)
+    mse = float(np.mean(error ** 2))
+    return {
+        'max_abs': float(error.max()),
+        'mean_abs': float(error.mean()),
+        'psnr_db': float('inf') if mse == 0 else float(10 * np.log10(4.0 / mse))
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the trained generator for CPU inference")
+    parser.add_argument('--model-dir', type=str, default=os.environ.get('SM_MODEL_DIR', '.'))
+    parser.add_argument('--output-dir', type=str, default='export')
+    parser.add_argument('--latent_dim', type=int, default=100)
+    parser.add_argument('--skip-onnx', action='store_true')
+    args = parser.parse_args()
+
+    generator = load_generator(os.path.join(args.model_dir, 'gan_generator.pth'), args.latent_dim)
+    paths = export_all(generator, args.output_dir, args.latent_dim, onnx=not args.skip_onnx)
+
+    latents = np.random.default_rng(0).standard_normal((256, args.latent_dim), dtype=np.float32)
+    reference = GeneratorRuntime.from_model(generator).generate(latents)
+    for name, path in paths.items():
+        result = fidelity(reference, GeneratorRuntime(path).generate(latents))
+        print(f"{name:<17} {path} max_abs={result['max_abs']:.5f} psnr={result['psnr_db']:.1f} dB")
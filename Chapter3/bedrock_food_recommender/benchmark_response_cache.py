@@ -0,0 +1,82 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.llms.bedrock import Bedrock
+
+import food_recommender
+from response_cache import ResponseCache, normalize_input
+from session_store import SessionStore
+
+# New users opening the chat with generic questions, then asking a follow-up. Counts model
+# calls and latency with the response cache off and on, and how many distinct replies each
+# cached question still produced.
+
+FIRST_TURNS = ["What should I eat for dinner?", "what should i eat for dinner", "Any lunch ideas?",
+               "Suggest a healthy breakfast.", "What's a good snack?", "Recommend a dessert!",
+               "What should I cook tonight?", "Ideas for a vegetarian dinner?", "Best comfort food?",
+               "Quick meal ideas?"]
+
+
+class StubBedrockRuntime:
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000.0
+        self.counter = itertools.count(1)
+        self.calls = 0
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        text = f"Suggestion #{next(self.counter)}: try a Thai green curry."
+        return {'body': io.BytesIO(json.dumps({'completions': [{'data': {'text': text}}]}).encode('utf-8'))}
+
+
+def simulate(users, concurrency, latency_ms, cache):
+    stub = StubBedrockRuntime(latency_ms)
+    food_recommender.ai21_llm = Bedrock(model_id="ai21.j2-ultra", client=stub,
+                                        model_kwargs={"maxTokens": 500, 'temperature': 1.0, 'topP': 0.9})
+    food_recommender.sessions = SessionStore(food_recommender.create_conversation)
+    food_recommender.response_cache = cache
+    rng = random.Random(5)
+    questions = rng.choices(FIRST_TURNS, weights=[1.0 / (i + 1) for i in range(len(FIRST_TURNS))], k=users)
+    replies = defaultdict(set)
+    latencies = []
+    lock = threading.Lock()
+
+    def user(i):
+        client = food_recommender.app.test_client()
+        for turn, text in enumerate((questions[i], "Something spicier, please.")):
+            start = time.perf_counter()
+            reply = client.post('/suggest_food', json={'user_input': text}).get_json()['response']
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if turn == 0:
+                    replies[normalize_input(text)].add(reply)
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(users)))
+    latencies.sort()
+    return stub.calls, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], replies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=30)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--diversity', type=int, default=3)
+    args = parser.parse_args()
+
+    calls, p50, p99, _ = simulate(args.users, args.concurrency, args.latency_ms, None)
+    print(f"cache off  model_calls={calls:<4} p50={p50:5.0f}ms p99={p99:5.0f}ms")
+    cache = ResponseCache(diversity=args.diversity)
+    calls, p50, p99, replies = simulate(args.users, args.concurrency, args.latency_ms, cache)
+    print(f"cache on   model_calls={calls:<4} p50={p50:5.0f}ms p99={p99:5.0f}ms metrics={cache.metrics()}")
+    print(f"distinct first-turn replies per question: {sorted(len(r) for r in replies.values())}")
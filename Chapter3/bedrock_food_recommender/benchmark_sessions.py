@@ -0,0 +1,84 @@
+import argparse
+import contextlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.chains import ConversationChain
+from langchain.llms.base import LLM
+from langchain.memory import ConversationBufferMemory
+
+import food_recommender
+from session_store import Session, SessionStore
+
+# 100 simulated users chatting concurrently with the Flask app, against a stub LLM whose
+# latency grows with the prompt like a hosted model's. Compares the old single shared
+# conversation with per-session bounded memories.
+
+REPLY = ("For dinner tonight I would go with a spicy Thai green curry with jasmine rice. It is "
+         "fragrant, quick to make and works well with chicken, tofu or shrimp. ") * 2
+
+
+class StubLLM(LLM):
+    base_ms: float = 150
+    per_kchar_ms: float = 40
+    prompt_chars: list = []
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prompt_chars.append(len(prompt))
+        time.sleep((self.base_ms + self.per_kchar_ms * len(prompt) / 1000) / 1000)
+        return REPLY
+
+
+def shared_conversation(llm):
+    # The previous setup: one buffer memory for everyone and no locking
+    conversation = ConversationChain(llm=llm, memory=ConversationBufferMemory(), prompt=food_recommender.prompt)
+    shared = Session('shared', conversation)
+    shared.lock = contextlib.nullcontext()
+    store = SessionStore(lambda session_id: conversation)
+    store.get = lambda session_id: shared
+    return store
+
+
+def simulate(label, store_factory, users, turns):
+    llm = StubLLM(prompt_chars=[])
+    food_recommender.ai21_llm = llm
+    food_recommender.sessions = store_factory(llm)
+    latencies = []
+    lock = threading.Lock()
+
+    def user(i):
+        client = food_recommender.app.test_client()
+        for turn in range(turns):
+            start = time.perf_counter()
+            response = client.post('/suggest_food', json={'user_input': f"User {i}, turn {turn}: what should I eat?"})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200
+            with lock:
+                latencies.append(elapsed * 1000)
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+    print(f"{label:<24} p50={pct(50):7.0f}ms p95={pct(95):7.0f}ms p99={pct(99):7.0f}ms "
+          f"mean_prompt={sum(llm.prompt_chars) / len(llm.prompt_chars):8.0f} chars "
+          f"max_prompt={max(llm.prompt_chars)} chars")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--turns', type=int, default=8)
+    args = parser.parse_args()
+
+    simulate("shared global memory", shared_conversation, args.users, args.turns)
+    simulate("per-session window", lambda llm: SessionStore(food_recommender.create_conversation),
+             args.users, args.turns)
@@ -0,0 +1,96 @@
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import logging
+import re
+import statistics
+import threading
+import time
+
+from langchain.llms.bedrock import Bedrock
+from werkzeug.serving import make_server
+
+import food_recommender
+
+# Time to first byte and total time of /suggest_food and /suggest_food_stream over real
+# HTTP, with a local Bedrock stub that produces a token every --token-ms after
+# --first-token-ms, for both the AI21 (non-streaming) and a streaming model.
+
+REPLY = ("For dinner tonight I would go with a spicy Thai green curry with jasmine rice. It is fragrant, "
+         "quick to make and works well with chicken, tofu or shrimp. Add a cucumber salad on the side.")
+
+
+class StubEventStream:
+    def __init__(self, pieces, token_seconds):
+        self.pieces = pieces
+        self.token_seconds = token_seconds
+
+    def __iter__(self):
+        for piece in self.pieces:
+            time.sleep(self.token_seconds)
+            yield {'chunk': {'bytes': json.dumps({'completion': piece}).encode('utf-8')}}
+
+
+class StubBedrockRuntime:
+    def __init__(self, first_token_ms, token_ms):
+        self.first_token = first_token_ms / 1000.0
+        self.token_seconds = token_ms / 1000.0
+        self.pieces = re.findall(r'\S+\s*', REPLY)
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None, **kwargs):
+        # Jurassic-2 answers only once the whole completion is generated
+        time.sleep(self.first_token + self.token_seconds * len(self.pieces))
+        return {'body': io.BytesIO(json.dumps({'completions': [{'data': {'text': REPLY}}]}).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, body, modelId, accept=None, contentType=None, **kwargs):
+        time.sleep(self.first_token)
+        return {'body': StubEventStream(self.pieces, self.token_seconds)}
+
+
+def timed_post(port, path, cookie):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    connection.request('POST', path, body=json.dumps({'user_input': 'What should I eat for dinner?'}),
+                       headers={'Content-Type': 'application/json', 'Cookie': cookie})
+    response = connection.getresponse()
+    response.read(1)
+    first_byte = time.perf_counter() - start
+    body = response.read()
+    total = time.perf_counter() - start
+    connection.close()
+    assert response.status == 200 and body
+    return first_byte * 1000, total * 1000
+
+
+def measure(label, port, path, repeats):
+    # Chain verbose output is discarded so it does not interleave with the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        runs = [timed_post(port, path, f"food_session={label.replace(' ', '-')}-{i}") for i in range(repeats)]
+    print(f"{label:<34} time to first byte {statistics.mean(r[0] for r in runs):7.0f} ms   "
+          f"total {statistics.mean(r[1] for r in runs):7.0f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--first-token-ms', type=float, default=400)
+    parser.add_argument('--token-ms', type=float, default=40)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    stub = StubBedrockRuntime(args.first_token_ms, args.token_ms)
+    food_recommender.ai21_llm = Bedrock(model_id="ai21.j2-ultra", client=stub,
+                                        model_kwargs={"maxTokens": 500, 'temperature': 1.0, 'topP': 0.9})
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, food_recommender.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    food_recommender.streaming_llm = None
+    measure("/suggest_food (AI21)", server.port, '/suggest_food', args.repeats)
+    measure("/suggest_food_stream (AI21)", server.port, '/suggest_food_stream', args.repeats)
+    food_recommender.streaming_llm = Bedrock(
+        model_id="anthropic.claude-instant-v1", client=stub, streaming=True,
+        model_kwargs=food_recommender.STREAM_MODEL_KWARGS['anthropic'])
+    measure("/suggest_food_stream (streaming)", server.port, '/suggest_food_stream', args.repeats)
+    server.shutdown()
@@ -1,11 +1,24 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 import boto3
+import json
 import os
-from langchain.memory import ConversationBufferMemory
+import queue
+import sys
+import threading
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.llms.bedrock import Bedrock
 from langchain.chains import ConversationChain
+from langchain.prompts import PromptTemplate
+
+from response_cache import RESPONSE_CACHE, ResponseCache, cache_key
+from session_store import SESSION_COOKIE, SESSION_IDLE_SECONDS, SessionStore, build_memory, new_session_id
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from instrumentation import VERBOSE_PROMPTS, register_flask, timer
 
 app = Flask(__name__)
+# Request timings and the per-stage histograms are served on /metrics
+register_flask(app)
 
 bedrock_runtime = boto3.client(
     service_name='bedrock-runtime',
@@ -14,15 +27,80 @@ bedrock_runtime = boto3.client(
     region_name='us-west-2'
 )
 
-context = ConversationBufferMemory()
-context.chat_memory.add_user_message("You are an AI that provides food suggestions based on preferences. Generate your own opinions and answer in a personalized way.")
-context.chat_memory.add_ai_message("I am an AI that provides food suggestions based on preferences. I will generate my own opinions when asked about food and answer in a personalized way. I will be opinionated.")
+# The persona exchange is part of the prompt, so bounded memories never evict it. Turns are
+# labelled "User:" so the same prompt also suits Claude, which reserves "Human:"
+prompt = PromptTemplate(input_variables=["history", "input"], template="""The following is a friendly conversation between a human and an AI. The AI is talkative and provides lots of specific details from its context. If the AI does not know the answer to a question, it truthfully says it does not know.
+
+Current conversation:
+User: You are an AI that provides food suggestions based on preferences. Generate your own opinions and answer in a personalized way.
+AI: I am an AI that provides food suggestions based on preferences. I will generate my own opinions when asked about food and answer in a personalized way. I will be opinionated.
+{history}
+User: {input}
+AI:""")
 
 ai21_llm = Bedrock(model_id="ai21.j2-ultra", client=bedrock_runtime)
 ai21_llm.model_kwargs = {"maxTokens": 500, 'temperature': 1.0, 'topP': 0.9}
-conversation = ConversationChain(
-     llm=ai21_llm, verbose=True, memory=context
-)
+
+# Jurassic-2 has no streaming API on Bedrock. STREAM_MODEL_ID (e.g. anthropic.claude-instant-v1)
+# names a model whose tokens /suggest_food_stream forwards as they arrive; without it the
+# stream carries the AI21 reply as a single event.
+STREAM_MODEL_ID = os.getenv('STREAM_MODEL_ID', '')
+STREAM_MODEL_KWARGS = {
+    'anthropic': {"max_tokens_to_sample": 500, 'temperature': 1.0, 'top_p': 0.9},
+    'cohere': {"max_tokens": 500, 'temperature': 1.0, 'p': 0.9},
+    'meta': {"max_gen_len": 500, 'temperature': 1.0, 'top_p': 0.9},
+}
+streaming_llm = None
+if STREAM_MODEL_ID:
+    streaming_llm = Bedrock(model_id=STREAM_MODEL_ID, client=bedrock_runtime, streaming=True,
+                            model_kwargs=STREAM_MODEL_KWARGS.get(STREAM_MODEL_ID.split('.')[0], {}))
+
+def create_conversation(session_id):
+    return ConversationChain(
+        llm=ai21_llm, verbose=VERBOSE_PROMPTS, memory=build_memory(session_id, ai21_llm), prompt=prompt
+    )
+
+# One conversation per browser session instead of one shared by every user
+sessions = SessionStore(create_conversation)
+response_cache = ResponseCache() if RESPONSE_CACHE else None
+
+class TokenQueue(BaseCallbackHandler):
+    def __init__(self):
+        self.tokens = queue.Queue()
+        self.streamed = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.streamed = True
+        self.tokens.put(token)
+
+def predict(conversation, user_input, callbacks=None):
+    # First turns carry no history, so their replies can come from the response cache
+    memory = conversation.memory
+    if response_cache is None or memory.chat_memory.messages or getattr(memory, 'moving_summary_buffer', ''):
+        with timer("llm"):
+            return conversation.predict(input=user_input, callbacks=callbacks)
+    llm = conversation.llm
+    with timer("cached_llm"):
+        response, _ = response_cache.get_or_generate(
+            cache_key(user_input, llm.model_id, llm.model_kwargs),
+            lambda: llm.invoke(prompt.format(history="", input=user_input), config={'callbacks': callbacks})
+        )
+    memory.save_context({"input": user_input}, {"response": response})
+    return response
+
+def sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def request_session():
+    # chat.html posts JSON; plain form posts are still accepted
+    payload = request.get_json(silent=True) or request.form
+    session_id = request.cookies.get(SESSION_COOKIE) or new_session_id()
+    return payload.get('user_input', ''), session_id, sessions.get(session_id)
+
+def with_session_cookie(response, session_id):
+    response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_IDLE_SECONDS, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/')
 def home():
@@ -30,10 +108,54 @@ def home():
 
 @app.route('/suggest_food', methods=['POST'])
 def suggest_food():
-    user_input = request.form.get('user_input', '')
-    conversation.verbose = True
-    response = conversation.predict(input=user_input)
-    return jsonify({"response": response})
+    user_input, session_id, session = request_session()
+    with session.lock:
+        response = predict(session.conversation, user_input)
+    return with_session_cookie(jsonify({"response": response}), session_id)
+
+@app.route('/suggest_food_stream', methods=['POST'])
+def suggest_food_stream():
+    # Server-sent events: one "data" event per token, then a "done" event with the full reply
+    user_input, session_id, session = request_session()
+    handler = TokenQueue()
+    finished = object()
+    outcome = {}
+
+    def run():
+        try:
+            with session.lock:
+                conversation = session.conversation
+                if streaming_llm is not None:
+                    conversation = ConversationChain(llm=streaming_llm, verbose=conversation.verbose,
+                                                     memory=conversation.memory, prompt=prompt)
+                outcome['response'] = predict(conversation, user_input, callbacks=[handler])
+        except Exception as error:
+            outcome['error'] = str(error)
+        finally:
+            handler.tokens.put(finished)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        while True:
+            token = handler.tokens.get()
+            if token is finished:
+                break
+            yield sse({"token": token})
+        if 'error' in outcome:
+            yield sse({"error": outcome['error']}, event="error")
+            return
+        if not handler.streamed:
+            yield sse({"token": outcome['response']})
+        yield sse({"response": outcome['response']}, event="done")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    return with_session_cookie(response, session_id)
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(response_cache.metrics() if response_cache is not None else {"enabled": False})
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
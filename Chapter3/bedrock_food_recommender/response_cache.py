@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Opt-in cache for first-turn suggestions, which carry no conversation history and so
+# depend only on the input and the model settings. Each key keeps up to DIVERSITY replies:
+# the first DIVERSITY requests generate fresh ones, later hits rotate through them so users
+# asking the same thing still get varied answers. Identical requests that arrive while a
+# reply is being generated wait for it instead of calling the model again.
+
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', '0') == '1'
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+RESPONSE_CACHE_DIVERSITY = int(os.getenv('RESPONSE_CACHE_DIVERSITY', '3'))
+
+
+def normalize_input(text):
+    return " ".join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def cache_key(user_input, model_id, model_kwargs):
+    material = json.dumps([normalize_input(user_input), model_id, model_kwargs], sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, ttl_seconds=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE,
+                 diversity=RESPONSE_CACHE_DIVERSITY, clock=time.monotonic):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.diversity = max(1, diversity)
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+
+    def get_or_generate(self, key, generate):
+        # Returns (response, outcome) with outcome one of hits, misses, coalesced
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry['created'] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None and len(entry['responses']) >= self.diversity:
+                self._entries.move_to_end(key)
+                response = entry['responses'][entry['next'] % len(entry['responses'])]
+                entry['next'] += 1
+                self.stats['hits'] += 1
+                return response, 'hits'
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            return future.result(), 'coalesced'
+        try:
+            response = generate()
+        except BaseException as error:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {'created': self.clock(), 'responses': [], 'next': 0}
+            entry['responses'].append(response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        future.set_result(response)
+        return response, 'misses'
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+            served = self.stats['hits'] + self.stats['coalesced']
+            return dict(self.stats, entries=len(self._entries), hit_rate=served / lookups if lookups else 0.0)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain.memory import ChatMessageHistory, ConversationBufferWindowMemory, ConversationSummaryBufferMemory
+
+# Conversation state per browser session. Each session keeps a bounded memory (the last
+# MEMORY_WINDOW exchanges, or a running summary plus recent turns when MEMORY_POLICY=summary)
+# and its own lock, so one user's requests are serialized while different users run in
+# parallel. Sessions idle for SESSION_IDLE_SECONDS, or beyond MAX_SESSIONS, are evicted
+# least recently used first. With SESSION_REDIS_URL set the message history lives in Redis
+# and survives eviction and restarts.
+
+SESSION_COOKIE = 'food_session'
+MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', '1000'))
+SESSION_IDLE_SECONDS = int(os.getenv('SESSION_IDLE_SECONDS', '1800'))
+MEMORY_POLICY = os.getenv('MEMORY_POLICY', 'window')
+MEMORY_WINDOW = int(os.getenv('MEMORY_WINDOW', '4'))
+MEMORY_SUMMARY_TOKENS = int(os.getenv('MEMORY_SUMMARY_TOKENS', '400'))
+SESSION_REDIS_URL = os.getenv('SESSION_REDIS_URL', '')
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class BoundedWindowMemory(ConversationBufferWindowMemory):
+    # The window only reads the last k exchanges but the history underneath keeps every
+    # message, and LangChain serializes it on each call; drop what the window can't see
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        if isinstance(self.chat_memory, ChatMessageHistory) and len(self.chat_memory.messages) > 2 * self.k:
+            self.chat_memory.messages = self.chat_memory.messages[-2 * self.k:]
+
+
+def build_memory(session_id, llm):
+    kwargs = {'human_prefix': 'User'}
+    if SESSION_REDIS_URL:
+        from langchain.memory import RedisChatMessageHistory
+        kwargs['chat_memory'] = RedisChatMessageHistory(session_id, url=SESSION_REDIS_URL, ttl=SESSION_IDLE_SECONDS)
+    if MEMORY_POLICY == 'summary':
+        return ConversationSummaryBufferMemory(llm=llm, max_token_limit=MEMORY_SUMMARY_TOKENS, **kwargs)
+    return BoundedWindowMemory(k=MEMORY_WINDOW, **kwargs)
+
+
+class Session:
+    def __init__(self, session_id, conversation):
+        self.session_id = session_id
+        self.conversation = conversation
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    def __init__(self, create_conversation, max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS,
+                 clock=time.monotonic):
+        # create_conversation(session_id) returns the chain that serves one session
+        self.create_conversation = create_conversation
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id):
+        now = self.clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_seen = now
+                return session
+        # Chains are built outside the store lock; a concurrent first request for the same
+        # id keeps whichever session was stored first
+        session = Session(session_id, self.create_conversation(session_id))
+        session.last_seen = now
+        with self._lock:
+            session = self._sessions.setdefault(session_id, session)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+        return session
+
+    def _evict(self, now):
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_seen < self.idle_seconds:
+                break
+            del self._sessions[oldest_id]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._sessions)
@@ -1,12 +1,21 @@
 import gradio as gr
 
 import boto3
+import asyncio
 import json
-import base64
+import os
+import sys
 from botocore.config import Config
 
 import requests
-from requests.auth import HTTPBasicAuth
+
+from embedding_cache import build_embedder
+from hybrid_search import HybridSearcher
+from poster_assets import create_poster_assets
+from search_backends import create_search_backend
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from instrumentation import start_metrics_server, timed, timer
 
 elastic_url = "https://127.0.0.1:9200"
 user = "admin"
@@ -23,7 +32,13 @@ boto_cfg = Config(
 bedrock_client = boto3.client(service_name="bedrock", config=boto_cfg)
 runtime_client = boto3.client(service_name="bedrock-runtime", config=boto_cfg)
 
-def fetch_text_embedding(text_input):
+# SEARCH_BACKEND selects the OpenSearch kNN index (default) or the in-process local index
+search_backend = create_search_backend(elastic_url, user, passwd)
+
+# Posters are rendered from cached thumbnails, inlined or linked depending on POSTER_MODE
+poster_assets = create_poster_assets()
+
+def invoke_text_embedding(text_input):
     payload = json.dumps({"inputText": text_input})
 
     response = runtime_client.invoke_model(
@@ -34,16 +49,34 @@ def fetch_text_embedding(text_input):
     )
 
     response_data = json.loads(response['body'].read().decode('utf8'))
-    return response_data, text_input
+    return response_data['embedding']
+
+# Repeated queries are served from the embedding cache; concurrent misses share one upstream round
+text_embedder = build_embedder(invoke_text_embedding)
+
+def embed_text(text_input):
+    with timer("embedding"):
+        return text_embedder.embed(text_input)
+
+def fetch_text_embedding(text_input):
+    return {"embedding": embed_text(text_input)}, text_input
+
+# SEARCH_MODE=hybrid builds a BM25 index over title/plotSummary at load time; exact title
+# matches then skip the embedding call and other queries fuse lexical and vector results
+hybrid_searcher = None
+if os.environ.get("SEARCH_MODE") == "hybrid":
+    hybrid_searcher = HybridSearcher(search_backend, embed_text)
+
+async def fetch_text_embedding_async(text_input):
+    text_embedding, _ = await asyncio.to_thread(fetch_text_embedding, text_input)
+    return text_embedding['embedding']
 
 def format_result_html(result_hit):
-    image_path = "images/" + result_hit['_source']['posterPath']
-    with open(image_path, 'rb') as img_file:
-        encoded_image = base64.b64encode(img_file.read()).decode('utf-8').replace('\n', '')
+    image_src = poster_assets.image_src(result_hit['_source']['posterPath'])
 
     html_template = f"""
     <div style="display: flex; flex-direction: row; align-items: center; margin-bottom: 10px;">
-        <img src="data:image/png;base64,{encoded_image}" style="width: 150px; height: 225px; margin-right: 10px;"/>
+        <img src="{image_src}" loading="lazy" style="width: 150px; height: 225px; margin-right: 10px;"/>
         <div style="display: flex; flex-direction: column; justify-content: space-between;">
             <div style="display: flex; flex-direction: row; align-items: center; justify-content: space-between;">
                 <div style="font-size: 20px; font-weight: bold; margin-right: 10px;">{result_hit['_source']['title']}</div>
@@ -55,33 +88,40 @@ def format_result_html(result_hit):
     """
     return html_template
 
-def perform_query(input_text, num_results=1):
-    text_embedding, _ = fetch_text_embedding(input_text)
-
-    search_query = {
-        "size": num_results,
-        "query": {
-            "knn": {
-                "titan_multimodal_embedding": {
-                    "vector": text_embedding[0]['embedding'],
-                    "k": num_results
-                }
-            }
-        },
-        "_source": ["movieId", "title", "imdbMovieId", "posterPath", "plotSummary"]
-    }
-
-    search_response = requests.get(
-        f"{elastic_url}/multi-modal-embedding-index/_search",
-        auth=HTTPBasicAuth(user, passwd),
-        verify=False,
-        json=search_query
-    )
+@timed("query")
+def perform_query(input_text, num_results=1, filters=None):
+    if hybrid_searcher is not None:
+        # Hybrid search times its own embedding call; this stage includes it
+        with timer("search"):
+            hits = hybrid_searcher.search(input_text, num_results, filters)
+    else:
+        text_embedding, _ = fetch_text_embedding(input_text)
+        with timer("search"):
+            hits = search_backend.search(text_embedding['embedding'], num_results, filters)
+
+    with timer("render"):
+        html_output = ""
+        for hit in hits:
+            html_output += format_result_html(hit)
+
+    return html_output
 
-    search_results = search_response.json()
-    html_output = ""
-    for hit in search_results['hits']['hits']:
-        html_output += format_result_html(hit)
+@timed("query")
+async def perform_query_async(input_text, num_results=1, filters=None):
+    # Embedding still uses boto3, so it runs in a thread; the search itself is awaited on the pooled async client
+    if hybrid_searcher is not None:
+        with timer("search"):
+            hits = await hybrid_searcher.async_search(input_text, num_results, filters,
+                                                      embed_coro=fetch_text_embedding_async)
+    else:
+        vector = await fetch_text_embedding_async(input_text)
+        with timer("search"):
+            hits = await search_backend.async_search(vector, num_results, filters)
+
+    with timer("render"):
+        html_output = ""
+        for hit in hits:
+            html_output += format_result_html(hit)
 
     return html_output
 
@@ -92,7 +132,7 @@ interface_title = "Movie Search"
 interface_description = "Search for movies based on title or a description of the movie poster."
 
 app_interface = gr.Interface(
-    fn=perform_query,
+    fn=perform_query_async if os.environ.get("SEARCH_ASYNC") == "1" else perform_query,
     inputs=input_box,
     outputs=output_display,
     title=interface_title,
@@ -100,4 +140,8 @@ app_interface = gr.Interface(
 )
 
 if __name__ == "__main__":
-    app_interface.launch()
+    # Prometheus metrics (and /profile with PROFILE_SAMPLING=1) on METRICS_PORT; 0 disables
+    metrics_port = int(os.environ.get("METRICS_PORT", "9100"))
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    app_interface.launch(allowed_paths=[poster_assets.thumbs_dir])
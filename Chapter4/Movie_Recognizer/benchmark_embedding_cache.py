@@ -0,0 +1,79 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_cache import CachedEmbedder, MicroBatcher, StubRuntimeClient
+
+# Replays a skewed query log (popular queries repeat often) against the stub runtime client
+# and compares the uncached path with the LRU cache + micro-batching path.
+
+
+def make_fetch(client):
+    def fetch(text_input):
+        response = client.invoke_model(
+            body=json.dumps({"inputText": text_input}),
+            modelId="amazon.titan-embed-image-v1"
+        )
+        return json.loads(response['body'].read().decode('utf8'))['embedding']
+    return fetch
+
+
+def query_log(num_queries, vocabulary, skew, seed=7):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** skew for rank in range(vocabulary)]
+    queries = [f"movie poster query {i}" for i in range(vocabulary)]
+    return rng.choices(queries, weights=weights, k=num_queries)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def replay(embed_fn, queries, concurrency):
+    def timed(text_input):
+        start = time.perf_counter()
+        embed_fn(text_input)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def report(name, latencies, elapsed, upstream_calls, extra=""):
+    print(
+        f"{name:<14} p50={percentile(latencies, 50):7.2f}ms p99={percentile(latencies, 99):7.2f}ms "
+        f"mean={statistics.mean(latencies):7.2f}ms qps={len(latencies) / elapsed:8.1f} "
+        f"upstream_calls={upstream_calls} {extra}"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--vocabulary', type=int, default=300)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--cache-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    queries = query_log(args.queries, args.vocabulary, args.skew)
+
+    baseline_client = StubRuntimeClient(latency_ms=args.latency_ms)
+    latencies, elapsed = replay(make_fetch(baseline_client), queries, args.concurrency)
+    report("uncached", latencies, elapsed, baseline_client.calls)
+
+    cached_client = StubRuntimeClient(latency_ms=args.latency_ms)
+    batcher = MicroBatcher(CachedEmbedder(make_fetch(cached_client), max_entries=args.cache_size))
+    latencies, elapsed = replay(batcher.embed, queries, args.concurrency)
+    stats = batcher.stats()
+    report("cached+batched", latencies, elapsed, cached_client.calls,
+           f"hit_rate={stats['hit_rate']:.2%} coalesced={stats['coalesced']} batches={stats['batches']}")
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from hybrid_search import HybridSearcher
+from search_backends import VECTOR_FIELD, LocalVectorBackend, OpenSearchBackend, build_local_index
+
+# Replays a query log that mixes typed titles with poster descriptions and counts how many
+# Titan embedding calls the hybrid mode saves compared with the pure kNN path.
+
+WORDS = ("night city river ghost empire storm silent last garden machine winter shadow "
+         "journey star ocean crown fire secret desert train").split()
+
+
+def stub_embed(text_input, dimension=64):
+    seed = int.from_bytes(hashlib.sha256(text_input.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).normal(size=dimension).astype(np.float32).tolist()
+
+
+def catalog(count, rng):
+    for i in range(count):
+        title = " ".join(rng.sample(WORDS, 3)).title() + f" {i}"
+        plot = " ".join(rng.choices(WORDS, k=25)) + "."
+        yield f"doc-{i}", {VECTOR_FIELD: stub_embed(title + plot), "movieId": str(i), "title": title,
+                           "imdbMovieId": f"tt{i:07d}", "posterPath": f"/poster_{i}.jpg", "plotSummary": plot}
+
+
+def query_log(titles, count, title_share, rng):
+    queries = []
+    for _ in range(count):
+        if rng.random() < title_share:
+            title = rng.choice(titles)
+            # Users type titles with arbitrary case and punctuation
+            queries.append(rng.choice([title, title.lower(), title.upper() + "!"]))
+        else:
+            queries.append("a poster with " + " and ".join(rng.sample(WORDS, 3)))
+    return queries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--title-share', type=float, default=0.4)
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    index_dir = tempfile.mkdtemp(prefix="hybrid_index_")
+    try:
+        build_local_index(catalog(args.count, rng), index_dir, dimension=64)
+        backend = LocalVectorBackend(index_dir)
+
+        def embed(text_input):
+            if args.embed_latency_ms:
+                time.sleep(args.embed_latency_ms / 1000.0)
+            return stub_embed(text_input)
+
+        start = time.perf_counter()
+        searcher = HybridSearcher(backend, embed)
+        print(f"Built lexical index over {len(searcher.lexical)} documents in {time.perf_counter() - start:.2f}s")
+
+        titles = [source["title"] for source in searcher.lexical.sources]
+        queries = query_log(titles, args.queries, args.title_share, rng)
+
+        start = time.perf_counter()
+        for query in queries:
+            backend.search(embed(query), 10)
+        vector_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"vector only  embedding_calls={len(queries):<6} mean={vector_ms:.3f}ms")
+
+        start = time.perf_counter()
+        for query in queries:
+            searcher.search(query, 10)
+        hybrid_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        stats = searcher.stats()
+        saved = stats["embedding_calls_saved"] / len(queries)
+        print(f"hybrid       embedding_calls={stats['embedding_calls']:<6} mean={hybrid_ms:.3f}ms "
+              f"saved={stats['embedding_calls_saved']} ({saved:.1%})")
+
+        filtered = searcher.search("a poster with storm", 5, filters={"movieId": [str(i) for i in range(50)]})
+        print(f"pre-filtered query returned movieIds {[hit['_source']['movieId'] for hit in filtered]}")
+
+        # Title filters match whole titles exactly on both sides of the fusion, and every path
+        # rejects the same unfilterable fields
+        title = titles[7]
+        for hits in (searcher.search("a poster with storm", 5, filters={"title": title}),
+                     backend.search(embed("a poster with storm"), 5, filters={"title": title})):
+            assert [hit["_source"]["title"] for hit in hits] == [title], hits
+        terms = OpenSearchBackend("http://localhost:9200", "admin", "").build_query([0.0], 5, {"title": title})
+        assert terms["query"]["knn"][VECTOR_FIELD]["filter"]["bool"]["filter"] == [{"terms": {"title.keyword": [title]}}]
+        for search in (lambda f: searcher.search("a poster with storm", 5, f), lambda f: searcher.search(title, 5, f),
+                       lambda f: backend.search(embed(title), 5, f),
+                       lambda f: OpenSearchBackend("http://localhost:9200", "admin", "").build_query([0.0], 5, f)):
+            try:
+                search({"posterPath": "/poster_1.jpg"})
+                raise AssertionError("posterPath filter accepted")
+            except ValueError:
+                pass
+
+        # Title answers and fused answers share the RRF score scale, best first
+        for hits in (searcher.search(title, 10), searcher.search("a poster with storm", 10),
+                     asyncio.run(searcher.async_search("a poster with storm", 10))):
+            scores = [hit["_score"] for hit in hits]
+            assert scores == sorted(scores, reverse=True) and max(scores) < 0.05, scores
+        print("filters and scores consistent across title, fused and async paths: ok")
+    finally:
+        shutil.rmtree(index_dir)
@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_cache import StubRuntimeClient
+from ingest import Ingestor, Manifest, iter_catalog
+from search_client import SearchClient
+
+# Runs the ingestion pipeline against the stub embedder and a mock _bulk endpoint, then
+# reruns it to show that unchanged items are skipped from the checkpoint manifest.
+
+
+class MockBulkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    documents = {}
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        lines = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8").splitlines()
+        items = []
+        for action, source in zip(lines[0::2], lines[1::2]):
+            doc_id = json.loads(action)["index"]["_id"]
+            MockBulkHandler.documents[doc_id] = len(source)
+            items.append({"index": {"_id": doc_id, "status": 201}})
+        self._send({"took": 1, "errors": False, "items": items})
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_catalog(work_dir, count):
+    catalog_dir = os.path.join(work_dir, "movielens")
+    images_dir = os.path.join(work_dir, "images")
+    os.makedirs(catalog_dir)
+    os.makedirs(images_dir)
+    results = []
+    for i in range(count):
+        with open(os.path.join(images_dir, f"poster_{i}.jpg"), "wb") as f:
+            f.write(os.urandom(2048))
+        results.append({"movie": {"movieId": str(i), "imdbMovieId": f"tt{i:07d}", "title": f"Movie {i}",
+                                  "plotSummary": f"Plot of movie {i}.", "posterPath": f"/poster_{i}.jpg"}})
+    with open(os.path.join(catalog_dir, "catalog.json"), "w") as f:
+        json.dump({"data": {"searchResults": results}}, f)
+    return catalog_dir, images_dir
+
+
+def run(label, catalog_dir, images_dir, manifest_path, base_url, workers, chunk_size, latency_ms):
+    ingestor = Ingestor(StubRuntimeClient(latency_ms=latency_ms), SearchClient(base_url, "admin", "admin"),
+                        Manifest(manifest_path), images_dir=images_dir, workers=workers, chunk_size=chunk_size)
+    ingestor.ensure_index()
+    start = time.perf_counter()
+    stats = ingestor.run(iter_catalog(catalog_dir))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} workers={workers:<3} {stats['seen'] / elapsed:9.1f} items/sec {stats}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--embed-latency-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBulkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    work_dir = tempfile.mkdtemp(prefix="ingest_")
+    try:
+        catalog_dir, images_dir = make_catalog(work_dir, args.count)
+        for workers in args.workers:
+            manifest_path = os.path.join(work_dir, f"manifest_{workers}.sqlite3")
+            run("full ingest", catalog_dir, images_dir, manifest_path, base_url, workers, args.chunk_size,
+                args.embed_latency_ms)
+        run("incremental rerun", catalog_dir, images_dir, manifest_path, base_url, args.workers[-1],
+            args.chunk_size, args.embed_latency_ms)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir)
@@ -0,0 +1,87 @@
+import argparse
+import base64
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from poster_assets import PosterAssets, generate_thumbnails
+
+# Compares response size and render time of the original full-size inline posters with
+# cached inline thumbnails and URL mode, using synthetic w500 posters.
+
+
+def render(hits, image_src):
+    html_output = ""
+    for hit in hits:
+        html_output += f"""
+    <div style="display: flex; flex-direction: row; align-items: center; margin-bottom: 10px;">
+        <img src="{image_src(hit['_source']['posterPath'])}" style="width: 150px; height: 225px; margin-right: 10px;"/>
+        <div style="font-size: 20px; font-weight: bold;">{hit['_source']['title']}</div>
+        <div style="font-size: 15px;">{hit['_source']['plotSummary']}</div>
+    </div>
+    """
+    return html_output
+
+
+def legacy_image_src(images_dir):
+    def image_src(poster_path):
+        with open(os.path.join(images_dir, poster_path.lstrip("/")), 'rb') as img_file:
+            encoded_image = base64.b64encode(img_file.read()).decode('utf-8').replace('\n', '')
+        return f"data:image/png;base64,{encoded_image}"
+    return image_src
+
+
+def make_posters(images_dir, count):
+    rng = np.random.default_rng(0)
+    os.makedirs(images_dir, exist_ok=True)
+    hits = []
+    for i in range(count):
+        pixels = rng.integers(0, 255, size=(750, 500, 3), dtype=np.uint8)
+        # Smooth the noise so the JPEG size is closer to a real poster
+        pixels = (pixels // 32 * 32).astype(np.uint8)
+        Image.fromarray(pixels).save(os.path.join(images_dir, f"poster_{i}.jpg"), "JPEG", quality=90)
+        hits.append({"_score": 0.5, "_source": {"posterPath": f"/poster_{i}.jpg", "title": f"Movie {i}",
+                                                "plotSummary": "A plot summary."}})
+    return hits
+
+
+def measure(hits, image_src, repeats):
+    render(hits, image_src)  # warm up caches
+    start = time.perf_counter()
+    for _ in range(repeats):
+        html_output = render(hits, image_src)
+    return len(html_output.encode("utf-8")), (time.perf_counter() - start) * 1000 / repeats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-results', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="posters_")
+    try:
+        images_dir = os.path.join(work_dir, "images")
+        thumbs_dir = os.path.join(work_dir, "thumbnails")
+        all_hits = make_posters(images_dir, max(args.num_results))
+
+        start = time.perf_counter()
+        generated = generate_thumbnails(images_dir, thumbs_dir)
+        print(f"Generated {generated} thumbnails in {time.perf_counter() - start:.2f}s")
+
+        modes = {
+            "original": legacy_image_src(images_dir),
+            "thumb-inline": PosterAssets(images_dir, thumbs_dir, mode="inline").image_src,
+            "thumb-url": PosterAssets(images_dir, thumbs_dir, mode="url").image_src,
+        }
+        for num_results in args.num_results:
+            hits = all_hits[:num_results]
+            for name, image_src in modes.items():
+                size, elapsed_ms = measure(hits, image_src, args.repeats)
+                print(f"num_results={num_results:<3} {name:<13} response={size / 1024:9.1f} KiB render={elapsed_ms:8.3f}ms")
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,77 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from search_backends import VECTOR_FIELD, LocalVectorBackend, build_local_index, matches_filters
+
+# Builds a synthetic catalog with clustered vectors (real poster embeddings are far from
+# uniform) and measures recall@k and latency of the IVF search against brute force.
+
+
+def synthetic_documents(count, dimension, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    for i in range(count):
+        vector = centers[i % clusters] + 0.35 * rng.normal(size=dimension).astype(np.float32)
+        yield f"doc-{i}", {
+            VECTOR_FIELD: vector.tolist(),
+            "movieId": str(i),
+            "title": f"Movie {i}",
+            "imdbMovieId": f"tt{i:07d}",
+            "posterPath": f"/poster_{i}.jpg",
+            "plotSummary": f"Plot summary for movie {i}."
+        }
+
+
+def timed_search(backend, queries, k, mode):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append([hit["_id"] for hit in backend.search(query, k, mode=mode)])
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--dimension', type=int, default=1024)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    index_dir = tempfile.mkdtemp(prefix="movie_index_")
+    try:
+        start = time.perf_counter()
+        build_local_index(synthetic_documents(args.count, args.dimension, args.clusters), index_dir,
+                          dimension=args.dimension)
+        print(f"Bulk loaded {args.count} documents in {time.perf_counter() - start:.1f}s")
+
+        backend = LocalVectorBackend(index_dir)
+        rng = np.random.default_rng(1)
+        rows = rng.choice(args.count, size=args.queries, replace=False)
+        queries = backend.vectors[rows] + 0.2 * rng.normal(size=(args.queries, args.dimension)).astype(np.float32)
+
+        exact, exact_ms = timed_search(backend, queries, args.k, "exact")
+        print(f"exact          latency={exact_ms:7.2f}ms recall@{args.k}=1.0000")
+        for nprobe in args.nprobe:
+            backend.nprobe = nprobe
+            approx, approx_ms = timed_search(backend, queries, args.k, "approximate")
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)])
+            print(f"ivf nprobe={nprobe:<4} latency={approx_ms:7.2f}ms recall@{args.k}={recall:.4f}")
+
+        # Filtered search reads the in-memory filter index; its rows must match a scan of the documents
+        filters = {"movieId": [str(r) for r in rows[:50]] + ["missing"], "title": [f"Movie {r}" for r in rows[:25]]}
+        expected = [row for row, (_, source) in enumerate(backend.iter_documents()) if matches_filters(source, filters)]
+        assert backend.filter_rows(filters).tolist() == expected
+        start = time.perf_counter()
+        for query in queries:
+            backend.search(query, args.k, filters=filters)
+        print(f"filtered       latency={(time.perf_counter() - start) * 1000 / len(queries):7.2f}ms "
+              f"rows={len(expected)}")
+    finally:
+        shutil.rmtree(index_dir)
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-image-v1"
+
+
+def embedding_key(text_input, model_id=EMBEDDING_MODEL_ID):
+    # Content-addressed key: the same text for the same model always maps to the same entry
+    normalized = " ".join(text_input.split())
+    return hashlib.sha256(f"{model_id}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector):
+    return struct.pack(f"<{len(vector)}f", *vector)
+
+
+def unpack_vector(blob):
+    return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+
+class LRUEmbeddingCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteEmbeddingStore:
+    # Vectors are stored as little-endian float32 blobs so they survive restarts
+    def __init__(self, path="embeddings_cache.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        return unpack_vector(row[0]) if row else None
+
+    def put(self, key, vector):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                (key, pack_vector(vector), time.time())
+            )
+
+
+class CachedEmbedder:
+    def __init__(self, fetch_fn, max_entries=10000, disk_store=None, model_id=EMBEDDING_MODEL_ID):
+        # fetch_fn takes a text and returns the embedding vector (list of floats)
+        self.fetch_fn = fetch_fn
+        self.model_id = model_id
+        self.memory = LRUEmbeddingCache(max_entries)
+        self.disk = disk_store
+        self.disk_hits = 0
+        self.upstream_calls = 0
+        self._stats_lock = threading.Lock()
+
+    def lookup(self, text_input):
+        key = embedding_key(text_input, self.model_id)
+        vector = self.memory.get(key)
+        if vector is None and self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                with self._stats_lock:
+                    self.disk_hits += 1
+                self.memory.put(key, vector)
+        return key, vector
+
+    def store(self, key, vector):
+        self.memory.put(key, vector)
+        if self.disk is not None:
+            self.disk.put(key, vector)
+
+    def fetch_upstream(self, text_input):
+        with self._stats_lock:
+            self.upstream_calls += 1
+        return self.fetch_fn(text_input)
+
+    def embed(self, text_input):
+        key, vector = self.lookup(text_input)
+        if vector is None:
+            vector = self.fetch_upstream(text_input)
+            self.store(key, vector)
+        return vector
+
+    def stats(self):
+        lookups = self.memory.hits + self.memory.misses
+        hits = self.memory.hits + self.disk_hits
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "upstream_calls": self.upstream_calls,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.memory)
+        }
+
+
+class MicroBatcher:
+    # Requests that arrive within window_ms share one upstream round: duplicate texts (including
+    # ones already in flight) are collapsed and the unique ones are fetched concurrently.
+    def __init__(self, embedder, window_ms=10, max_batch_size=32, max_workers=8):
+        self.embedder = embedder
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._waiters = {}
+        self._queued = []
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        self.batches = 0
+        self.coalesced = 0
+
+    def submit(self, text_input):
+        key, vector = self.embedder.lookup(text_input)
+        future = Future()
+        if vector is not None:
+            future.set_result(vector)
+            return future
+
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.append(future)
+                self.coalesced += 1
+                return future
+            self._waiters[key] = [future]
+            self._queued.append((key, text_input))
+
+            if len(self._queued) >= self.max_batch_size:
+                self._flush_locked()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.window, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        return future
+
+    def embed(self, text_input):
+        return self.submit(text_input).result()
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._queued:
+            return
+        batch, self._queued = self._queued, []
+        self.batches += 1
+        for key, text_input in batch:
+            self._pool.submit(self._resolve, key, text_input)
+
+    def _resolve(self, key, text_input):
+        try:
+            vector = self.embedder.fetch_upstream(text_input)
+            self.embedder.store(key, vector)
+        except Exception as error:
+            with self._lock:
+                futures = self._waiters.pop(key)
+            for future in futures:
+                future.set_exception(error)
+            return
+        with self._lock:
+            futures = self._waiters.pop(key)
+        for future in futures:
+            future.set_result(vector)
+
+    def stats(self):
+        stats = self.embedder.stats()
+        stats.update({"batches": self.batches, "coalesced": self.coalesced})
+        return stats
+
+
+class StubRuntimeClient:
+    # Local stand-in for the bedrock-runtime client: deterministic vectors with a fixed latency
+    def __init__(self, dimension=1024, latency_ms=80):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, body, modelId, accept="application/json", contentType="application/json"):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        text_input = json.loads(body).get("inputText", "")
+        seed = hashlib.sha256(text_input.encode("utf-8")).digest()
+        embedding = [((seed[i % len(seed)] + i) % 255) / 255.0 - 0.5 for i in range(self.dimension)]
+        payload = json.dumps({"embedding": embedding, "inputTextTokenCount": len(text_input.split())})
+        return {"body": io.BytesIO(payload.encode("utf8"))}
+
+
+def build_embedder(fetch_fn):
+    # EMBEDDING_CACHE_PATH enables the on-disk store so the cache survives restarts
+    max_entries = int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000"))
+    disk_path = os.environ.get("EMBEDDING_CACHE_PATH")
+    disk_store = SqliteEmbeddingStore(disk_path) if disk_path else None
+    embedder = CachedEmbedder(fetch_fn, max_entries=max_entries, disk_store=disk_store)
+    window_ms = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "10"))
+    return MicroBatcher(embedder, window_ms=window_ms)
@@ -0,0 +1,152 @@
+import asyncio
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from search_backends import check_filters, matches_filters
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {"title": 2.0, "plotSummary": 1.0}
+RRF_K = 60
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def normalize_title(text):
+    return " ".join(tokenize(text))
+
+
+class LexicalIndex:
+    # BM25 over title and plotSummary, built once when the app loads
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.sources = []
+        self.titles = defaultdict(list)
+        self.postings = {field: defaultdict(list) for field in FIELD_WEIGHTS}
+        self.lengths = {field: [] for field in FIELD_WEIGHTS}
+
+        for doc_id, source in documents:
+            doc = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.sources.append(source)
+            self.titles[normalize_title(source.get("title"))].append(doc)
+            for field in FIELD_WEIGHTS:
+                tokens = tokenize(source.get(field))
+                self.lengths[field].append(len(tokens))
+                for term, freq in Counter(tokens).items():
+                    self.postings[field][term].append((doc, freq))
+
+        count = max(len(self.doc_ids), 1)
+        self.avg_length = {field: (sum(lengths) / count) or 1.0 for field, lengths in self.lengths.items()}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def exact_title(self, text, filters=None):
+        check_filters(filters)
+        docs = self.titles.get(normalize_title(text), [])
+        return [doc for doc in docs if not filters or matches_filters(self.sources[doc], filters)]
+
+    def search(self, text, k, filters=None):
+        check_filters(filters)
+        scores = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            postings = self.postings[field]
+            lengths = self.lengths[field]
+            for term in set(tokenize(text)):
+                docs = postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (len(self.doc_ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc, freq in docs:
+                    norm = self.k1 * (1 - self.b + self.b * lengths[doc] / self.avg_length[field])
+                    scores[doc] += weight * idf * freq * (self.k1 + 1) / (freq + norm)
+        if filters:
+            scores = {doc: score for doc, score in scores.items() if matches_filters(self.sources[doc], filters)}
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    def hit(self, doc, score):
+        return {"_id": self.doc_ids[doc], "_score": round(score, 6), "_source": self.sources[doc]}
+
+
+def reciprocal_rank_fusion(result_lists, k):
+    fused = {}
+    scores = defaultdict(float)
+    for hits in result_lists:
+        for rank, hit in enumerate(hits):
+            scores[hit["_id"]] += 1.0 / (RRF_K + rank + 1)
+            fused.setdefault(hit["_id"], hit)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return [dict(fused[doc_id], _score=round(score, 6)) for doc_id, score in ranked]
+
+
+class HybridSearcher:
+    # Exact title matches are answered from the lexical index without an embedding call;
+    # everything else fuses BM25 and vector results with reciprocal-rank fusion.
+    def __init__(self, backend, embed_fn, documents=None, candidates=20):
+        self.backend = backend
+        self.embed_fn = embed_fn
+        self.candidates = candidates
+        self.lexical = LexicalIndex(documents if documents is not None else backend.iter_documents())
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.embedding_calls = 0
+        self.embedding_calls_saved = 0
+
+    def _count(self, embedded):
+        with self._lock:
+            self.queries += 1
+            if embedded:
+                self.embedding_calls += 1
+            else:
+                self.embedding_calls_saved += 1
+
+    def _lexical_only(self, input_text, k, filters):
+        title_docs = self.lexical.exact_title(input_text, filters)
+        if not title_docs:
+            return None
+        self._count(embedded=False)
+        hits = [self.lexical.hit(doc, 0.0) for doc in title_docs[:k]]
+        if len(hits) < k:
+            seen = {hit["_id"] for hit in hits}
+            hits += [self.lexical.hit(doc, score) for doc, score in self.lexical.search(input_text, k, filters)
+                     if self.lexical.doc_ids[doc] not in seen][:k - len(hits)]
+        # Ranked title matches first, scored on the same RRF scale as fused results
+        return reciprocal_rank_fusion([hits], k)
+
+    def search(self, input_text, k, filters=None):
+        hits = self._lexical_only(input_text, k, filters)
+        if hits is not None:
+            return hits
+        self._count(embedded=True)
+        lexical_hits = [self.lexical.hit(doc, score) for doc, score in
+                        self.lexical.search(input_text, self.candidates, filters)]
+        vector_hits = self.backend.search(self.embed_fn(input_text), self.candidates, filters)
+        return reciprocal_rank_fusion([vector_hits, lexical_hits], k)
+
+    async def async_search(self, input_text, k, filters=None, embed_coro=None):
+        # embed_coro is an async embedding function; without one embed_fn runs in a thread
+        hits = self._lexical_only(input_text, k, filters)
+        if hits is not None:
+            return hits
+        self._count(embedded=True)
+        lexical_hits = [self.lexical.hit(doc, score) for doc, score in
+                        self.lexical.search(input_text, self.candidates, filters)]
+        if embed_coro is not None:
+            vector = await embed_coro(input_text)
+        else:
+            vector = await asyncio.to_thread(self.embed_fn, input_text)
+        vector_hits = await self.backend.async_search(vector, self.candidates, filters)
+        return reciprocal_rank_fusion([vector_hits, lexical_hits], k)
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "embedding_calls": self.embedding_calls,
+            "embedding_calls_saved": self.embedding_calls_saved
+        }
@@ -0,0 +1,206 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+
+from embedding_cache import EMBEDDING_MODEL_ID, StubRuntimeClient
+from search_backends import INDEX_NAME, VECTOR_FIELD
+from search_client import SearchClient
+
+INDEX_MAPPING = {
+    "settings": {"index.knn": True},
+    "mappings": {
+        "properties": {
+            VECTOR_FIELD: {"type": "knn_vector", "dimension": 1024},
+            "title": {"type": "text"},
+            "plotSummary": {"type": "text"},
+            "movieId": {"type": "keyword"},
+            "imdbMovieId": {"type": "keyword"},
+            "posterPath": {"type": "text"},
+        }
+    }
+}
+
+
+def iter_catalog(catalog_dir):
+    # Same layout the data prep notebook reads: movielens/*.json with data.searchResults[].movie
+    for movie_file in sorted(f for f in os.listdir(catalog_dir) if f.endswith('.json')):
+        with open(os.path.join(catalog_dir, movie_file), 'r', encoding='utf-8') as f:
+            for result in json.load(f).get('data', {}).get('searchResults', []):
+                yield result['movie']
+
+
+def content_hash(movie, image_bytes):
+    digest = hashlib.sha256(EMBEDDING_MODEL_ID.encode("utf-8"))
+    for field in ("title", "plotSummary", "imdbMovieId", "posterPath"):
+        digest.update(b"\x00" + str(movie.get(field, "")).encode("utf-8"))
+    digest.update(b"\x00" + image_bytes)
+    return digest.hexdigest()
+
+
+class Manifest:
+    # Checkpoint of the content hash last written to the index for each movie. Rows are only
+    # committed after the bulk request for them succeeded, so a crashed run resumes cleanly.
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS indexed (movie_id TEXT PRIMARY KEY, hash TEXT NOT NULL, updated REAL NOT NULL)")
+        self.conn.commit()
+
+    def is_current(self, movie_id, digest):
+        row = self.conn.execute("SELECT hash FROM indexed WHERE movie_id = ?", (movie_id,)).fetchone()
+        return row is not None and row[0] == digest
+
+    def mark(self, entries):
+        now = time.time()
+        self.conn.executemany("INSERT OR REPLACE INTO indexed (movie_id, hash, updated) VALUES (?, ?, ?)",
+                              [(movie_id, digest, now) for movie_id, digest in entries])
+        self.conn.commit()
+
+
+class Ingestor:
+    def __init__(self, runtime_client, search_client, manifest, images_dir="images", index=INDEX_NAME,
+                 workers=8, chunk_size=200):
+        self.runtime_client = runtime_client
+        self.search_client = search_client
+        self.manifest = manifest
+        self.images_dir = images_dir
+        self.index = index
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.stats = {"seen": 0, "skipped": 0, "embedded": 0, "indexed": 0, "failed": 0}
+
+    def ensure_index(self):
+        if not self.search_client.exists(f"/{self.index}"):
+            self.search_client.request("PUT", f"/{self.index}", json=INDEX_MAPPING)
+
+    def embed(self, movie, image_bytes):
+        # Image embedding with the title, as the notebook's with_title_ embeddings
+        body = {"inputImage": base64.b64encode(image_bytes).decode('utf8'), "inputText": movie['title']}
+        response = self.runtime_client.invoke_model(
+            body=json.dumps(body),
+            modelId=EMBEDDING_MODEL_ID,
+            accept="application/json",
+            contentType="application/json"
+        )
+        return json.loads(response['body'].read().decode('utf8'))['embedding']
+
+    def prepare(self, movie):
+        with open(os.path.join(self.images_dir, movie['posterPath'].lstrip('/')), 'rb') as image_file:
+            image_bytes = image_file.read()
+        digest = content_hash(movie, image_bytes)
+        if self.manifest.is_current(movie['movieId'], digest):
+            return None
+        return movie, digest, image_bytes
+
+    def build_document(self, movie, digest, image_bytes):
+        document = {
+            VECTOR_FIELD: self.embed(movie, image_bytes),
+            "title": movie['title'],
+            "plotSummary": movie.get('plotSummary', ''),
+            "movieId": movie['movieId'],
+            "imdbMovieId": movie.get('imdbMovieId'),
+            "posterPath": movie['posterPath']
+        }
+        return movie['movieId'], digest, document
+
+    def write_chunk(self, chunk):
+        lines = []
+        for movie_id, _, document in chunk:
+            lines.append(json.dumps({"index": {"_index": self.index, "_id": movie_id}}))
+            lines.append(json.dumps(document))
+        response = self.search_client.request(
+            "POST", "/_bulk", data=("\n".join(lines) + "\n").encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        succeeded = []
+        for (movie_id, digest, _), item in zip(chunk, response.get("items", [])):
+            result = item.get("index", {})
+            if result.get("status", 500) < 300:
+                succeeded.append((movie_id, digest))
+            else:
+                self.stats["failed"] += 1
+                print(f"Failed to index {movie_id}: {result.get('error')}")
+        self.manifest.mark(succeeded)
+        self.stats["indexed"] += len(succeeded)
+
+    def run(self, movies):
+        chunk = []
+        pending = set()
+        # At most 2 * workers embeddings are in flight, so memory stays flat on large catalogs
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for movie in movies:
+                self.stats["seen"] += 1
+                try:
+                    prepared = self.prepare(movie)
+                except OSError as error:
+                    self.stats["failed"] += 1
+                    print(f"Failed to read poster for {movie.get('movieId')}: {error}")
+                    continue
+                if prepared is None:
+                    self.stats["skipped"] += 1
+                    continue
+                pending.add(pool.submit(self.build_document, *prepared))
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    chunk = self._collect(done, chunk)
+            done, _ = wait(pending)
+            chunk = self._collect(done, chunk)
+        if chunk:
+            self.write_chunk(chunk)
+        return self.stats
+
+    def _collect(self, done, chunk):
+        for future in done:
+            try:
+                chunk.append(future.result())
+                self.stats["embedded"] += 1
+            except Exception as error:
+                self.stats["failed"] += 1
+                print(f"Failed to embed: {error}")
+            if len(chunk) >= self.chunk_size:
+                self.write_chunk(chunk)
+                chunk = []
+        return chunk
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incrementally embed and bulk index the movie catalog")
+    parser.add_argument('--catalog-dir', default='movielens')
+    parser.add_argument('--images-dir', default='images')
+    parser.add_argument('--manifest', default='ingest_manifest.sqlite3')
+    parser.add_argument('--opensearch-url', default='https://127.0.0.1:9200')
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--passwd', default=os.environ.get('OPENSEARCH_PASSWORD', ''))
+    parser.add_argument('--index', default=INDEX_NAME)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--stub-embedder', action='store_true', help="Use the local stub runtime client")
+    args = parser.parse_args()
+
+    if args.stub_embedder:
+        runtime_client = StubRuntimeClient()
+    else:
+        runtime_client = boto3.client(service_name="bedrock-runtime", config=Config(
+            region_name='us-west-2',
+            signature_version='v4',
+            retries={'max_attempts': 10, 'mode': 'standard'},
+            max_pool_connections=args.workers
+        ))
+
+    search_client = SearchClient(args.opensearch_url, args.user, args.passwd,
+                                 verify=os.environ.get("OPENSEARCH_CA_CERTS", False), read_timeout=60)
+    ingestor = Ingestor(runtime_client, search_client, Manifest(args.manifest), images_dir=args.images_dir,
+                        index=args.index, workers=args.workers, chunk_size=args.chunk_size)
+    ingestor.ensure_index()
+
+    start = time.perf_counter()
+    stats = ingestor.run(iter_catalog(args.catalog_dir))
+    elapsed = time.perf_counter() - start
+    print(f"{stats} in {elapsed:.1f}s ({stats['indexed'] / elapsed if elapsed else 0:.1f} items/sec indexed)")
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+from search_backends import INDEX_NAME, OpenSearchBackend
+
+# Load test against a local mock _search endpoint: the original per-call requests.get path,
+# the pooled keep-alive session, and the asyncio client.
+
+MOCK_HITS = {"hits": {"hits": [
+    {"_id": str(i), "_score": 0.9 - i * 0.01,
+     "_source": {"movieId": str(i), "title": f"Movie {i}", "posterPath": f"/poster_{i}.jpg",
+                 "plotSummary": "A plot summary."}}
+    for i in range(10)
+]}}
+
+
+class MockSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_latency = 0.0
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server_latency:
+            time.sleep(self.server_latency)
+        body = json.dumps(MOCK_HITS).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def start_mock_server(latency_ms):
+    MockSearchHandler.server_latency = latency_ms / 1000.0
+    server = MockSearchServer(("127.0.0.1", 0), MockSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def legacy_search(base_url, vector, k):
+    # The request shape perform_query used before the search client layer
+    search_response = requests.get(
+        f"{base_url}/{INDEX_NAME}/_search",
+        auth=HTTPBasicAuth("admin", "admin"),
+        verify=False,
+        json={"size": k, "query": {"knn": {"titan_multimodal_embedding": {"vector": vector, "k": k}}}}
+    )
+    return search_response.json()['hits']['hits']
+
+
+def run_threaded(search_fn, total, concurrency, vector):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: search_fn(vector, 10), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def run_async(backend, total, concurrency, vector):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await backend.async_search(vector, 10)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--server-latency-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args.server_latency_ms)
+    vector = [0.01] * 1024
+    try:
+        rps = run_threaded(lambda v, k: legacy_search(base_url, v, k), args.requests, args.concurrency, vector)
+        print(f"legacy requests.get  {rps:9.1f} req/s (one new connection per request)")
+
+        backend = OpenSearchBackend(base_url, "admin", "admin", pool_size=args.concurrency)
+        rps = run_threaded(backend.search, args.requests, args.concurrency, vector)
+        print(f"pooled session       {rps:9.1f} req/s {backend.client.stats()}")
+
+        rps = asyncio.run(run_async(backend, args.requests, args.concurrency, vector))
+        print(f"async client         {rps:9.1f} req/s {backend.stats()['async']}")
+    finally:
+        server.shutdown()
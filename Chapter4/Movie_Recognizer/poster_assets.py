@@ -0,0 +1,105 @@
+import argparse
+import base64
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (150, 225)
+
+
+def thumbnail_name(poster_path):
+    return os.path.splitext(poster_path.lstrip("/"))[0] + ".jpg"
+
+
+def make_thumbnail(source_path, thumb_path, size=THUMBNAIL_SIZE, quality=85):
+    # Skip posters whose thumbnail is already newer than the source image
+    if os.path.exists(thumb_path) and (
+            not os.path.exists(source_path) or os.path.getmtime(thumb_path) >= os.path.getmtime(source_path)):
+        return False
+    os.makedirs(os.path.dirname(thumb_path) or ".", exist_ok=True)
+    with Image.open(source_path) as img:
+        img = img.convert("RGB").resize(size, Image.LANCZOS)
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "JPEG", quality=quality, optimize=True)
+    os.replace(tmp_path, thumb_path)
+    return True
+
+
+def generate_thumbnails(images_dir="images", thumbs_dir="thumbnails", size=THUMBNAIL_SIZE):
+    generated = 0
+    for root, _, files in os.walk(images_dir):
+        for name in files:
+            source_path = os.path.join(root, name)
+            relative = os.path.relpath(source_path, images_dir)
+            if make_thumbnail(source_path, os.path.join(thumbs_dir, thumbnail_name(relative)), size):
+                generated += 1
+    return generated
+
+
+class PosterAssets:
+    # mode="inline" embeds cached base64 thumbnails; mode="url" only emits links to the static route
+    def __init__(self, images_dir="images", thumbs_dir="thumbnails", mode="inline",
+                 url_prefix="/file=", max_entries=2048):
+        self.images_dir = images_dir
+        self.thumbs_dir = thumbs_dir
+        self.mode = mode
+        self.url_prefix = url_prefix
+        self.max_entries = max_entries
+        self._encoded = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def thumbnail_path(self, poster_path):
+        thumb_path = os.path.join(self.thumbs_dir, thumbnail_name(poster_path))
+        make_thumbnail(os.path.join(self.images_dir, poster_path.lstrip("/")), thumb_path)
+        return thumb_path
+
+    def encoded_thumbnail(self, poster_path):
+        thumb_path = self.thumbnail_path(poster_path)
+        # Keyed by path and mtime so a regenerated thumbnail is never served stale
+        key = (thumb_path, os.path.getmtime(thumb_path))
+        with self._lock:
+            encoded = self._encoded.get(key)
+            if encoded is not None:
+                self._encoded.move_to_end(key)
+                self.hits += 1
+                return encoded
+            self.misses += 1
+
+        with open(thumb_path, 'rb') as img_file:
+            encoded = base64.b64encode(img_file.read()).decode('utf-8')
+
+        with self._lock:
+            self._encoded[key] = encoded
+            while len(self._encoded) > self.max_entries:
+                self._encoded.popitem(last=False)
+        return encoded
+
+    def image_src(self, poster_path):
+        if self.mode == "url":
+            return self.url_prefix + self.thumbnail_path(poster_path)
+        return "data:image/jpeg;base64," + self.encoded_thumbnail(poster_path)
+
+
+def create_poster_assets():
+    # POSTER_MODE=url serves thumbnails from the static route instead of inlining them
+    return PosterAssets(
+        images_dir=os.environ.get("POSTER_IMAGES_DIR", "images"),
+        thumbs_dir=os.environ.get("POSTER_THUMBNAILS_DIR", "thumbnails"),
+        mode=os.environ.get("POSTER_MODE", "inline"),
+        url_prefix=os.environ.get("POSTER_URL_PREFIX", "/file="),
+        max_entries=int(os.environ.get("POSTER_CACHE_SIZE", "2048"))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-generate poster thumbnails")
+    parser.add_argument('--images-dir', default='images')
+    parser.add_argument('--thumbs-dir', default='thumbnails')
+    args = parser.parse_args()
+
+    count = generate_thumbnails(args.images_dir, args.thumbs_dir)
+    print(f"Generated {count} thumbnails in {args.thumbs_dir}")
@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+
+import numpy as np
+
+from search_client import AsyncSearchClient, SearchClient
+
+SOURCE_FIELDS = ["movieId", "title", "imdbMovieId", "posterPath", "plotSummary"]
+VECTOR_FIELD = "titan_multimodal_embedding"
+INDEX_NAME = "multi-modal-embedding-index"
+# Filters are exact keyword matches on these fields, on every backend and in the hybrid
+# lexical index. title is a text field in OpenSearch and is matched on its keyword sub-field.
+FILTER_FIELDS = ["movieId", "title", "imdbMovieId"]
+KEYWORD_FIELDS = {"title": "title.keyword"}
+
+# Every backend returns hits shaped like the OpenSearch response so format_result_html
+# can render them unchanged: {"_id": ..., "_score": ..., "_source": {field: value}}.
+# Optional filters are metadata pre-filters of the form {field: value or [values]}.
+
+
+class SearchBackend:
+    def search(self, vector, k, filters=None):
+        raise NotImplementedError
+
+    async def async_search(self, vector, k, filters=None):
+        return await asyncio.to_thread(self.search, vector, k, filters)
+
+    def iter_documents(self):
+        raise NotImplementedError
+
+
+def filter_values(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def check_filters(filters):
+    for field in filters or {}:
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on {field}; filterable fields are {FILTER_FIELDS}")
+
+
+def matches_filters(source, filters):
+    return all(source.get(field) in filter_values(value) for field, value in filters.items())
+
+
+class OpenSearchBackend(SearchBackend):
+    def __init__(self, base_url, user, passwd, index=INDEX_NAME, verify=None, pool_size=16,
+                 connect_timeout=3.05, read_timeout=10):
+        self.index = index
+        # OPENSEARCH_CA_CERTS points at the cluster CA; without it the local demo cluster's
+        # self-signed certificate is accepted as before
+        verify = verify if verify is not None else os.environ.get("OPENSEARCH_CA_CERTS", False)
+        client_args = dict(verify=verify, pool_size=pool_size, connect_timeout=connect_timeout,
+                           read_timeout=read_timeout)
+        self.client = SearchClient(base_url, user, passwd, **client_args)
+        self._async_client_args = (base_url, user, passwd, client_args)
+        self._async_client = None
+
+    def build_query(self, vector, k, filters=None):
+        knn_query = {
+            "vector": vector,
+            "k": k
+        }
+        check_filters(filters)
+        if filters:
+            # Efficient k-NN filtering: the filter is applied during the graph search, not after it
+            knn_query["filter"] = {"bool": {"filter": [
+                {"terms": {KEYWORD_FIELDS.get(field, field): filter_values(value)}} for field, value in filters.items()
+            ]}}
+        return {
+            "size": k,
+            "query": {
+                "knn": {
+                    VECTOR_FIELD: knn_query
+                }
+            },
+            "_source": SOURCE_FIELDS
+        }
+
+    def search(self, vector, k, filters=None):
+        return self.client.search(self.index, self.build_query(vector, k, filters))['hits']['hits']
+
+    async def async_search(self, vector, k, filters=None):
+        # Created lazily so the httpx client binds to the event loop that serves requests
+        if self._async_client is None:
+            base_url, user, passwd, client_args = self._async_client_args
+            self._async_client = AsyncSearchClient(base_url, user, passwd, **client_args)
+        response = await self._async_client.search(self.index, self.build_query(vector, k, filters))
+        return response['hits']['hits']
+
+    def stats(self):
+        stats = {"sync": self.client.stats()}
+        if self._async_client is not None:
+            stats["async"] = self._async_client.stats()
+        return stats
+
+    def iter_documents(self, batch_size=500, include_vectors=False):
+        # Scroll through the whole index; vectors are only needed for bulk export into a local index
+        fields = SOURCE_FIELDS + [VECTOR_FIELD] if include_vectors else SOURCE_FIELDS
+        response = self.client.request(
+            "POST", f"/{self.index}/_search?scroll=2m",
+            json={"size": batch_size, "_source": fields, "query": {"match_all": {}}}
+        )
+        while response['hits']['hits']:
+            for hit in response['hits']['hits']:
+                yield hit['_id'], hit['_source']
+            response = self.client.request(
+                "POST", "/_search/scroll",
+                json={"scroll": "2m", "scroll_id": response['_scroll_id']}
+            )
+
+
+class LocalVectorBackend(SearchBackend):
+    # Vectors live in a float32 memory-mapped matrix; an IVF (inverted file) index groups rows
+    # by their nearest k-means centroid so approximate search only scores nprobe lists.
+    def __init__(self, index_dir, mode="approximate", nprobe=8):
+        self.index_dir = index_dir
+        self.mode = mode
+        self.nprobe = nprobe
+
+        with open(os.path.join(index_dir, "index.json")) as f:
+            info = json.load(f)
+        self.count = info["count"]
+        self.dimension = info["dimension"]
+
+        self.vectors = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(self.count, self.dimension))
+        self.doc_offsets = np.load(os.path.join(index_dir, "doc_offsets.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(index_dir, "ivf_centroids.npy"))
+        self.list_order = np.load(os.path.join(index_dir, "ivf_order.npy"), mmap_mode="r")
+        self.list_offsets = np.load(os.path.join(index_dir, "ivf_offsets.npy"))
+        self._docs = open(os.path.join(index_dir, "documents.jsonl"), "rb")
+        self._docs_lock = threading.Lock()
+        self.filter_index = self._build_filter_index()
+
+    def _build_filter_index(self):
+        # {field: {value: row ids}} held in memory, so filtered queries never re-read documents.jsonl
+        index = {field: {} for field in FILTER_FIELDS}
+        for row, (_, source) in enumerate(self.iter_documents()):
+            for field, values in index.items():
+                values.setdefault(source.get(field), []).append(row)
+        return {field: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+                for field, values in index.items()}
+
+    def search(self, vector, k, filters=None, mode=None):
+        query = np.asarray(vector, dtype=np.float32)
+        if filters:
+            # Pre-filtering: only rows that pass the metadata filters are scored, exactly
+            rows, distances = self._filtered(query, k, filters)
+        elif (mode or self.mode) == "exact":
+            rows, distances = self._exact(query, k)
+        else:
+            rows, distances = self._approximate(query, k)
+        return [self._hit(row, distance) for row, distance in zip(rows, distances)]
+
+    def iter_documents(self):
+        with open(os.path.join(self.index_dir, "documents.jsonl"), "rb") as f:
+            for line in f:
+                doc_id, source = json.loads(line)
+                yield doc_id, source
+
+    def filter_rows(self, filters):
+        check_filters(filters)
+        rows = None
+        for field, value in filters.items():
+            values = self.filter_index[field]
+            field_rows = np.unique(np.concatenate([np.empty(0, dtype=np.int64)] +
+                                                  [values[v] for v in filter_values(value) if v in values]))
+            rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+        return rows
+
+    def _filtered(self, query, k, filters):
+        rows = self.filter_rows(filters)
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        return top_k(rows, squared_l2(self.vectors[rows], query), k)
+
+    def _exact(self, query, k, chunk_rows=65536):
+        best_rows = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, chunk_rows):
+            chunk = self.vectors[start:start + chunk_rows]
+            distances = squared_l2(chunk, query)
+            rows = np.arange(start, start + len(chunk))
+            best_rows, best_distances = top_k(np.concatenate([best_rows, rows]),
+                                              np.concatenate([best_distances, distances]), k)
+        return best_rows, best_distances
+
+    def _approximate(self, query, k):
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe_lists = np.argpartition(squared_l2(self.centroids, query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([
+            self.list_order[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe_lists
+        ])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        # Sorted row ids keep reads from the memory map sequential
+        candidates.sort()
+        distances = squared_l2(self.vectors[candidates], query)
+        return top_k(candidates, distances, k)
+
+    def _hit(self, row, distance):
+        with self._docs_lock:
+            self._docs.seek(int(self.doc_offsets[row]))
+            line = self._docs.readline()
+        doc_id, source = json.loads(line)
+        # Same scoring as the OpenSearch l2 space so scores are comparable across backends
+        return {"_id": doc_id, "_score": float(1.0 / (1.0 + distance)), "_source": source}
+
+
+def squared_l2(matrix, query):
+    diff = matrix - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def top_k(rows, distances, k):
+    if len(distances) > k:
+        keep = np.argpartition(distances, k - 1)[:k]
+        rows, distances = rows[keep], distances[keep]
+    order = np.argsort(distances, kind="stable")
+    return rows[order], distances[order]
+
+
+def train_centroids(vectors, nlist, iterations=10, sample_size=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        for c in range(nlist):
+            members = sample[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+def assign_lists(vectors, centroids, chunk_rows=65536):
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_rows):
+        chunk = np.asarray(vectors[start:start + chunk_rows], dtype=np.float32)
+        # |x - c|^2 = |x|^2 - 2x.c + |c|^2, and |x|^2 does not change the argmin
+        assignments[start:start + len(chunk)] = np.argmin(centroid_norms - 2.0 * chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def build_local_index(documents, index_dir, dimension=1024, nlist=None):
+    # documents yields (doc_id, source) pairs where source carries the vector field plus SOURCE_FIELDS
+    os.makedirs(index_dir, exist_ok=True)
+    doc_offsets = []
+    count = 0
+    with open(os.path.join(index_dir, "vectors.f32"), "wb") as vector_file, \
+            open(os.path.join(index_dir, "documents.jsonl"), "wb") as doc_file:
+        for doc_id, source in documents:
+            vector = np.asarray(source[VECTOR_FIELD], dtype=np.float32)
+            if vector.shape != (dimension,):
+                raise ValueError(f"Document {doc_id} has a {vector.shape} vector, expected ({dimension},)")
+            vector_file.write(vector.tobytes())
+            doc_offsets.append(doc_file.tell())
+            fields = {field: source.get(field) for field in SOURCE_FIELDS}
+            doc_file.write((json.dumps([doc_id, fields]) + "\n").encode("utf-8"))
+            count += 1
+
+    if count == 0:
+        raise ValueError("No documents to index")
+    np.save(os.path.join(index_dir, "doc_offsets.npy"), np.asarray(doc_offsets, dtype=np.int64))
+
+    vectors = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dimension))
+    nlist = nlist or max(1, min(count, int(4 * np.sqrt(count))))
+    centroids = train_centroids(vectors, nlist)
+    assignments = assign_lists(vectors, centroids)
+    order = np.argsort(assignments, kind="stable").astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).astype(np.int64)
+
+    np.save(os.path.join(index_dir, "ivf_centroids.npy"), centroids)
+    np.save(os.path.join(index_dir, "ivf_order.npy"), order)
+    np.save(os.path.join(index_dir, "ivf_offsets.npy"), offsets)
+    with open(os.path.join(index_dir, "index.json"), "w") as f:
+        json.dump({"count": count, "dimension": dimension, "nlist": nlist}, f)
+    return count
+
+
+def iter_jsonl_documents(path):
+    # One document per line, either a raw _source dict or a search hit with _id/_source
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            source = doc.get("_source", doc)
+            yield doc.get("_id", source.get("movieId", str(line_number))), source
+
+
+def create_search_backend(base_url, user, passwd):
+    # SEARCH_BACKEND=local serves queries from LOCAL_INDEX_DIR in this process
+    if os.environ.get("SEARCH_BACKEND", "opensearch") == "local":
+        return LocalVectorBackend(
+            os.environ.get("LOCAL_INDEX_DIR", "local_index"),
+            mode=os.environ.get("LOCAL_SEARCH_MODE", "approximate"),
+            nprobe=int(os.environ.get("LOCAL_SEARCH_NPROBE", "8"))
+        )
+    return OpenSearchBackend(
+        base_url, user, passwd,
+        pool_size=int(os.environ.get("SEARCH_POOL_SIZE", "16")),
+        connect_timeout=float(os.environ.get("SEARCH_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.environ.get("SEARCH_READ_TIMEOUT", "10"))
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk load movie documents into a local vector index")
+    parser.add_argument('--index-dir', default='local_index')
+    parser.add_argument('--dimension', type=int, default=1024)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--from-jsonl', help="JSONL export of documents or search hits")
+    parser.add_argument('--from-opensearch', help="Base URL of the OpenSearch cluster to export from")
+    parser.add_argument('--user', default='admin')
+    parser.add_argument('--passwd', default=os.environ.get('OPENSEARCH_PASSWORD', ''))
+    args = parser.parse_args()
+
+    if args.from_opensearch:
+        docs = OpenSearchBackend(args.from_opensearch, args.user, args.passwd).iter_documents(include_vectors=True)
+    elif args.from_jsonl:
+        docs = iter_jsonl_documents(args.from_jsonl)
+    else:
+        parser.error("one of --from-jsonl or --from-opensearch is required")
+
+    loaded = build_local_index(docs, args.index_dir, dimension=args.dimension, nlist=args.nlist)
+    print(f"Indexed {loaded} documents into {args.index_dir}")
@@ -0,0 +1,99 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+
+
+class SearchClient:
+    # One persistent session per process: keep-alive connections are pooled per host, so
+    # repeated searches skip the TCP and TLS handshakes.
+    def __init__(self, base_url, user, passwd, verify=False, pool_size=16, connect_timeout=3.05,
+                 read_timeout=10, max_retries=2):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(user, passwd)
+        self.session.verify = verify
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=Retry(total=max_retries, backoff_factor=0.1, allowed_methods=None,
+                              status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests_sent += 1
+        response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def exists(self, path):
+        with self._lock:
+            self.requests_sent += 1
+        response = self.session.head(f"{self.base_url}{path}", timeout=self.timeout)
+        return response.status_code == 200
+
+    def search(self, index, query):
+        return self.request("GET", f"/{index}/_search", json=query)
+
+    def stats(self):
+        # urllib3 counts the connections each pool had to open; everything else was a reuse
+        pools = self.adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys())
+        return {
+            "requests": self.requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(self.requests_sent - opened, 0)
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncSearchClient:
+    # asyncio variant on httpx so Gradio can await searches without holding a worker thread
+    def __init__(self, base_url, user, passwd, verify=False, pool_size=16, connect_timeout=3.05,
+                 read_timeout=10):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(user, passwd),
+            verify=verify,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+        self.requests_sent = 0
+        self.connections_opened = 0
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    async def request(self, method, path, **kwargs):
+        self.requests_sent += 1
+        response = await self.client.request(method, path, extensions={"trace": self._trace}, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def search(self, index, query):
+        return await self.request("GET", f"/{index}/_search", json=query)
+
+    def stats(self):
+        return {
+            "requests": self.requests_sent,
+            "connections_opened": self.connections_opened,
+            "connections_reused": max(self.requests_sent - self.connections_opened, 0)
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
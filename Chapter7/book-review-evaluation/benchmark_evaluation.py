@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import resource
+
+from evaluation_runner import (DATASET_PATH, BedrockEmbedder, EvaluationRunner, OutputCache, StubModelClient,
+                               iter_dataset)
+
+# Scales the 20-row dataset up to --rows unique prompts and evaluates it with the stub model:
+# a cold run through the worker pool, then a warm rerun served from the SQLite cache, and a
+# short rate-limited run to check the limiter holds its rate. BedrockEmbedder is timed on one
+# flush worth of texts against a stub client that blocks like boto3.
+
+
+class StubEmbeddingClient:
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000.0
+
+    def invoke_model(self, body, **kwargs):
+        time.sleep(self.latency)
+        text = json.loads(body)['inputText']
+        return {'body': io.BytesIO(json.dumps({'embedding': [len(text), sum(map(ord, text)) % 97, 1.0]}).encode())}
+
+
+def write_dataset(path, rows):
+    base = list(iter_dataset(DATASET_PATH))
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            row = dict(base[i % len(base)])
+            row.pop('line')
+            row['prompt'] = f"{row['prompt']} (variant {i})"
+            f.write(json.dumps(row) + "\n")
+
+
+def evaluate(dataset, cache_path, output_path, latency_ms, concurrency, rate=0.0):
+    client = StubModelClient(latency_ms=latency_ms)
+    cache = OutputCache(cache_path)
+    runner = EvaluationRunner(client, cache, concurrency=concurrency, rate=rate, output_path=output_path)
+    summary = asyncio.run(runner.run(iter_dataset(dataset)))
+    cache.close()
+    return summary, client.calls, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def time_embedder(texts, latency_ms, concurrency):
+    embedder = BedrockEmbedder(client=StubEmbeddingClient(latency_ms), concurrency=concurrency)
+    for label in ('cold', 'cached'):
+        start = time.perf_counter()
+        asyncio.run(embedder.embed_async(texts))
+        print(f"bedrock embedder {label}: {len(texts)} texts in {time.perf_counter() - start:.2f}s, "
+              f"invoke_model calls={embedder.calls}, serial calls would take {len(texts) * latency_ms / 1000:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--latency_ms', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, 'dataset.jsonl')
+        write_dataset(dataset, args.rows)
+        cache_path = os.path.join(tmp, 'cache.sqlite')
+        output = os.path.join(tmp, 'results.jsonl')
+        for label in ('cold', 'warm'):
+            summary, calls, peak = evaluate(dataset, cache_path, output, args.latency_ms, args.concurrency)
+            print(f"{label}: {summary['rows']} rows in {summary['seconds']:.1f}s = {summary['rows_per_sec']:,.0f} "
+                  f"rows/sec, model calls={calls}, cached={summary['cached']}, max RSS={peak / 1024:.0f} MiB, "
+                  f"rouge1={summary['metrics']['all']['rouge1']} cosine={summary['metrics']['all']['cosine']}")
+        sequential = args.latency_ms / 1000.0
+        print(f"sequential calls at {args.latency_ms:.0f} ms would manage {1 / sequential:,.0f} rows/sec")
+
+        limited = os.path.join(tmp, 'limited.jsonl')
+        write_dataset(limited, 200)
+        start = time.perf_counter()
+        summary, calls, _ = evaluate(limited, os.path.join(tmp, 'limited.sqlite'), None, args.latency_ms,
+                                     args.concurrency, rate=100)
+        print(f"rate limit 100/s: {calls} calls in {time.perf_counter() - start:.2f}s")
+
+    # A flush embeds batch_size outputs plus their references; references repeat across rows
+    rows = list(iter_dataset(DATASET_PATH))
+    texts = [f"output {i}" for i in range(256)] + [rows[i % len(rows)]['referenceResponse'] for i in range(256)]
+    time_embedder(texts, args.latency_ms, concurrency=16)
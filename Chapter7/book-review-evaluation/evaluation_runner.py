@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+# Local replacement for running the book review dataset through the Step Functions state
+# machine. Rows are streamed from the JSONL file, prompts whose output is not yet in the
+# SQLite cache go to the model client through a bounded pool of workers with a request rate
+# limit, and every finished batch is scored against referenceResponse with vectorized
+# ROUGE-1/ROUGE-2 F1 and embedding cosine similarity. Memory use is bounded by the queue and
+# batch sizes, not by the dataset, so 100k-row files stream through the same way as the
+# 20-row sample.
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'evaluation_dataset',
+                            'book_review_prompt_dataset.jsonl')
+MODEL_ID = 'anthropic.claude-3-sonnet-20240229-v1:0'
+EMBEDDING_DIM = 512
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+TOKEN_IDS = {}
+
+
+def iter_dataset(path):
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                row = json.loads(line)
+                row['line'] = line_number
+                yield row
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def token_id(token):
+    # Stable across runs (unlike hash()) and memoized, since the vocabulary is small
+    value = TOKEN_IDS.get(token)
+    if value is None:
+        value = TOKEN_IDS[token] = zlib.crc32(token.encode('utf-8'))
+    return value
+
+
+def bigram_ids(ids):
+    # Packs the two 32-bit token ids of each bigram into one int64
+    return (ids[:-1] << 32) | ids[1:]
+
+
+def token_ids(tokens, n=1):
+    # Integer ids of the n-grams, so counting and intersecting happen on NumPy arrays
+    ids = np.fromiter(map(token_id, tokens), dtype=np.int64, count=len(tokens))
+    return bigram_ids(ids) if n == 2 else ids
+
+
+def ngram_f1(candidate_ids, reference_ids):
+    # Clipped n-gram overlap for a whole batch: ids are mapped to a dense vocabulary so each
+    # (row, n-gram) pair becomes one int64 key, counted with np.unique and matched with
+    # np.intersect1d
+    rows = len(candidate_ids)
+    cand_lengths = [len(i) for i in candidate_ids]
+    ref_lengths = [len(i) for i in reference_ids]
+    vocab, dense = np.unique(np.concatenate(candidate_ids + reference_ids + [np.empty(0, np.int64)]),
+                             return_inverse=True)
+    size = max(len(vocab), 1)
+    row_index = np.repeat(np.tile(np.arange(rows), 2), cand_lengths + ref_lengths)
+    keys = row_index * size + dense.ravel()
+    split = sum(cand_lengths)
+    cand_keys, cand_counts = np.unique(keys[:split], return_counts=True)
+    ref_keys, ref_counts = np.unique(keys[split:], return_counts=True)
+    common, cand_index, ref_index = np.intersect1d(cand_keys, ref_keys, assume_unique=True, return_indices=True)
+    overlap = np.bincount(common // size, weights=np.minimum(cand_counts[cand_index], ref_counts[ref_index]),
+                          minlength=rows)
+    cand_total = np.array(cand_lengths, dtype=np.float64)
+    ref_total = np.array(ref_lengths, dtype=np.float64)
+    precision = np.divide(overlap, cand_total, out=np.zeros(rows), where=cand_total > 0)
+    recall = np.divide(overlap, ref_total, out=np.zeros(rows), where=ref_total > 0)
+    total = precision + recall
+    return np.divide(2 * precision * recall, total, out=np.zeros(rows), where=total > 0)
+
+
+class HashingEmbedder:
+    # Bag-of-words feature hashing into a fixed-size, L2-normalized vector. No model calls; swap
+    # in BedrockEmbedder for semantic embeddings.
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, texts):
+        ids = [token_ids(tokenize(text)) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(i) for i in ids])
+        columns = (np.concatenate(ids) % self.dim) if ids else np.empty(0, np.int64)
+        vectors = np.zeros((len(texts), self.dim))
+        np.add.at(vectors, (rows, columns), 1.0)
+        return vectors
+
+    async def embed_async(self, texts):
+        return self.embed(texts)
+
+
+class BedrockEmbedder:
+    # One invoke_model per text, and boto3 blocks: embed_async runs up to concurrency calls in
+    # threads so the event loop keeps feeding the model workers. Vectors are cached by text,
+    # since reference responses repeat across prompts and reruns.
+    def __init__(self, model_id='amazon.titan-embed-text-v1', client=None, concurrency=16, cache_size=100_000):
+        import boto3
+
+        self.model_id = model_id
+        self.client = client or boto3.client('bedrock-runtime')
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.calls = 0
+
+    def _invoke(self, text):
+        response = self.client.invoke_model(modelId=self.model_id, contentType='application/json',
+                                            accept='application/json', body=json.dumps({'inputText': text}))
+        return json.loads(response['body'].read())['embedding']
+
+    async def embed_async(self, texts):
+        vectors = {}
+        for text in dict.fromkeys(texts):
+            if text in self.cache:
+                self.cache.move_to_end(text)
+                vectors[text] = self.cache[text]
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        self.calls += len(missing)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(text):
+            async with semaphore:
+                return await asyncio.to_thread(self._invoke, text)
+
+        for text, vector in zip(missing, await asyncio.gather(*map(fetch, missing))):
+            vectors[text] = self.cache[text] = vector
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return np.array([vectors[text] for text in texts], dtype=np.float64)
+
+    def embed(self, texts):
+        return asyncio.run(self.embed_async(texts))
+
+
+def cosine_rows(a, b):
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.divide((a * b).sum(axis=1), norms, out=np.zeros(len(a)), where=norms > 0)
+
+
+def score_batch(outputs, references, vectors):
+    # vectors holds the embeddings of outputs followed by those of references
+    output_ids = [token_ids(tokenize(text)) for text in outputs]
+    reference_ids = [token_ids(tokenize(text)) for text in references]
+    return {
+        'rouge1': ngram_f1(output_ids, reference_ids),
+        'rouge2': ngram_f1([bigram_ids(i) for i in output_ids], [bigram_ids(i) for i in reference_ids]),
+        'cosine': cosine_rows(vectors[:len(outputs)], vectors[len(outputs):])
+    }
+
+
+class BedrockClaudeClient:
+    # Same request as the state machine's Lambda; boto3 is blocking, so calls run in threads
+    def __init__(self, model_id=MODEL_ID, max_tokens=500, client=None):
+        import boto3
+        from botocore.config import Config
+
+        self.model_id = model_id
+        self.max_tokens = max_tokens
+        self.client = client or boto3.client('bedrock-runtime', config=Config(
+            retries={'max_attempts': 8, 'mode': 'adaptive'}, max_pool_connections=64))
+
+    def _invoke(self, prompt):
+        body = json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": self.max_tokens,
+            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+        })
+        response = self.client.invoke_model(modelId=self.model_id, contentType='application/json',
+                                            accept='application/json', body=body)
+        content = json.loads(response['body'].read()).get('content', [])
+        return "".join(part.get('text', '') for part in content)
+
+    async def generate(self, prompt):
+        return await asyncio.to_thread(self._invoke, prompt)
+
+
+class StubModelClient:
+    # Offline stand-in: sleeps latency_ms (+/- jitter) and answers with text built from the prompt
+    def __init__(self, latency_ms=50, jitter=0.2, model_id='stub'):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter
+        self.model_id = model_id
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        words = tokenize(prompt)
+        return f"This book review covers {' '.join(words)}. It explores themes of {' and '.join(words[-3:])}."
+
+
+class RateLimiter:
+    # Token bucket: at most rate acquisitions per second on average, bursts of up to burst
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutputCache:
+    # Model outputs keyed by sha256(model id, prompt); a rerun only calls the model for new rows
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, model_id TEXT, prompt TEXT, "
+                        "output TEXT, created REAL)")
+
+    @staticmethod
+    def key(model_id, prompt):
+        return hashlib.sha256(f"{model_id}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = f"SELECT key, output FROM outputs WHERE key IN ({','.join('?' * len(chunk))})"
+            found.update(self.db.execute(query, chunk).fetchall())
+        return found
+
+    def put_many(self, entries):
+        # entries: (key, model_id, prompt, output)
+        now = time.time()
+        self.db.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                            [(*entry, now) for entry in entries])
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class EvaluationRunner:
+    def __init__(self, client, cache=None, embedder=None, concurrency=16, rate=0.0, batch_size=256,
+                 output_path=None):
+        self.client = client
+        self.cache = cache
+        self.embedder = embedder or HashingEmbedder()
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.batch_size = batch_size
+        self.output_path = output_path
+        self.stats = {'rows': 0, 'cached': 0, 'generated': 0, 'errors': 0}
+        self.totals = defaultdict(lambda: defaultdict(float))
+
+    async def _worker(self, work, finished):
+        while True:
+            row = await work.get()
+            if row is None:
+                return
+            await self.limiter.acquire()
+            try:
+                row['output'] = await self.client.generate(row['prompt'])
+            except Exception as error:
+                row['error'] = str(error)
+            await finished.put(row)
+
+    async def _produce(self, rows, work, finished):
+        # Looks up a chunk of rows in the cache at a time; misses go to the workers
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.batch_size:
+                await self._dispatch(chunk, work, finished)
+                chunk = []
+        if chunk:
+            await self._dispatch(chunk, work, finished)
+        for _ in range(self.concurrency):
+            await work.put(None)
+
+    async def _dispatch(self, chunk, work, finished):
+        model_id = self.client.model_id
+        for row in chunk:
+            row['key'] = OutputCache.key(model_id, row['prompt'])
+        cached = self.cache.get_many([row['key'] for row in chunk]) if self.cache else {}
+        for row in chunk:
+            if row['key'] in cached:
+                row['output'] = cached[row['key']]
+                row['cached'] = True
+                await finished.put(row)
+            else:
+                await work.put(row)
+
+    async def _flush(self, batch, out):
+        scored = [row for row in batch if 'output' in row]
+        if self.cache:
+            self.cache.put_many([(row['key'], self.client.model_id, row['prompt'], row['output'])
+                                 for row in scored if not row.get('cached')])
+        metrics = {}
+        if scored:
+            outputs = [row['output'] for row in scored]
+            references = [row['referenceResponse'] for row in scored]
+            # Awaited, so the workers keep generating while the batch is embedded
+            vectors = await self.embedder.embed_async(outputs + references)
+            metrics = score_batch(outputs, references, vectors)
+        for name, values in metrics.items():
+            for row, value in zip(scored, values.tolist()):
+                row[name] = value
+        for row in batch:
+            self.stats['rows'] += 1
+            if 'error' in row:
+                self.stats['errors'] += 1
+            else:
+                self.stats['cached' if row.get('cached') else 'generated'] += 1
+                for category in ('all', row.get('category', 'uncategorized')):
+                    totals = self.totals[category]
+                    totals['count'] += 1
+                    for name in metrics:
+                        totals[name] += row[name]
+            if out:
+                out.write(json.dumps({k: v for k, v in row.items() if k != 'key'}) + "\n")
+
+    async def run(self, rows):
+        work = asyncio.Queue(maxsize=self.concurrency * 2)
+        finished = asyncio.Queue(maxsize=self.batch_size * 2)
+        workers = [asyncio.create_task(self._worker(work, finished)) for _ in range(self.concurrency)]
+        producer = asyncio.create_task(self._produce(rows, work, finished))
+
+        async def close_when_done():
+            await asyncio.gather(producer, *workers)
+            await finished.put(None)
+
+        closer = asyncio.create_task(close_when_done())
+        out = open(self.output_path, 'w', encoding='utf-8') if self.output_path else None
+        start = time.perf_counter()
+        try:
+            batch = []
+            while (row := await finished.get()) is not None:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    await self._flush(batch, out)
+                    batch = []
+            if batch:
+                await self._flush(batch, out)
+            await closer
+        finally:
+            if out:
+                out.close()
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, elapsed):
+        categories = {}
+        for category, totals in self.totals.items():
+            count = totals['count']
+            categories[category] = {'count': int(count), **{name: round(value / count, 4)
+                                                           for name, value in totals.items() if name != 'count'}}
+        return dict(self.stats, seconds=round(elapsed, 3), rows_per_sec=round(self.stats['rows'] / elapsed, 1),
+                    metrics=categories)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate a model on the book review prompt dataset")
+    parser.add_argument('--dataset', type=str, default=DATASET_PATH)
+    parser.add_argument('--model-id', type=str, default=MODEL_ID)
+    parser.add_argument('--stub', action='store_true', help="Use the offline stub model")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5.0, help="Model requests per second; 0 for no limit")
+    parser.add_argument('--cache', type=str, default='evaluation_cache.sqlite')
+    parser.add_argument('--output', type=str, default='evaluation_results.jsonl')
+    args = parser.parse_args()
+
+    client = StubModelClient() if args.stub else BedrockClaudeClient(args.model_id)
+    cache = OutputCache(args.cache) if args.cache else None
+    runner = EvaluationRunner(client, cache, concurrency=args.concurrency, rate=args.rate, output_path=args.output)
+    summary = asyncio.run(runner.run(iter_dataset(args.dataset)))
+    if cache:
+        cache.close()
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Rolling aggregates are kept per device and per fixed window in EnvironmentalAggregates
+# (partition key DeviceId, sort key WindowStart). Every reading adds to the window's sums
+# and count on write, so reading an average is a one-item Query (the newest window at or
+# before the timestamp) no matter the table size.
+# Stream batches are retried as a whole after a failure, so each window item records the
+# stream SequenceNumber of the last reading applied to it and an update is conditioned on a
+# newer one: a redelivered reading is skipped instead of being added twice. A device's
+# readings share a partition key in EnvironmentalData, so they arrive on one shard in order.
+# stream_handler also reports the first failed record (ReportBatchItemFailures on the event
+# source mapping), so a retry resumes from it rather than from the start of the batch.
+
+AGGREGATES_TABLE = os.environ.get('AGGREGATES_TABLE', 'EnvironmentalAggregates')
+WINDOW_SECONDS = int(os.environ.get('WINDOW_SECONDS', '300'))
+METRICS = ('Temperature', 'Humidity', 'CO2')
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+dynamodb = boto3.resource('dynamodb')
+
+
+def window_start(timestamp, window_seconds=WINDOW_SECONDS):
+    epoch = int(datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+    start = epoch - epoch % window_seconds
+    return datetime.fromtimestamp(start, tz=timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def add_reading(table, reading, window_seconds=WINDOW_SECONDS, sequence_number=None):
+    # ADD is atomic on the item, so concurrent writers never lose an update. Returns False when
+    # the reading's stream record was already applied.
+    update = {
+        'Key': {'DeviceId': reading['DeviceId'], 'WindowStart': window_start(reading['Timestamp'], window_seconds)},
+        'UpdateExpression': 'ADD ReadingCount :one, ' + ', '.join(f'Sum{m} :{m}' for m in METRICS),
+        'ExpressionAttributeValues': {':one': 1, **{f':{m}': Decimal(str(reading[m])) for m in METRICS}}
+    }
+    if sequence_number is not None:
+        update['UpdateExpression'] += ' SET LastSequenceNumber = :sequence'
+        update['ConditionExpression'] = 'attribute_not_exists(LastSequenceNumber) OR LastSequenceNumber < :sequence'
+        update['ExpressionAttributeValues'][':sequence'] = Decimal(sequence_number)
+    try:
+        table.update_item(**update)
+    except ClientError as error:
+        if error.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def read_averages(table, device_id, timestamp=None, window_seconds=WINDOW_SECONDS):
+    # Averages of the current window, or of the last completed one if nothing arrived yet
+    timestamp = timestamp or datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+    response = table.query(
+        KeyConditionExpression='DeviceId = :device AND WindowStart <= :start',
+        ExpressionAttributeValues={':device': device_id, ':start': window_start(timestamp, window_seconds)},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    if not response['Items']:
+        return None
+    item = response['Items'][0]
+    count = float(item['ReadingCount'])
+    return {
+        'AverageTemperature': round(float(item['SumTemperature']) / count, 2),
+        'AverageHumidity': round(float(item['SumHumidity']) / count, 2),
+        'AverageCO2': round(float(item['SumCO2']) / count, 2)
+    }
+
+
+def stream_handler(event, context):
+    # Triggered by the EnvironmentalData DynamoDB stream; only new readings are aggregated
+    table = dynamodb.Table(AGGREGATES_TABLE)
+    updated = skipped = 0
+    for record in event.get('Records', []):
+        if record.get('eventName') != 'INSERT':
+            continue
+        sequence_number = record['dynamodb']['SequenceNumber']
+        try:
+            image = record['dynamodb']['NewImage']
+            reading = {'DeviceId': image['DeviceId']['S'], 'Timestamp': image['Timestamp']['S']}
+            for metric in METRICS:
+                reading[metric] = image[metric]['N']
+            if add_reading(table, reading, sequence_number=sequence_number):
+                updated += 1
+            else:
+                skipped += 1
+        except Exception as error:
+            # Later records stay unprocessed too, so shard order is kept on the retry
+            print(f"Error aggregating record {sequence_number}: {error}")
+            return {'updated': updated, 'skipped': skipped,
+                    'batchItemFailures': [{'itemIdentifier': sequence_number}]}
+    return {'updated': updated, 'skipped': skipped, 'batchItemFailures': []}
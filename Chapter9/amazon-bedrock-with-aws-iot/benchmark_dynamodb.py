@@ -0,0 +1,127 @@
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import boto3
+
+# Loads EnvironmentalData into a local DynamoDB stand-in and compares the descending Query,
+# the rolling aggregates read and the paginated parallel scan. Point DYNAMODB_ENDPOINT at
+# DynamoDB Local (e.g. http://localhost:8000) for the 1M row run; without it moto runs
+# in-process, which is fine for smaller --rows but evaluates queries by scanning in Python.
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+def create_tables(dynamodb):
+    for name, sort_key in (('EnvironmentalData', 'Timestamp'), ('EnvironmentalAggregates', 'WindowStart')):
+        dynamodb.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': 'DeviceId', 'KeyType': 'HASH'},
+                       {'AttributeName': sort_key, 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'DeviceId', 'AttributeType': 'S'},
+                                  {'AttributeName': sort_key, 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        ).wait_until_exists()
+
+
+def load_readings(table, aggregates_table, rows, devices, aggregate_tail):
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    per_device = rows // devices
+    tail = []
+    with table.batch_writer() as batch:
+        for device in range(devices):
+            for i in range(per_device):
+                reading = {
+                    'DeviceId': f'sensor-{device}',
+                    'Timestamp': (start + timedelta(seconds=5 * i)).strftime(TIMESTAMP_FORMAT),
+                    'Temperature': Decimal(str(round(rng.uniform(20.0, 30.0), 2))),
+                    'Humidity': Decimal(str(round(rng.uniform(30.0, 70.0), 2))),
+                    'CO2': Decimal(str(round(rng.uniform(400.0, 800.0), 2)))
+                }
+                batch.put_item(Item=reading)
+                if device == 0 and i >= per_device - aggregate_tail:
+                    tail.append(reading)
+    # The stream handler would do this on every insert; only the recent tail matters here
+    for reading in tail:
+        add_reading(aggregates_table, reading)
+    return tail
+
+
+def stream_record(sequence_number, reading):
+    image = {'DeviceId': {'S': reading['DeviceId']}, 'Timestamp': {'S': reading['Timestamp']},
+             **{m: {'N': str(reading[m])} for m in ('Temperature', 'Humidity', 'CO2')}}
+    return {'eventName': 'INSERT', 'dynamodb': {'SequenceNumber': str(sequence_number), 'NewImage': image}}
+
+
+def check_stream_retry(aggregates_table):
+    # A batch redelivered after a failure must not add its readings to the window twice
+    readings = [{'DeviceId': 'sensor-retry', 'Timestamp': f'2024-01-01T00:00:{i:02d}',
+                 'Temperature': 20 + i, 'Humidity': 50, 'CO2': 400} for i in range(7)]
+    records = [stream_record(100000000000000000000 + i, r) for i, r in enumerate(readings)]
+    broken = stream_record(100000000000000000005, readings[5])
+    del broken['dynamodb']['NewImage']['CO2']
+    first = aggregates.stream_handler({'Records': records[:5] + [broken, records[6]]}, None)
+    assert first['batchItemFailures'] == [{'itemIdentifier': '100000000000000000005'}], first
+    retry = aggregates.stream_handler({'Records': records}, None)
+    assert (retry['updated'], retry['skipped']) == (2, 5), retry
+    item = aggregates_table.get_item(Key={'DeviceId': 'sensor-retry', 'WindowStart': '2024-01-01T00:00:00'})['Item']
+    assert item['ReadingCount'] == 7 and item['SumTemperature'] == sum(r['Temperature'] for r in readings), item
+    print("redelivered stream batch applied once: ok")
+
+
+def timed(label, fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    print(f"{label:<12} {(time.perf_counter() - start) * 1000 / repeats:10.2f} ms/call -> {result}")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--skip-scan', action='store_true', help="Skip the legacy full scan on large tables")
+    args = parser.parse_args()
+
+    endpoint = os.environ.get('DYNAMODB_ENDPOINT')
+    mock = None
+    if not endpoint:
+        from moto import mock_aws
+        mock = mock_aws()
+        mock.start()
+
+    import aggregates
+    from aggregates import TIMESTAMP_FORMAT, WINDOW_SECONDS, add_reading
+    import lambda_function
+
+    dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint)
+    lambda_function.dynamodb = dynamodb
+    aggregates.dynamodb = dynamodb
+    create_tables(dynamodb)
+    table = dynamodb.Table('EnvironmentalData')
+    aggregates_table = dynamodb.Table('EnvironmentalAggregates')
+
+    check_stream_retry(aggregates_table)
+    start = time.perf_counter()
+    tail = load_readings(table, aggregates_table, args.rows, args.devices, WINDOW_SECONDS // 5)
+    print(f"Loaded {args.rows} readings in {time.perf_counter() - start:.1f}s")
+
+    device_id = 'sensor-0'
+    expected = lambda_function.average_readings(tail[-lambda_function.LATEST_COUNT:])
+    query = timed("query", lambda: lambda_function.compute_averages(device_id, 'query'), args.repeats)
+    timed("aggregates", lambda: lambda_function.read_averages(aggregates_table, device_id, tail[-1]['Timestamp']),
+          args.repeats)
+    if not args.skip_scan:
+        timed("scan", lambda: lambda_function.average_readings(lambda_function.scan_latest(table)), 1)
+    print(f"query matches latest {lambda_function.LATEST_COUNT} readings: {query == expected}")
+
+    if mock is not None:
+        mock.stop()
@@ -0,0 +1,81 @@
+import argparse
+import io
+import json
+import os
+import random
+from collections import deque
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+import lambda_function
+from insight_cache import InsightCache
+
+# Replays the mock publisher's 5-second cadence against lambda_handler with a stubbed Bedrock
+# client, refreshing the dashboard after every reading, and counts the model calls made.
+
+
+class StubBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, modelId, contentType, accept, body):
+        self.calls += 1
+        return {'body': io.BytesIO(f"Insight #{self.calls}".encode('utf-8'))}
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def publisher_readings(drift, rng):
+    # drift=False matches mock_data_publisher (uniform noise); drift=True is a slow random walk
+    temperature, humidity, co2 = 25.0, 50.0, 600.0
+    while True:
+        if drift:
+            temperature = min(max(temperature + rng.gauss(0, 0.05), 20.0), 30.0)
+            humidity = min(max(humidity + rng.gauss(0, 0.2), 30.0), 70.0)
+            co2 = min(max(co2 + rng.gauss(0, 2.0), 400.0), 800.0)
+            yield {'Temperature': temperature, 'Humidity': humidity, 'CO2': co2}
+        else:
+            yield {'Temperature': rng.uniform(20.0, 30.0), 'Humidity': rng.uniform(30.0, 70.0),
+                   'CO2': rng.uniform(400.0, 800.0)}
+
+
+def replay(minutes, drift, use_cache):
+    rng = random.Random(11)
+    clock = SimulatedClock()
+    stub = StubBedrock()
+    lambda_function.bedrock = stub
+    lambda_function.insight_cache = InsightCache(clock=clock)
+    if not use_cache:
+        lambda_function.insight_cache.get = lambda device_id, averages: (None, 'misses')
+    lambda_function.insight_cache.emit_metric = lambda outcome: None
+
+    window = deque(maxlen=lambda_function.LATEST_COUNT)
+    lambda_function.compute_averages = lambda device_id: lambda_function.average_readings(list(window))
+
+    readings = publisher_readings(drift, rng)
+    refreshes = minutes * 60 // 5
+    for _ in range(refreshes):
+        window.append(next(readings))
+        clock.now += 5
+        response = lambda_function.lambda_handler({}, None)
+        assert response['statusCode'] == 200 and json.loads(response['body'])['Insights']
+    return refreshes, stub.calls, lambda_function.insight_cache.metrics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=int, default=60)
+    args = parser.parse_args()
+
+    for drift in (False, True):
+        label = "random walk" if drift else "uniform noise"
+        refreshes, calls, _ = replay(args.minutes, drift, use_cache=False)
+        print(f"{label:<14} no cache   refreshes={refreshes} model_calls={calls}")
+        refreshes, calls, metrics = replay(args.minutes, drift, use_cache=True)
+        print(f"{label:<14} with cache refreshes={refreshes} model_calls={calls} metrics={metrics}")
@@ -0,0 +1,113 @@
+import json
+import math
+import os
+import threading
+import time
+
+# Insights are cached by quantized averages: readings that land in the same buckets share an
+# insight until it expires. On a miss, the last insight for the device is still reused while
+# every average stays within the change thresholds of the readings it was generated for.
+
+BUCKETS = {
+    'AverageTemperature': float(os.environ.get('TEMPERATURE_BUCKET', '0.5')),
+    'AverageHumidity': float(os.environ.get('HUMIDITY_BUCKET', '2')),
+    'AverageCO2': float(os.environ.get('CO2_BUCKET', '10'))
+}
+THRESHOLDS = {
+    'AverageTemperature': float(os.environ.get('TEMPERATURE_THRESHOLD', '1.0')),
+    'AverageHumidity': float(os.environ.get('HUMIDITY_THRESHOLD', '5')),
+    'AverageCO2': float(os.environ.get('CO2_THRESHOLD', '50'))
+}
+INSIGHT_TTL_SECONDS = int(os.environ.get('INSIGHT_TTL_SECONDS', '300'))
+
+
+def bucket_key(device_id, averages, buckets=BUCKETS):
+    parts = [str(math.floor(averages[name] / size)) for name, size in sorted(buckets.items())]
+    return f"{device_id}#" + "#".join(parts)
+
+
+def within_thresholds(previous, current, thresholds=THRESHOLDS):
+    return all(abs(current[name] - previous[name]) < limit for name, limit in thresholds.items())
+
+
+class DynamoDBInsightStore:
+    # Optional store shared by all Lambda containers; ExpiresAt doubles as the table's TTL attribute
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, key, now):
+        item = self.table.get_item(Key={'CacheKey': key}).get('Item')
+        if item is None or float(item['ExpiresAt']) <= now:
+            return None
+        return {'Insights': item['Insights'], 'Averages': json.loads(item['Averages']),
+                'ExpiresAt': float(item['ExpiresAt'])}
+
+    def put(self, key, entry):
+        self.table.put_item(Item={'CacheKey': key, 'Insights': entry['Insights'],
+                                  'Averages': json.dumps(entry['Averages']), 'ExpiresAt': int(entry['ExpiresAt'])})
+
+
+class InsightCache:
+    def __init__(self, ttl_seconds=INSIGHT_TTL_SECONDS, shared_store=None, clock=time.time):
+        self.ttl = ttl_seconds
+        self.shared = shared_store
+        self.clock = clock
+        self._entries = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'threshold_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def get(self, device_id, averages):
+        # Returns (insights or None, outcome) where outcome names the metric that was counted
+        now = self.clock()
+        key = bucket_key(device_id, averages)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['ExpiresAt'] > now:
+                return entry['Insights'], self._count('hits')
+            latest = self._latest.get(device_id)
+            if latest is not None and latest['ExpiresAt'] > now and within_thresholds(latest['Averages'], averages):
+                return latest['Insights'], self._count('threshold_hits')
+
+        if self.shared is not None:
+            entry = self.shared.get(key, now)
+            if entry is not None:
+                with self._lock:
+                    self._entries[key] = entry
+                    self._latest[device_id] = entry
+                    return entry['Insights'], self._count('shared_hits')
+
+        with self._lock:
+            return None, self._count('misses')
+
+    def _count(self, outcome):
+        self.metrics[outcome] += 1
+        return outcome
+
+    def put(self, device_id, averages, insights):
+        entry = {'Insights': insights, 'Averages': dict(averages), 'ExpiresAt': self.clock() + self.ttl}
+        key = bucket_key(device_id, averages)
+        with self._lock:
+            self._entries[key] = entry
+            self._latest[device_id] = entry
+            # Expired entries are dropped on write so a warm container does not grow without bound
+            now = self.clock()
+            for stale in [k for k, e in self._entries.items() if e['ExpiresAt'] <= now]:
+                del self._entries[stale]
+        if self.shared is not None:
+            self.shared.put(key, entry)
+
+    def emit_metric(self, outcome, namespace='EnvironmentalInsights'):
+        # CloudWatch Embedded Metric Format: the printed JSON becomes a metric without extra API calls
+        name = 'InsightCache' + ''.join(part.title() for part in outcome.split('_'))
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(self.clock() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [[]],
+                    'Metrics': [{'Name': name, 'Unit': 'Count'}]
+                }]
+            },
+            name: 1
+        }))
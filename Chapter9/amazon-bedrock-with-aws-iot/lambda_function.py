@@ -1,29 +1,104 @@
+import heapq
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from boto3.dynamodb.conditions import Key
 
-def lambda_handler(event, context):
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('EnvironmentalData')
+from aggregates import AGGREGATES_TABLE, read_averages
+from insight_cache import DynamoDBInsightStore, InsightCache
+
+# EnvironmentalData uses DeviceId as partition key and Timestamp as sort key, so the latest
+# readings are a descending Query with a Limit instead of a full table scan.
+# READ_MODE selects how averages are computed:
+#   aggregates - O(1) read of the rolling window sums maintained by aggregates.stream_handler
+#   query      - descending Query for the latest LATEST_COUNT readings of the device (default)
+#   scan       - paginated parallel scan for legacy tables without the DeviceId key
+READ_MODE = os.environ.get('READ_MODE', 'query')
+DEVICE_ID = os.environ.get('DEVICE_ID', 'EnvironmentSensor')
+LATEST_COUNT = int(os.environ.get('LATEST_COUNT', '10'))
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '8'))
+
+# Created once per container so warm invocations reuse the connections
+dynamodb = boto3.resource('dynamodb')
+bedrock = boto3.client('bedrock')
+
+# The model is only called when the averages moved past the configured thresholds; warm
+# containers share insights in process, and INSIGHT_CACHE_TABLE shares them across containers
+insight_cache = InsightCache(
+    shared_store=DynamoDBInsightStore(dynamodb.Table(os.environ['INSIGHT_CACHE_TABLE']))
+    if os.environ.get('INSIGHT_CACHE_TABLE') else None
+)
 
-    # Scan the table and get all entries
-    response = table.scan()
-    data = response['Items']
 
-    # Sort data by Timestamp descending
-    data.sort(key=lambda x: x['Timestamp'], reverse=True)
-    latest_data = data[:10]
+def query_latest(table, device_id, limit=LATEST_COUNT):
+    response = table.query(
+        KeyConditionExpression=Key('DeviceId').eq(device_id),
+        ScanIndexForward=False,
+        Limit=limit
+    )
+    return response['Items']
 
-    # Calculate averages
-    avg_temp = sum(float(item['Temperature']) for item in latest_data) / len(latest_data)
-    avg_humidity = sum(float(item['Humidity']) for item in latest_data) / len(latest_data)
-    avg_co2 = sum(float(item['CO2']) for item in latest_data) / len(latest_data)
 
-    averages = {
-        'AverageTemperature': round(avg_temp, 2),
-        'AverageHumidity': round(avg_humidity, 2),
-        'AverageCO2': round(avg_co2, 2)
+def scan_segment(table, segment, total_segments, limit):
+    # Follows LastEvaluatedKey so every page is read, keeping only the newest `limit` rows
+    latest = []
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': '#ts, Temperature, Humidity, CO2',
+        'ExpressionAttributeNames': {'#ts': 'Timestamp'}
     }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response['Items']:
+            entry = (item['Timestamp'], id(item), item)
+            if len(latest) < limit:
+                heapq.heappush(latest, entry)
+            elif entry[0] > latest[0][0]:
+                heapq.heapreplace(latest, entry)
+        if 'LastEvaluatedKey' not in response:
+            return latest
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def scan_latest(table, limit=LATEST_COUNT, total_segments=SCAN_SEGMENTS):
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        segments = pool.map(lambda segment: scan_segment(table, segment, total_segments, limit),
+                            range(total_segments))
+        candidates = [entry for segment in segments for entry in segment]
+    return [item for _, _, item in heapq.nlargest(limit, candidates, key=lambda entry: entry[0])]
 
+
+def average_readings(items):
+    count = len(items)
+    totals = {'Temperature': 0.0, 'Humidity': 0.0, 'CO2': 0.0}
+    for item in items:
+        for metric in totals:
+            totals[metric] += float(item[metric])
+    return {
+        'AverageTemperature': round(totals['Temperature'] / count, 2),
+        'AverageHumidity': round(totals['Humidity'] / count, 2),
+        'AverageCO2': round(totals['CO2'] / count, 2)
+    }
+
+
+def compute_averages(device_id, read_mode=READ_MODE):
+    if read_mode == 'aggregates':
+        averages = read_averages(dynamodb.Table(AGGREGATES_TABLE), device_id)
+        if averages is not None:
+            return averages
+        read_mode = 'query'
+
+    table = dynamodb.Table('EnvironmentalData')
+    latest_data = scan_latest(table) if read_mode == 'scan' else query_latest(table, device_id)
+    if not latest_data:
+        return None
+    return average_readings(latest_data)
+
+
+def generate_insights(averages):
     # Prepare input for the model
     input_text = (
         f"Provide insights based on the following environmental averages:\n"
@@ -32,9 +107,6 @@ def lambda_handler(event, context):
         f"CO2 Levels: {averages['AverageCO2']} ppm\n"
     )
 
-    # Initialize Bedrock client
-    bedrock = boto3.client('bedrock')
-
     # Call the model (replace 'amazon.titan-text' with the actual model ID if different)
     response = bedrock.invoke_model(
         modelId='amazon.titan-text',  # Example model ID
@@ -44,7 +116,24 @@ def lambda_handler(event, context):
     )
 
     # Get the model's output
-    model_output = response['body'].read().decode('utf-8')
+    return response['body'].read().decode('utf-8')
+
+
+def lambda_handler(event, context):
+    params = (event or {}).get('queryStringParameters') or {}
+    device_id = params.get('deviceId', DEVICE_ID)
+    averages = compute_averages(device_id)
+    if averages is None:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'Error': 'No environmental readings found'})
+        }
+
+    model_output, outcome = insight_cache.get(device_id, averages)
+    if model_output is None:
+        model_output = generate_insights(averages)
+        insight_cache.put(device_id, averages, model_output)
+    insight_cache.emit_metric(outcome)
 
     return {
         'statusCode': 200,
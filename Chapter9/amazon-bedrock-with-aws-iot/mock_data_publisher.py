@@ -1,7 +1,10 @@
-import time
+import argparse
+import asyncio
+import calendar
 import json
 import random
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+import struct
+import time
 
 # AWS IoT endpoint, replace with your own
 ENDPOINT = "your-endpoint.amazonaws.com"
@@ -11,28 +14,242 @@ PATH_TO_KEY = "certs/private.pem.key"
 PATH_TO_ROOT = "certs/AmazonRootCA1.pem"
 TOPIC = "environment/data"
 
-# Initialize MQTT Client
-mqtt_client = AWSIoTMQTTClient(CLIENT_ID)
-mqtt_client.configureEndpoint(ENDPOINT, 8883)
-mqtt_client.configureCredentials(PATH_TO_ROOT, PATH_TO_KEY, PATH_TO_CERT)
-
-mqtt_client.connect()
-print('Connected to AWS IoT Core')
-
-while True:
-    temperature = round(random.uniform(20.0, 30.0), 2)
-    humidity = round(random.uniform(30.0, 70.0), 2)
-    co2 = round(random.uniform(400.0, 800.0), 2)
-    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
-
-    data = {
-        'Timestamp': timestamp,
-        'Temperature': temperature,
-        'Humidity': humidity,
-        'CO2': co2
+# Binary payload: header (magic, version, reading count, sent-at epoch seconds, device id
+# length) followed by the device id and one (epoch seconds, temperature, humidity, CO2)
+# record per reading, all little-endian.
+BINARY_MAGIC = b"ENV1"
+BINARY_HEADER = struct.Struct("<4sBHdB")
+BINARY_READING = struct.Struct("<Ifff")
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def make_reading(epoch=None):
+    return {
+        'Epoch': int(epoch if epoch is not None else time.time()),
+        'Temperature': round(random.uniform(20.0, 30.0), 2),
+        'Humidity': round(random.uniform(30.0, 70.0), 2),
+        'CO2': round(random.uniform(400.0, 800.0), 2)
     }
 
-    message = json.dumps(data)
-    mqtt_client.publish(TOPIC, message, 1)
-    print(f'Published: {message} to the topic: {TOPIC}')
-    time.sleep(5)
+
+def encode_json(device_id, readings, sent_at):
+    records = [{
+        'Timestamp': time.strftime(TIMESTAMP_FORMAT, time.gmtime(r['Epoch'])),
+        'Temperature': r['Temperature'],
+        'Humidity': r['Humidity'],
+        'CO2': r['CO2']
+    } for r in readings]
+    if len(records) == 1:
+        # Single readings keep the flat shape the IoT rule writes straight into EnvironmentalData
+        return json.dumps({'DeviceId': device_id, **records[0], 'SentAt': sent_at}).encode('utf-8')
+    return json.dumps({'DeviceId': device_id, 'SentAt': sent_at, 'Readings': records}).encode('utf-8')
+
+
+def encode_binary(device_id, readings, sent_at):
+    device = device_id.encode('utf-8')
+    parts = [BINARY_HEADER.pack(BINARY_MAGIC, 1, len(readings), sent_at, len(device)), device]
+    parts.extend(BINARY_READING.pack(r['Epoch'], r['Temperature'], r['Humidity'], r['CO2']) for r in readings)
+    return b"".join(parts)
+
+
+def decode_payload(payload):
+    # Returns (device_id, sent_at, readings) for either payload format
+    if payload[:4] == BINARY_MAGIC:
+        _, _, count, sent_at, device_len = BINARY_HEADER.unpack_from(payload)
+        offset = BINARY_HEADER.size
+        device_id = payload[offset:offset + device_len].decode('utf-8')
+        offset += device_len
+        readings = []
+        for epoch, temperature, humidity, co2 in BINARY_READING.iter_unpack(
+                payload[offset:offset + count * BINARY_READING.size]):
+            readings.append({'Epoch': epoch, 'Temperature': temperature, 'Humidity': humidity, 'CO2': co2})
+        return device_id, sent_at, readings
+
+    message = json.loads(payload)
+    records = message.get('Readings', [message])
+    readings = [{
+        'Epoch': calendar.timegm(time.strptime(r['Timestamp'], TIMESTAMP_FORMAT)),
+        'Temperature': r['Temperature'],
+        'Humidity': r['Humidity'],
+        'CO2': r['CO2']
+    } for r in records]
+    return message.get('DeviceId', CLIENT_ID), message.get('SentAt'), readings
+
+
+class MemoryTransport:
+    # In-process sink: measures the generator and encoders without any network in the way
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.callback = None
+
+    async def connect(self):
+        asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            payload = await self.queue.get()
+            if self.callback is not None:
+                self.callback(payload)
+
+    def subscribe(self, callback):
+        self.callback = callback
+
+    async def publish(self, topic, payload):
+        self.queue.put_nowait(payload)
+
+    async def close(self):
+        while not self.queue.empty():
+            await asyncio.sleep(0.01)
+
+
+class MqttTransport:
+    # Plain MQTT broker such as a local mosquitto; paho queues publishes on its network thread
+    def __init__(self, host="localhost", port=1883, qos=1):
+        import paho.mqtt.client as mqtt
+
+        self.qos = qos
+        self.client = mqtt.Client(client_id=f"{CLIENT_ID}-loadgen")
+        self.listener = mqtt.Client(client_id=f"{CLIENT_ID}-listener")
+        self.host = host
+        self.port = port
+        self.client.max_inflight_messages_set(1000)
+        self.client.max_queued_messages_set(0)
+
+    async def connect(self):
+        self.client.connect(self.host, self.port)
+        self.client.loop_start()
+
+    def subscribe(self, callback):
+        self.listener.on_message = lambda client, userdata, message: callback(message.payload)
+        self.listener.connect(self.host, self.port)
+        self.listener.subscribe(TOPIC + "/#", qos=self.qos)
+        self.listener.loop_start()
+
+    async def publish(self, topic, payload):
+        self.client.publish(topic, payload, qos=self.qos)
+
+    async def close(self):
+        await asyncio.sleep(1)
+        self.client.loop_stop()
+        self.listener.loop_stop()
+        self.client.disconnect()
+        self.listener.disconnect()
+
+
+class AwsIotTransport:
+    def __init__(self, qos=1):
+        from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+
+        self.qos = qos
+        self.client = AWSIoTMQTTClient(CLIENT_ID)
+        self.client.configureEndpoint(ENDPOINT, 8883)
+        self.client.configureCredentials(PATH_TO_ROOT, PATH_TO_KEY, PATH_TO_CERT)
+        self.client.configureOfflinePublishQueueing(-1)
+
+    async def connect(self):
+        await asyncio.to_thread(self.client.connect)
+        print('Connected to AWS IoT Core')
+
+    def subscribe(self, callback):
+        self.client.subscribe(TOPIC + "/#", self.qos, lambda client, userdata, message: callback(message.payload))
+
+    async def publish(self, topic, payload):
+        await asyncio.to_thread(self.client.publish, topic, payload, self.qos)
+
+    async def close(self):
+        self.client.disconnect()
+
+
+class LoadStats:
+    def __init__(self):
+        self.messages = 0
+        self.readings = 0
+        self.bytes = 0
+        self.received = 0
+        self.latencies = []
+
+    def on_receive(self, payload):
+        _, sent_at, _ = decode_payload(payload)
+        self.received += 1
+        if sent_at is not None:
+            self.latencies.append((time.time() - sent_at) * 1000)
+
+    def percentile(self, pct):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))] if ordered else float('nan')
+
+
+async def run_sensor(sensor_id, transport, stats, args, deadline):
+    encode = encode_binary if args.format == 'binary' else encode_json
+    interval = 1.0 / args.rate
+    topic = TOPIC if args.sensors == 1 else f"{TOPIC}/{sensor_id}"
+    # Stagger start times so thousands of sensors do not publish in lockstep
+    next_reading = time.monotonic() + random.uniform(0, interval)
+    batch = []
+
+    async def publish(readings):
+        payload = encode(sensor_id, readings, time.time())
+        await transport.publish(topic, payload)
+        stats.messages += 1
+        stats.readings += len(readings)
+        stats.bytes += len(payload)
+        if args.verbose:
+            print(f'Published: {payload.decode() if args.format == "json" else payload.hex()} to the topic: {topic}')
+
+    while next_reading < deadline:
+        await asyncio.sleep(max(0.0, next_reading - time.monotonic()))
+        batch.append(make_reading())
+        next_reading += interval
+        if len(batch) >= args.batch_size:
+            await publish(batch)
+            batch = []
+    # Readings taken before the deadline that did not fill a batch are still sent
+    if batch:
+        await publish(batch)
+
+
+async def main(args):
+    if args.transport == 'memory':
+        transport = MemoryTransport()
+    elif args.transport == 'mqtt':
+        transport = MqttTransport(args.broker_host, args.broker_port)
+    else:
+        transport = AwsIotTransport()
+
+    stats = LoadStats()
+    await transport.connect()
+    if args.measure_latency:
+        transport.subscribe(stats.on_receive)
+
+    sensor_ids = [CLIENT_ID] if args.sensors == 1 else [f"{CLIENT_ID}-{i:05d}" for i in range(args.sensors)]
+    start = time.monotonic()
+    deadline = start + args.duration if args.duration else float('inf')
+    await asyncio.gather(*(run_sensor(sensor_id, transport, stats, args, deadline) for sensor_id in sensor_ids))
+    elapsed = time.monotonic() - start
+    await transport.close()
+
+    print(f"sensors={args.sensors} format={args.format} batch={args.batch_size} transport={args.transport}")
+    print(f"published {stats.messages} messages / {stats.readings} readings in {elapsed:.1f}s: "
+          f"{stats.messages / elapsed:.1f} msgs/sec, {stats.readings / elapsed:.1f} readings/sec, "
+          f"{stats.bytes / max(stats.messages, 1):.0f} bytes/msg")
+    if stats.latencies:
+        print(f"received {stats.received} messages, end-to-end latency p50={stats.percentile(50):.2f}ms "
+              f"p95={stats.percentile(95):.2f}ms p99={stats.percentile(99):.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Environmental sensor publisher and load generator")
+    parser.add_argument('--sensors', type=int, default=1, help="Number of simulated sensors")
+    parser.add_argument('--rate', type=float, default=0.2, help="Readings per second per sensor")
+    parser.add_argument('--batch-size', type=int, default=1, help="Readings compacted into each message")
+    parser.add_argument('--format', choices=['json', 'binary'], default='json')
+    parser.add_argument('--transport', choices=['aws-iot', 'mqtt', 'memory'], default='aws-iot')
+    parser.add_argument('--broker-host', default='localhost')
+    parser.add_argument('--broker-port', type=int, default=1883)
+    parser.add_argument('--duration', type=float, default=0, help="Seconds to run; 0 runs forever")
+    parser.add_argument('--measure-latency', action='store_true', help="Subscribe to the topic and time delivery")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    args.verbose = args.verbose or args.sensors == 1
+
+    asyncio.run(main(args))
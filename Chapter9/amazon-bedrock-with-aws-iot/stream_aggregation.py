@@ -0,0 +1,280 @@
+import argparse
+import time
+
+import numpy as np
+
+from mock_data_publisher import decode_payload
+
+METRICS = ('Temperature', 'Humidity', 'CO2')
+
+# Per-device windowed aggregation over a NumPy ring buffer. Windows are tumbling when
+# slide_seconds equals window_seconds and sliding otherwise. A window is emitted once the
+# device's watermark (newest timestamp seen) passes its end plus allowed_lateness, so
+# readings that arrive out of order within that bound still land in the right window. The
+# first window is the slide-aligned one holding the device's first reading, whether the
+# readings arrive one at a time or in batches. capacity is only the initial ring size: a
+# ring doubles instead of overwriting readings that an open window still needs.
+
+
+class DeviceRing:
+    def __init__(self, capacity, metric_count):
+        self.timestamps = np.full(capacity, -np.inf)
+        self.values = np.zeros((capacity, metric_count), dtype=np.float64)
+        self.head = 0
+        self.watermark = -np.inf
+        self.next_window_start = None
+        self.resizes = 0
+
+    def ordered(self):
+        # Stored readings, oldest insertion first
+        capacity = len(self.timestamps)
+        if self.head <= capacity:
+            return self.timestamps[:self.head], self.values[:self.head]
+        indexes = (self.head + np.arange(capacity)) % capacity
+        return self.timestamps[indexes], self.values[indexes]
+
+    def grow(self, capacity):
+        timestamps, values = self.ordered()
+        self.timestamps = np.full(capacity, -np.inf)
+        self.values = np.zeros((capacity, values.shape[1]), dtype=np.float64)
+        self.timestamps[:len(timestamps)] = timestamps
+        self.values[:len(values)] = values
+        self.head = len(timestamps)
+
+    def reserve(self, count, retain_from):
+        # Grows the ring until writing count readings overwrites nothing at or after retain_from
+        capacity = len(self.timestamps)
+        stored = min(self.head, capacity)
+        oldest = self.head % capacity if self.head >= capacity else 0
+        new_capacity = capacity
+        while stored + count > new_capacity:
+            overwritten = stored + count - new_capacity
+            if count <= new_capacity and not (
+                    self.timestamps[(oldest + np.arange(overwritten)) % capacity] >= retain_from).any():
+                break
+            new_capacity *= 2
+        if new_capacity != capacity:
+            self.grow(new_capacity)
+            self.resizes += 1
+
+    def append(self, timestamp, values, retain_from):
+        capacity = len(self.timestamps)
+        index = self.head % capacity
+        if self.head >= capacity and self.timestamps[index] >= retain_from:
+            self.reserve(1, retain_from)
+            index = self.head % len(self.timestamps)
+        self.timestamps[index] = timestamp
+        self.values[index] = values
+        self.head += 1
+
+    def extend(self, timestamps, values, retain_from):
+        if self.head + len(timestamps) > len(self.timestamps):
+            self.reserve(len(timestamps), retain_from)
+        capacity = len(self.timestamps)
+        indexes = (self.head + np.arange(len(timestamps))) % capacity
+        self.timestamps[indexes] = timestamps
+        self.values[indexes] = values
+        self.head += len(timestamps)
+
+
+class StreamAggregator:
+    def __init__(self, window_seconds=60, slide_seconds=None, allowed_lateness=5, capacity=1024,
+                 percentiles=(50, 95, 99), metrics=METRICS):
+        self.window = float(window_seconds)
+        self.slide = float(slide_seconds or window_seconds)
+        self.lateness = float(allowed_lateness)
+        self.capacity = capacity
+        self.percentiles = tuple(percentiles)
+        self._percentile_fractions = np.array(self.percentiles, dtype=np.float64) / 100.0
+        self.metrics = tuple(metrics)
+        self.devices = {}
+        self.late_dropped = 0
+        self.emitted = []
+
+    def _ring(self, device_id):
+        ring = self.devices.get(device_id)
+        if ring is None:
+            ring = self.devices[device_id] = DeviceRing(self.capacity, len(self.metrics))
+        return ring
+
+    def _retain_from(self, ring, earliest):
+        # Oldest timestamp an open window or current() can still read
+        if ring.next_window_start is None:
+            ring.next_window_start = np.floor(earliest / self.slide) * self.slide
+        return min(ring.next_window_start, ring.watermark - self.window)
+
+    @property
+    def resizes(self):
+        return sum(ring.resizes for ring in self.devices.values())
+
+    def add(self, device_id, timestamp, values):
+        ring = self._ring(device_id)
+        if timestamp < ring.watermark - self.lateness:
+            self.late_dropped += 1
+            return False
+        ring.append(timestamp, values, self._retain_from(ring, timestamp))
+        if timestamp > ring.watermark:
+            self._advance(device_id, ring, timestamp)
+        return True
+
+    def add_batch(self, device_id, timestamps, values):
+        # Vectorized path for compacted messages carrying many readings of one device
+        ring = self._ring(device_id)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        on_time = timestamps >= ring.watermark - self.lateness
+        self.late_dropped += int(len(timestamps) - on_time.sum())
+        if not on_time.any():
+            return 0
+        timestamps, values = timestamps[on_time], values[on_time]
+        ring.extend(timestamps, values, self._retain_from(ring, timestamps.min()))
+        newest = timestamps.max()
+        if newest > ring.watermark:
+            self._advance(device_id, ring, newest)
+        return len(timestamps)
+
+    def add_payload(self, payload):
+        # Accepts a raw mock_data_publisher message in either the JSON or the binary format
+        device_id, _, readings = decode_payload(payload)
+        timestamps = [r['Epoch'] for r in readings]
+        values = [[r[m] for m in self.metrics] for r in readings]
+        return self.add_batch(device_id, timestamps, values)
+
+    def _advance(self, device_id, ring, watermark):
+        ring.watermark = watermark
+        while ring.next_window_start + self.window + self.lateness <= watermark:
+            start = ring.next_window_start
+            result = self._window_stats(ring, start, start + self.window)
+            if result is not None:
+                self.emitted.append(dict(result, DeviceId=device_id, WindowStart=start, WindowEnd=start + self.window))
+            ring.next_window_start += self.slide
+
+    def _window_stats(self, ring, start, end):
+        mask = (ring.timestamps >= start) & (ring.timestamps < end)
+        count = int(mask.sum())
+        if count == 0:
+            return None
+        # One sort per window gives min, max and every percentile (linear interpolation, as
+        # np.percentile) without np.percentile's per-call overhead
+        ordered = np.sort(ring.values[mask], axis=0)
+        means = (ordered.sum(axis=0) / count).tolist()
+        minimums, maximums = ordered[0].tolist(), ordered[-1].tolist()
+        positions = self._percentile_fractions * (count - 1)
+        lower = np.floor(positions).astype(np.intp)
+        upper = np.minimum(lower + 1, count - 1)
+        weights = (positions - lower)[:, None]
+        quantiles = (ordered[lower] * (1 - weights) + ordered[upper] * weights).tolist()
+        result = {'Count': count}
+        for i, metric in enumerate(self.metrics):
+            stats = {'mean': means[i], 'min': minimums[i], 'max': maximums[i]}
+            for j, pct in enumerate(self.percentiles):
+                stats[f'p{pct}'] = quantiles[j][i]
+            result[metric] = stats
+        return result
+
+    def current(self, device_id):
+        # Aggregates of the latest window_seconds for the device, whether or not it has closed
+        ring = self.devices.get(device_id)
+        if ring is None or ring.watermark == -np.inf:
+            return None
+        return self._window_stats(ring, ring.watermark - self.window, ring.watermark + 1e-9)
+
+    def poll(self):
+        emitted, self.emitted = self.emitted, []
+        return emitted
+
+    def snapshot(self):
+        # Rings may have grown to different sizes; each is stored oldest first and padded
+        device_ids = list(self.devices)
+        rings = [self.devices[d] for d in device_ids]
+        width = max([len(r.timestamps) for r in rings] + [self.capacity])
+        timestamps = np.full((len(rings), width), -np.inf)
+        values = np.zeros((len(rings), width, len(self.metrics)))
+        counts = []
+        for i, ring in enumerate(rings):
+            ring_timestamps, ring_values = ring.ordered()
+            timestamps[i, :len(ring_timestamps)] = ring_timestamps
+            values[i, :len(ring_values)] = ring_values
+            counts.append(len(ring_timestamps))
+        return {
+            'config': np.array([self.window, self.slide, self.lateness, self.capacity]),
+            'percentiles': np.array(self.percentiles, dtype=np.float64),
+            'metrics': np.array(self.metrics),
+            'device_ids': np.array(device_ids),
+            'timestamps': timestamps,
+            'values': values,
+            'state': np.array([[count, r.watermark, np.nan if r.next_window_start is None else r.next_window_start]
+                               for count, r in zip(counts, rings)]).reshape(-1, 3),
+            'late_dropped': np.array(self.late_dropped)
+        }
+
+    def save(self, path):
+        np.savez(path, **self.snapshot())
+
+    @classmethod
+    def restore(cls, snapshot):
+        window, slide, lateness, capacity = snapshot['config']
+        aggregator = cls(window, slide, lateness, int(capacity),
+                         percentiles=tuple(int(p) for p in snapshot['percentiles']),
+                         metrics=tuple(str(m) for m in snapshot['metrics']))
+        for i, device_id in enumerate(snapshot['device_ids']):
+            ring = aggregator.devices[str(device_id)] = DeviceRing(snapshot['timestamps'].shape[1],
+                                                                   len(aggregator.metrics))
+            ring.timestamps[:] = snapshot['timestamps'][i]
+            ring.values[:] = snapshot['values'][i]
+            head, watermark, next_window_start = snapshot['state'][i]
+            ring.head = int(head)
+            ring.watermark = watermark
+            ring.next_window_start = None if np.isnan(next_window_start) else next_window_start
+        aggregator.late_dropped = int(snapshot['late_dropped'])
+        return aggregator
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as snapshot:
+            return cls.restore(snapshot)
+
+
+def benchmark(devices, readings, batch_size):
+    rng = np.random.default_rng(0)
+    values = np.column_stack([rng.uniform(20, 30, readings), rng.uniform(30, 70, readings),
+                              rng.uniform(400, 800, readings)])
+    # Each device reports once per second; timestamps get up to 3 seconds of jitter so some
+    # arrive out of order but inside the lateness bound
+    timestamps = np.repeat(np.arange(readings // devices + 1), devices)[:readings] + rng.uniform(0, 3, readings)
+    device_ids = [f"sensor-{i:05d}" for i in range(devices)]
+
+    # One reading per second per device: 128 slots cover the 60 s window plus lateness
+    aggregator = StreamAggregator(window_seconds=60, slide_seconds=10, allowed_lateness=5, capacity=128)
+    start = time.perf_counter()
+    if batch_size == 1:
+        value_rows = values.tolist()
+        ts = timestamps.tolist()
+        for i in range(readings):
+            aggregator.add(device_ids[i % devices], ts[i], value_rows[i])
+    else:
+        for offset in range(0, readings, devices * batch_size):
+            block = slice(offset, min(offset + devices * batch_size, readings))
+            block_ts, block_values = timestamps[block], values[block]
+            for d in range(devices):
+                aggregator.add_batch(device_ids[d], block_ts[d::devices], block_values[d::devices])
+    elapsed = time.perf_counter() - start
+    windows = len(aggregator.poll())
+    print(f"batch={batch_size:<3} {readings / elapsed:12,.0f} readings/sec windows_emitted={windows} "
+          f"late_dropped={aggregator.late_dropped} resizes={aggregator.resizes}")
+    return aggregator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the windowed stream aggregator on one core")
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--readings', type=int, default=1_000_000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 60])
+    args = parser.parse_args()
+
+    for batch_size in args.batch_sizes:
+        aggregator = benchmark(args.devices, args.readings, batch_size)
+
+    restored = StreamAggregator.restore(aggregator.snapshot())
+    device_id = next(iter(aggregator.devices))
+    print(f"snapshot/restore round trip matches: {restored.current(device_id) == aggregator.current(device_id)}")
@@ -0,0 +1,161 @@
+import codecs
+import csv
+import datetime
+import json
+import os
+import random
+import time
+from decimal import Decimal
+from itertools import islice
+
+# Athena query helpers: adaptive polling with a deadline, and typed row readers that page
+# through get_query_results or stream the CSV result object straight from S3.
+
+ATHENA_POLL_INITIAL = float(os.environ.get('ATHENA_POLL_INITIAL', '0.2'))
+ATHENA_POLL_MAX = float(os.environ.get('ATHENA_POLL_MAX', '5'))
+ATHENA_QUERY_TIMEOUT = float(os.environ.get('ATHENA_QUERY_TIMEOUT', '300'))
+ATHENA_PAGE_SIZE = 1000
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+
+def parse_timestamp(value):
+    return datetime.datetime.fromisoformat(value.replace(' UTC', ''))
+
+
+def parse_boolean(value):
+    return value.lower() == 'true'
+
+
+COLUMN_PARSERS = {
+    'boolean': parse_boolean,
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'int': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': Decimal,
+    'date': datetime.date.fromisoformat,
+    'timestamp': parse_timestamp,
+    'timestamp with time zone': parse_timestamp,
+}
+
+
+def column_parsers(column_info):
+    # Types without a parser (varchar, json, array, map, row, ...) stay strings
+    return [COLUMN_PARSERS.get(column['Type'].lower()) for column in column_info]
+
+
+def parse_value(value, parser):
+    if value is None:
+        return None
+    if parser is None:
+        return value
+    if value == '':
+        return None
+    try:
+        return parser(value)
+    except ValueError:
+        return value
+
+
+def parse_row(values, names, parsers):
+    return {name: parse_value(value, parser) for name, value, parser in zip(names, values, parsers)}
+
+
+class QueryRows(list):
+    # Typed result rows; truncated is set when the query returned more than the row limit
+    truncated = False
+
+
+def read_rows(rows, limit):
+    # Reads one row past the limit to tell whether the result was cut off; 0 reads every row
+    result = QueryRows(islice(rows, limit + 1) if limit > 0 else rows)
+    if limit > 0 and len(result) > limit:
+        del result[limit:]
+        result.truncated = True
+    return result
+
+
+def rows_json(rows):
+    # Decimal, date and timestamp values are sent as their string form
+    return json.dumps(rows, default=str)
+
+
+def poll_delay(attempt, statistics=None):
+    # Exponential backoff, stretched for long-running queries: once a query has run for a
+    # while it is unlikely to finish in the next few hundred milliseconds
+    delay = ATHENA_POLL_INITIAL * (2 ** attempt)
+    if statistics:
+        running = (statistics.get('EngineExecutionTimeInMillis', 0) +
+                   statistics.get('QueryQueueTimeInMillis', 0)) / 1000.0
+        delay = max(delay, running / 4)
+    delay = min(delay, ATHENA_POLL_MAX)
+    return random.uniform(delay / 2, delay)
+
+
+def wait_for_query(athena_client, query_execution_id, timeout=ATHENA_QUERY_TIMEOUT,
+                   sleep=time.sleep, clock=time.monotonic):
+    # Returns the final QueryExecution; a query still running at the deadline is cancelled
+    deadline = clock() + timeout
+    attempt = 0
+    while True:
+        execution = athena_client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+        if execution['Status']['State'] in TERMINAL_STATES:
+            return execution
+        remaining = deadline - clock()
+        if remaining <= 0:
+            athena_client.stop_query_execution(QueryExecutionId=query_execution_id)
+            execution['Status'] = {'State': 'CANCELLED',
+                                   'StateChangeReason': f'Query timed out after {timeout:.0f} seconds'}
+            return execution
+        sleep(min(poll_delay(attempt, execution.get('Statistics')), remaining))
+        attempt += 1
+
+
+def iter_result_rows(athena_client, query_execution_id, page_size=ATHENA_PAGE_SIZE):
+    # Yields typed rows page by page; the first row of the first page is the header
+    kwargs = {'QueryExecutionId': query_execution_id, 'MaxResults': page_size}
+    first_page = True
+    while True:
+        response = athena_client.get_query_results(**kwargs)
+        result_set = response.get('ResultSet', {})
+        rows = result_set.get('Rows', [])
+        if first_page:
+            column_info = result_set.get('ResultSetMetadata', {}).get('ColumnInfo', [])
+            names = [column['Name'] for column in column_info]
+            parsers = column_parsers(column_info)
+            rows = rows[1:]
+            first_page = False
+        for row in rows:
+            yield parse_row([field.get('VarCharValue') for field in row.get('Data', [])], names, parsers)
+        if 'NextToken' not in response:
+            return
+        kwargs['NextToken'] = response['NextToken']
+
+
+def split_s3_uri(uri):
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def iter_csv_rows(athena_client, s3_client, query_execution):
+    # Streams the CSV Athena wrote to the output location; one single-row result call
+    # supplies the column types
+    query_execution_id = query_execution['QueryExecutionId']
+    metadata = athena_client.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+    column_info = metadata['ResultSet']['ResultSetMetadata']['ColumnInfo']
+    names = [column['Name'] for column in column_info]
+    parsers = column_parsers(column_info)
+
+    bucket, key = split_s3_uri(query_execution['ResultConfiguration']['OutputLocation'])
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    # QUOTE_NOTNULL (Python 3.12+) reads unquoted empty fields as None, keeping NULL apart
+    # from the empty string; older versions read both as ''
+    quoting = getattr(csv, 'QUOTE_NOTNULL', csv.QUOTE_MINIMAL)
+    reader = csv.reader(codecs.getreader('utf-8')(body), quoting=quoting)
+    next(reader, None)
+    for values in reader:
+        yield parse_row(values, names, parsers)
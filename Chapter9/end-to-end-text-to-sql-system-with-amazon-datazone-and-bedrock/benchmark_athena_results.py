@@ -0,0 +1,102 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import tempfile
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+
+import tools
+from athena_results import TERMINAL_STATES, iter_csv_rows, iter_result_rows, wait_for_query
+from stub_clients import StubAthena, StubS3
+
+# Checks the Athena readers against a fake client with multi-page results, then compares
+# fixed 2-second polling with adaptive polling on a simulated clock: number of
+# get_query_execution calls and how late the completion is noticed.
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def fixed_polling(athena, query_execution_id, clock):
+    # The previous loop in run_athena_query
+    while True:
+        execution = athena.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+        if execution['Status']['State'] in TERMINAL_STATES:
+            return execution
+        clock.sleep(2)
+
+
+def check_readers(rows, page_size):
+    athena = StubAthena(rows=rows, page_size=page_size, latency_ms=0)
+    execution_id = athena.start_query_execution(QueryString="SELECT 1")['QueryExecutionId']
+    execution = athena.get_query_execution(QueryExecutionId=execution_id)['QueryExecution']
+
+    paged = list(iter_result_rows(athena, execution_id, page_size=page_size))
+    pages = athena.calls['get_query_results']
+    streamed = list(iter_csv_rows(athena, StubS3(athena, latency_ms=0), execution))
+    assert len(paged) == rows, (len(paged), rows)
+    if not hasattr(csv, 'QUOTE_NOTNULL'):
+        # Before Python 3.12 the CSV reader cannot tell a NULL string from an empty one
+        paged_as_csv = [dict(row, name=row['name'] or '') for row in paged]
+        assert paged_as_csv == streamed
+    else:
+        assert paged == streamed
+    assert isinstance(paged[1]['id'], int) and isinstance(paged[1]['amount'], float)
+    assert isinstance(paged[1]['day'], datetime.date) and paged[3]['id'] is None
+    print(f"rows={rows} page_size={page_size}: paged reader {len(paged)} rows over {pages} pages, "
+          f"CSV reader identical, types ok")
+
+    # run_athena_query end to end; the old code returned only the first page. Above
+    # ATHENA_MAX_ROWS the result is cut off and the agent is told so
+    tools.athena_client = athena
+    code, result = tools.run_athena_query('sql-db', "SELECT * FROM orders")
+    expected = min(rows, tools.maxResultRows) if tools.maxResultRows > 0 else rows
+    assert code == 'SUCCEEDED' and len(result) == expected and result.truncated == (expected < rows)
+    body = tools.format_sql_response("SELECT * FROM orders", result)
+    assert json.loads(body['sql_query_results'])[0] == json.loads(json.dumps(result[0], default=str))
+    print(f"run_athena_query returned {len(result)} typed rows, truncated={result.truncated}, "
+          f"first as sent to the agent: {json.dumps(result[0], default=str)}")
+
+
+def compare_polling(run_seconds, timeout):
+    for label in ('fixed 2s', 'adaptive'):
+        clock = VirtualClock()
+        athena = StubAthena(run_seconds=run_seconds, latency_ms=0, clock=clock)
+        execution_id = athena.start_query_execution(QueryString="SELECT 1")['QueryExecutionId']
+        if label == 'adaptive':
+            execution = wait_for_query(athena, execution_id, timeout=timeout, sleep=clock.sleep, clock=clock)
+        else:
+            execution = fixed_polling(athena, execution_id, clock)
+        lag = clock.now - run_seconds if execution['Status']['State'] == 'SUCCEEDED' else float('nan')
+        print(f"query {run_seconds:6.1f}s {label:<9} polls={athena.calls['get_query_execution']:<4} "
+              f"state={execution['Status']['State']:<9} detected {lag:5.2f}s after completion")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2500)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    check_readers(args.rows, args.page_size)
+    for run_seconds in (0.3, 1.5, 8, 45, 240):
+        compare_polling(run_seconds, args.timeout)
+    # A query still running at the deadline is stopped instead of polled forever
+    clock = VirtualClock()
+    athena = StubAthena(run_seconds=10_000, latency_ms=0, clock=clock)
+    execution_id = athena.start_query_execution(QueryString="SELECT 1")['QueryExecutionId']
+    execution = wait_for_query(athena, execution_id, timeout=args.timeout, sleep=clock.sleep, clock=clock)
+    print(f"query that never finishes: {execution['Status']} after {clock.now:.0f}s, "
+          f"stop_query_execution calls={athena.calls.get('stop_query_execution', 0)}")
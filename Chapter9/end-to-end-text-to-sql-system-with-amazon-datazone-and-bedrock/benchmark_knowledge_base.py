@@ -0,0 +1,117 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+
+import tools
+from reference_cache import ReferenceCache
+from schema_cache import SchemaCache
+from stub_clients import StubBedrockAgent, StubBedrockAgentRuntime, StubGlue
+
+# Cold start and per-question latency of fetch_knowledge_base_references with stubbed
+# knowledge base clients: the original retrieve_and_generate path against retrieve-only, with
+# and without the reference cache. Questions repeat with different casing and punctuation,
+# as agent traffic does.
+
+QUESTIONS = ["How many orders did each store take last month?", "Which store has the highest revenue?",
+             "What is the average order amount per day?", "List the top 5 stores by order count.",
+             "How many customers ordered more than twice?", "What was the total revenue in 2023?",
+             "Which products are ordered most often?", "How many orders were refunded?"]
+
+IMPORT_TIMER = """
+import time
+start = time.perf_counter()
+import tools
+imported = time.perf_counter() - start
+start = time.perf_counter()
+tools.get_bedrock_agent_client()
+tools.get_bedrock_agent_runtime_client()
+print(imported, time.perf_counter() - start)
+"""
+
+
+def cold_start(agent):
+    # Import time of tools.py now, the cost of the clients it no longer creates at import, and
+    # the knowledge base listing that the original module ran at import
+    output = subprocess.run([sys.executable, '-c', IMPORT_TIMER], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    imported, clients = float(output[0]), float(output[1])
+    tools.bedrock_agent_client = agent
+    start = time.perf_counter()
+    tools.find_knowledge_base_id()
+    listing = time.perf_counter() - start
+    print(f"import tools.py (lazy):            {imported * 1000:8.1f} ms")
+    print(f"  + knowledge base clients:        {clients * 1000:8.1f} ms")
+    print(f"  + list_knowledge_bases scan:     {listing * 1000:8.1f} ms ({agent.total_calls()} pages)")
+    print(f"cold start when all ran at import: {(imported + clients + listing) * 1000:8.1f} ms")
+
+
+def variants(question, rng):
+    question = question.lower() if rng.random() < 0.3 else question
+    return question.rstrip('?.') if rng.random() < 0.3 else question
+
+
+def run(label, requests, mode, use_cache, latency_ms, generate_ms):
+    rng = random.Random(3)
+    agent = StubBedrockAgent(latency_ms=0)
+    runtime = StubBedrockAgentRuntime(latency_ms=latency_ms, generate_ms=generate_ms)
+    tools.bedrock_agent_client = agent
+    tools.bedrock_agent_runtime_client = runtime
+    tools.schema_cache = SchemaCache(StubGlue(tables=0, latency_ms=0), cache_path=None)
+    tools.reference_cache = ReferenceCache(ttl_seconds=3600 if use_cache else 0)
+    latencies, references = [], 0
+    for _ in range(requests):
+        question = variants(QUESTIONS[min(int(rng.expovariate(0.5)), len(QUESTIONS) - 1)], rng)
+        start = time.perf_counter()
+        references += len(tools.fetch_knowledge_base_references(question, mode=mode))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{label:<28} mean={sum(latencies) / requests * 1000:8.1f} ms  p50={latencies[requests // 2] * 1000:8.1f} ms  "
+          f"model_calls={runtime.total_calls():<4} references/question={references / requests:.1f}")
+    return agent, runtime
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--retrieve-ms', type=float, default=150)
+    parser.add_argument('--generate-ms', type=float, default=2500)
+    args = parser.parse_args()
+
+    cold_start(StubBedrockAgent(knowledge_bases=300, latency_ms=60))
+    print()
+    run("retrieve_and_generate", args.requests, 'generate', False, args.retrieve_ms, args.generate_ms)
+    run("retrieve, no cache", args.requests, 'retrieve', False, args.retrieve_ms, args.generate_ms)
+    agent, runtime = run("retrieve + reference cache", args.requests, 'retrieve', True, args.retrieve_ms,
+                         args.generate_ms)
+    print(f"reference cache stats: {tools.reference_cache.stats}")
+
+    # A knowledge base sync changes the version; once the version is refreshed the next
+    # lookup retrieves again instead of serving cached chunks
+    calls = runtime.total_calls()
+    agent.updated_at = agent.updated_at.replace(year=2025)
+    tools.schema_cache = SchemaCache(StubGlue(tables=0, latency_ms=0), cache_path=None)
+    tools.fetch_knowledge_base_references(QUESTIONS[0])
+    print(f"after a sync: retrieve called again = {runtime.total_calls() > calls}")
+
+    # Without permission to describe the knowledge base the failed version lookup is cached
+    # too, so it costs one bedrock-agent call per TTL rather than one per request
+    def denied(**kwargs):
+        agent.calls['get_knowledge_base'] = agent.calls.get('get_knowledge_base', 0) + 1
+        raise PermissionError("AccessDeniedException: bedrock:GetKnowledgeBase")
+
+    agent.get_knowledge_base = denied
+    agent.calls.clear()
+    tools.schema_cache = SchemaCache(StubGlue(tables=0, latency_ms=0), cache_path=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for question in QUESTIONS[:5]:
+            tools.fetch_knowledge_base_references(question)
+    print(f"denied version lookup: get_knowledge_base calls for 5 requests = {agent.calls['get_knowledge_base']}")
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+
+import tools
+from model_invocation import astream_completion, claude_request, invoke_completion, stream_completion
+from stub_clients import StubBedrockRuntime
+
+# Time to first token and total latency of blocking, streamed and early-stopped Claude calls
+# against a local streaming stub, plus concurrent calls through the asyncio interface.
+# The stub answers like claude-v2 often does: the statement, then an explanation.
+
+SQL = ("SELECT o.store_id, count(*) AS orders\nFROM orders o\n"
+       "WHERE o.status = 'done;shipped' -- not the end;\nGROUP BY o.store_id;")
+EXPLANATION = ("\n\nThis query counts the orders of every store. It filters the orders to the ones that "
+               "were shipped and groups the remaining rows by the store identifier so that each store "
+               "appears once in the result, together with the number of its orders.")
+
+
+def measure(label, fn, repeats):
+    runs = []
+    for _ in range(repeats):
+        timings = {}
+        text = fn(timings)
+        runs.append(timings)
+    ttft = statistics.mean(t['first_token'] for t in runs) * 1000
+    total = statistics.mean(t['total'] for t in runs) * 1000
+    print(f"{label:<32} first token {ttft:7.1f} ms   total {total:7.1f} ms   chars={len(text)}")
+    return text
+
+
+async def concurrent_calls(count):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(tools.invoke_claude_async("How many orders per store?",
+                                                               stop_at_statement_end=True) for _ in range(count)))
+    assert all(r == SQL for r in results)
+    return time.perf_counter() - start
+
+
+async def async_first_token(client, body):
+    start = time.perf_counter()
+    first = None
+    async for _ in astream_completion(client, "anthropic.claude-v2", body):
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--first-token-ms', type=float, default=300)
+    parser.add_argument('--token-ms', type=float, default=15)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    client = StubBedrockRuntime(lambda prompt, temperature: SQL + EXPLANATION,
+                                latency_ms=args.first_token_ms, token_ms=args.token_ms)
+    body = claude_request(tools.format_claude_prompt("How many orders per store?"), 1024)
+    model_id = "anthropic.claude-v2"
+
+    measure("invoke_model (blocking)", lambda t: invoke_completion(client, model_id, body, t), args.repeats)
+    measure("response stream, full", lambda t: stream_completion(client, model_id, body, False, t), args.repeats)
+    text = measure("response stream, stop at ';'", lambda t: stream_completion(client, model_id, body, True, t),
+                   args.repeats)
+    assert text == SQL, text
+    print(f"early stop left the stream after {client.streams[-1].sent} of {len(client.streams[-1].pieces)} chunks")
+
+    first, total = asyncio.run(async_first_token(client, body))
+    print(f"{'async stream generator':<32} first token {first * 1000:7.1f} ms   total {total * 1000:7.1f} ms")
+
+    tools.bedrock_runtime = client
+    tools.streamResponses = True
+    elapsed = asyncio.run(concurrent_calls(args.concurrency))
+    single = client.latency + client.token_seconds * (len(SQL) / 4)
+    print(f"{args.concurrency} concurrent invoke_claude_async calls in {elapsed * 1000:.0f} ms "
+          f"(~{single * args.concurrency * 1000:.0f} ms back to back)")
@@ -0,0 +1,88 @@
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+
+import tools
+from schema_cache import SchemaCache
+from stub_clients import StubBedrockAgent, StubGlue
+
+# Compares schema and knowledge base lookups without the cache (every request lists Glue
+# tables and pages through list_knowledge_bases), on a cold cache, on a warm container and
+# on a new container that loads the persisted cache file. The AWS clients are local stubs.
+
+
+def legacy_lookup(glue, agent, database_name):
+    # The original code: one un-paginated get_tables call plus a full knowledge base scan
+    tables = glue.get_tables(DatabaseName=database_name)['TableList']
+    tools.bedrock_agent_client = agent
+    tools.find_knowledge_base_id()
+    return tables
+
+
+def cached_lookup(database_name):
+    schemas = tools.fetch_table_schema(database_name)
+    tools.get_knowledge_base_id()
+    return schemas
+
+
+def check_completeness_and_misses(glue, database_name):
+    # Every page is listed whatever the table names look like, and a missing lookup is retried
+    glue.tables.append(dict(glue.tables[0], Name='été_sales'))
+    cache = SchemaCache(glue, cache_path='')
+    assert len(cache.get_schemas(database_name)) == len(glue.tables)
+    glue.tables.pop()
+    lookups = []
+    for _ in range(2):
+        assert cache.get_metadata('kb', lambda: lookups.append(1)) is None
+    assert len(lookups) == 2
+    print("all tables listed, misses not cached: ok")
+
+
+def timed(label, fn, glue, agent, requests):
+    glue.calls.clear()
+    agent.calls.clear()
+    start = time.perf_counter()
+    for _ in range(requests):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / requests * 1000
+    print(f"{label:<26} {elapsed:9.1f} ms/request  tables={len(result):<5} "
+          f"glue_calls={glue.total_calls():<4} kb_calls={agent.total_calls()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tables', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    args = parser.parse_args()
+
+    database = 'sales_db'
+    glue = StubGlue(tables=args.tables, latency_ms=args.latency_ms)
+    agent = StubBedrockAgent(latency_ms=args.latency_ms)
+    tools.bedrock_agent_client = agent
+
+    check_completeness_and_misses(StubGlue(tables=args.tables, latency_ms=0), database)
+    timed("no cache", lambda: legacy_lookup(glue, agent, database), glue, agent, 3)
+
+    if tools.schema_cache.cache_path and os.path.exists(tools.schema_cache.cache_path):
+        os.remove(tools.schema_cache.cache_path)
+    tools.schema_cache = SchemaCache(glue)
+    timed("cold cache", lambda: cached_lookup(database), glue, agent, 1)
+    timed("warm container", lambda: cached_lookup(database), glue, agent, args.requests)
+
+    # A fresh container: new SchemaCache instance that loads the file written above
+    tools.schema_cache = SchemaCache(glue)
+    timed("new container, warm file", lambda: cached_lookup(database), glue, agent, args.requests)
+
+    # After the TTL the tables are listed again; an altered table changes the schema version
+    clock = [time.time()]
+    tools.schema_cache = SchemaCache(glue, clock=lambda: clock[0])
+    version = tools.schema_cache.get_schema_version(database)
+    glue.tables[0]['UpdateTime'] = glue.tables[0]['UpdateTime'].replace(year=2025)
+    clock[0] += tools.schema_cache.ttl + 1
+    print(f"schema version changed after TTL refresh: {tools.schema_cache.get_schema_version(database) != version} "
+          f"stats={tools.schema_cache.stats}")
@@ -0,0 +1,85 @@
+import argparse
+import random
+
+from schema_retrieval import SchemaIndex, estimate_tokens, format_schema
+
+# Measures prompt size and table recall of the pruned schema against the full schema on a
+# fixture warehouse: a retail schema the questions are about, padded with unrelated tables
+# of similar shape, as a shared Glue database usually is.
+
+RETAIL_TABLES = {
+    'customers': ['customer_id', 'first_name', 'last_name', 'email', 'city', 'state', 'signup_date', 'segment'],
+    'orders': ['order_id', 'customer_id', 'store_id', 'order_date', 'status', 'total_amount', 'channel'],
+    'order_items': ['order_item_id', 'order_id', 'product_id', 'quantity', 'unit_price', 'discount'],
+    'products': ['product_id', 'product_name', 'category', 'brand', 'list_price', 'supplier_id'],
+    'suppliers': ['supplier_id', 'supplier_name', 'country', 'rating'],
+    'stores': ['store_id', 'store_name', 'region', 'opened_date', 'square_feet'],
+    'employees': ['employee_id', 'store_id', 'full_name', 'role', 'hire_date', 'salary'],
+    'returns': ['return_id', 'order_item_id', 'return_date', 'reason', 'refund_amount'],
+    'inventory': ['store_id', 'product_id', 'on_hand', 'reorder_level', 'snapshot_date'],
+    'promotions': ['promotion_id', 'product_id', 'start_date', 'end_date', 'discount_pct'],
+    'shipments': ['shipment_id', 'order_id', 'carrier', 'shipped_date', 'delivered_date', 'shipping_cost'],
+    'web_sessions': ['session_id', 'customer_id', 'started_at', 'device', 'page_views', 'converted'],
+}
+
+QUESTIONS = [
+    ("What is the total revenue from orders placed last month?", {'orders'}),
+    ("Which customers in California placed more than five orders?", {'customers', 'orders'}),
+    ("List the top 10 products by quantity sold", {'products', 'order_items'}),
+    ("Which supplier provides the most products in the electronics category?", {'suppliers', 'products'}),
+    ("What is the average salary of employees per store region?", {'employees', 'stores'}),
+    ("How many returns were refunded because of damage?", {'returns'}),
+    ("Which products are below their reorder level in each store?", {'inventory', 'products', 'stores'}),
+    ("What was the average discount of active promotions?", {'promotions'}),
+    ("Which carrier has the longest average delivery time for shipments?", {'shipments'}),
+    ("What share of web sessions on mobile devices converted?", {'web_sessions'}),
+    ("Total refund amount by product category", {'returns', 'order_items', 'products'}),
+    ("How many new customers signed up per segment this year?", {'customers'}),
+    ("Average shipping cost per order channel", {'shipments', 'orders'}),
+    ("Which brand has the highest list price on average?", {'products'}),
+    ("Number of orders per store name", {'orders', 'stores'}),
+]
+
+FILLER_WORDS = ['audit', 'ledger', 'campaign', 'payroll', 'sensor', 'ticket', 'invoice', 'forecast', 'asset',
+                'contract', 'survey', 'license', 'vendor', 'budget', 'incident', 'warehouse', 'fleet', 'claim']
+FILLER_COLUMNS = ['created_at', 'updated_at', 'amount', 'status', 'owner', 'description', 'region_code',
+                  'score', 'notes', 'reference', 'period', 'category_code', 'source', 'value', 'flag']
+
+
+def fixture_schemas(filler_tables, seed=0):
+    rng = random.Random(seed)
+    schemas = [{"Table": table, "Schema": {c: 'string' for c in columns}} for table, columns in RETAIL_TABLES.items()]
+    for i in range(filler_tables):
+        a, b = rng.sample(FILLER_WORDS, 2)
+        table = f"{a}_{b}_{i:03d}"
+        columns = [f"{a}_id"] + rng.sample(FILLER_COLUMNS, rng.randint(6, 14))
+        schemas.append({"Table": table, "Schema": {c: rng.choice(['string', 'bigint', 'double', 'date'])
+                                                   for c in columns}})
+    rng.shuffle(schemas)
+    return schemas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filler-tables', type=int, default=300)
+    parser.add_argument('--top-k', type=int, nargs='+', default=[3, 5, 8])
+    args = parser.parse_args()
+
+    schemas = fixture_schemas(args.filler_tables)
+    full_tokens = estimate_tokens(format_schema(schemas))
+    index = SchemaIndex(schemas)
+    print(f"tables={len(schemas)} full schema ~{full_tokens} tokens per prompt")
+    for top_k in args.top_k:
+        tokens, recalled, missed = [], 0, []
+        for question, expected in QUESTIONS:
+            selected = index.select(question, top_k=top_k)
+            tokens.append(estimate_tokens(format_schema(selected)))
+            if expected <= {s['Table'] for s in selected}:
+                recalled += 1
+            else:
+                missed.append(question)
+        average = sum(tokens) / len(tokens)
+        print(f"top_k={top_k:<2} ~{average:7.0f} tokens per prompt ({1 - average / full_tokens:.1%} smaller) "
+              f"questions with all needed tables={recalled}/{len(QUESTIONS)}")
+        for question in missed:
+            print(f"  missed: {question}")
@@ -0,0 +1,114 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+# Scaled-down polling to match the scaled-down stub latencies below
+os.environ.setdefault('ATHENA_POLL_INITIAL', '0.02')
+os.environ.setdefault('ATHENA_POLL_MAX', '0.1')
+
+import tools
+from benchmark_schema_retrieval import fixture_schemas
+from schema_cache import SchemaCache
+from speculative_sql import race_queries, validate_sql
+from sql_cache import ResultCache, SQLCache
+from stub_clients import StubAthena, StubBedrockRuntime, StubGlue
+
+# End-to-end run_sql latency of the serial retry loop against speculative candidates, with
+# stub clients and injected delays. Every generated query independently references a table
+# that does not exist (caught locally), fails in Athena, or is correct.
+
+GOOD_SQL = "SELECT count(*) FROM orders"
+UNKNOWN_TABLE_SQL = "SELECT count(*) FROM order_history"
+FAILING_SQL = "SELECT count(bad_column) FROM orders"
+
+
+def make_responder(p_unknown_table, p_athena_error, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def responder(prompt, temperature):
+        with lock:
+            draw = rng.random()
+        if draw < p_unknown_table:
+            return UNKNOWN_TABLE_SQL
+        if draw < p_unknown_table + p_athena_error:
+            return FAILING_SQL + f" /* {draw:.6f} */"
+        return GOOD_SQL + f" /* {draw:.6f} */"
+    return responder
+
+
+def run(label, candidates, parallel_runs, args):
+    tools.SQL_CANDIDATES = candidates
+    tools.SQL_PARALLEL_RUNS = parallel_runs
+    tools.schema_cache = SchemaCache(StubGlue.from_schemas(fixture_schemas(50), latency_ms=0), cache_path=None)
+    tools.sql_cache = SQLCache(max_entries=0)
+    tools.result_cache = ResultCache(ttl_seconds=0)
+    tools.bedrock_runtime = StubBedrockRuntime(make_responder(args.p_unknown_table, args.p_athena_error, 7),
+                                               latency_ms=args.llm_ms)
+    tools.athena_client = StubAthena(run_seconds=args.athena_ms / 1000, latency_ms=5,
+                                     error=lambda sql: "COLUMN_NOT_FOUND: bad_column" if 'bad_column' in sql else None)
+
+    def timed_request(i):
+        start = time.perf_counter()
+        sql, results = tools.run_sql(f"How many orders are there? #{i}")
+        return time.perf_counter() - start, isinstance(results, list)
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(timed_request, range(args.requests)))
+    latencies = sorted(latency * 1000 for latency, _ in outcomes)
+    succeeded = sum(ok for _, ok in outcomes)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+    print(f"{label:<28} p50={pct(50):6.0f}ms p95={pct(95):6.0f}ms p99={pct(99):6.0f}ms "
+          f"success={succeeded}/{args.requests} llm_calls={tools.bedrock_runtime.calls['invoke_model']:<4} "
+          f"athena_queries={tools.athena_client.calls['start_query_execution']:<4} "
+          f"stopped={tools.athena_client.calls.get('stop_query_execution', 0)}")
+
+
+def check_validator():
+    # Valid Athena SQL whose FROM keywords or parentheses are not table references
+    for sql in ["SELECT extract(year FROM order_date) FROM orders",
+                "SELECT trim(BOTH ' ' FROM name) FROM orders",
+                "SELECT substring(name FROM 1 FOR 3) FROM orders",
+                "SELECT 'a ( b' AS label FROM orders -- from elsewhere"]:
+        assert validate_sql(sql, ['orders']) == (True, ""), sql
+    assert validate_sql("SELECT * FROM orders WHERE id IN (SELECT id FROM missing)", ['orders'])[0] is False
+
+    # A failure to start one query stops the ones already started
+    athena = StubAthena(latency_ms=0)
+
+    def start(sql):
+        if sql == 'broken':
+            raise RuntimeError("start failed")
+        return athena.start_query_execution(QueryString=sql)['QueryExecutionId']
+
+    with contextlib.suppress(RuntimeError):
+        race_queries(athena, start, ['first', 'second', 'broken'])
+    assert all(execution['stopped'] for execution in athena.executions.values())
+    print("validator and race cleanup checks: ok")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--llm-ms', type=float, default=300)
+    parser.add_argument('--athena-ms', type=float, default=400)
+    parser.add_argument('--p-unknown-table', type=float, default=0.15)
+    parser.add_argument('--p-athena-error', type=float, default=0.25)
+    args = parser.parse_args()
+
+    check_validator()
+
+    run("serial (1 candidate)", 1, 1, args)
+    run("speculative 3 cand, 2 runs", 3, 2, args)
+    run("speculative 4 cand, 3 runs", 4, 3, args)
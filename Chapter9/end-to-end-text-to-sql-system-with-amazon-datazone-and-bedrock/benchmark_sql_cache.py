@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import tempfile
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+os.environ.setdefault('SCHEMA_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'schema_cache.json'))
+
+import tools
+from benchmark_schema_retrieval import QUESTIONS, fixture_schemas
+from schema_cache import SchemaCache
+from sql_cache import ResultCache, SQLCache
+from stub_clients import StubAthena, StubBedrockRuntime, StubGlue
+
+# Replays a skewed stream of agent questions through run_sql with stub Glue, Claude and
+# Athena clients and counts the model and Athena calls with and without the SQL caches.
+# Each question is asked verbatim, with different case and punctuation, or with a small
+# wording change; the "top N" variants check that numbers never share cached SQL.
+
+
+def variants(question):
+    base = question.rstrip('?')
+    return [question, base.lower() + ' ?', 'Please tell me: ' + base.lower(), base + ' please']
+
+
+def workload(requests, seed=3):
+    rng = random.Random(seed)
+    phrasings = []
+    for index, (question, _) in enumerate(QUESTIONS):
+        phrasings.extend((phrasing, f"q{index}") for phrasing in variants(question))
+    for n in (3, 5, 10, 20):
+        phrasings.append((f"Which {n} stores had the highest total amount of orders?", f"top{n}"))
+    # Zipf-like popularity: a few questions dominate, as with dashboards and agent loops
+    weights = [1.0 / (rank + 1) for rank in range(len(phrasings))]
+    order = list(range(len(phrasings)))
+    rng.shuffle(order)
+    return [phrasings[i] for i in rng.choices(order, weights=weights, k=requests)]
+
+
+def replay(requests, use_cache):
+    intents = {}
+
+    def responder(prompt, temperature):
+        question = re.search(r'question:\s*"(.*)"', prompt).group(1)
+        return f"SELECT count(*) FROM orders /* {intents[question]}. */"
+
+    glue = StubGlue.from_schemas(fixture_schemas(300), latency_ms=0)
+    tools.schema_cache = SchemaCache(glue, cache_path=None)
+    tools.bedrock_runtime = StubBedrockRuntime(responder, latency_ms=0)
+    tools.athena_client = StubAthena(latency_ms=0)
+    tools.sql_cache = SQLCache(max_entries=1000 if use_cache else 0)
+    tools.result_cache = ResultCache(ttl_seconds=300 if use_cache else 0)
+
+    wrong = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for question, intent in workload(requests):
+            intents[question] = intent
+            sql, _ = tools.run_sql(question)
+            wrong += f"{intent}." not in sql
+    return tools.bedrock_runtime.calls.get('invoke_model', 0), tools.athena_client.calls, wrong, tools.sql_cache.stats
+
+
+def check_one_word_variants():
+    # Questions that differ in a single content word must never share SQL
+    cache = SQLCache()
+    base = "show the total sales for each region in the last month sorted in descending order"
+    cache.put('db', 'v1', base, "SELECT region_sales")
+    assert cache.get('db', 'v1', "Please show me the total sales for each region in the last month "
+                                 "sorted in descending order?") == ("SELECT region_sales", 'content_hits')
+    for variant in (base.replace('descending', 'ascending'), base.replace('region', 'country'),
+                    base.replace('sales', 'returns')):
+        sql, outcome = cache.get('db', 'v1', variant)
+        assert sql is None and outcome == 'misses', (variant, outcome)
+    print("one-word variants miss the cache: ok")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--llm-ms', type=float, default=2500, help="Typical Claude latency used for the estimate")
+    parser.add_argument('--athena-ms', type=float, default=1500, help="Typical Athena latency used for the estimate")
+    args = parser.parse_args()
+
+    check_one_word_variants()
+    baseline_llm, baseline_athena, _, _ = replay(args.requests, use_cache=False)
+    llm, athena, wrong, stats = replay(args.requests, use_cache=True)
+    saved_llm = baseline_llm - llm
+    saved_athena = baseline_athena.get('start_query_execution', 0) - athena.get('start_query_execution', 0)
+    print(f"requests={args.requests}")
+    print(f"no cache   llm_calls={baseline_llm} athena_queries={baseline_athena.get('start_query_execution', 0)}")
+    print(f"with cache llm_calls={llm} athena_queries={athena.get('start_query_execution', 0)} "
+          f"wrong_sql_reused={wrong} sql_cache={stats}")
+    print(f"saved {saved_llm} llm calls and {saved_athena} Athena queries, "
+          f"~{(saved_llm * args.llm_ms + saved_athena * args.athena_ms) / 1000:.0f}s of latency")
@@ -12,7 +12,7 @@ def lambda_handler(event, context):
     if api_path == "/run_sql":
         query = parameters.get('query', '')
         sql, sql_results = tools.run_sql(query)
-        response_body = {"application/json": {"body": {"generated_sql_query": str(sql), "sql_query_results": str(sql_results)}}}
+        response_body = {"application/json": {"body": tools.format_sql_response(sql, sql_results)}}
         response_code = 200
     else:
         body = {"{}::{} is not a valid api, try another one.".format(action, api_path)}
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.client import Config
+
+# Bedrock model invocation for the text-to-SQL tools: a pooled runtime client with adaptive
+# retries, streamed completions parsed chunk by chunk, an early stop once a SQL statement is
+# complete, and asyncio wrappers that keep the blocking boto3 calls off the event loop.
+
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '50'))
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '5'))
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', '120'))
+
+# Shared by the async wrappers; sized to the connection pool so threads never wait on it
+invocation_pool = ThreadPoolExecutor(max_workers=BEDROCK_MAX_POOL_CONNECTIONS)
+
+
+def runtime_config():
+    # Adaptive retry mode adds client-side rate limiting on throttling on top of backoff
+    return Config(
+        connect_timeout=5,
+        read_timeout=BEDROCK_READ_TIMEOUT,
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        retries={'max_attempts': BEDROCK_MAX_ATTEMPTS, 'mode': 'adaptive'},
+        tcp_keepalive=True
+    )
+
+
+def claude_request(prompt, max_tokens, temperature=0, stop_sequences=()):
+    return json.dumps({
+        "prompt": prompt,
+        "max_tokens_to_sample": max_tokens,
+        "temperature": temperature,
+        "top_k": 250,
+        "top_p": 0.999,
+        "stop_sequences": list(stop_sequences),
+    })
+
+
+class StatementScanner:
+    # Finds the ';' that ends a SQL statement across streamed chunks, ignoring semicolons
+    # inside string literals, quoted identifiers and comments
+    def __init__(self):
+        self.state = None
+        self.previous = ''
+
+    def feed(self, chunk):
+        for i, char in enumerate(chunk):
+            pair = self.previous + char
+            if self.state is None:
+                if char == ';':
+                    return i
+                if char in ("'", '"'):
+                    self.state = char
+                elif pair == '--':
+                    self.state = '--'
+                elif pair == '/*':
+                    self.state = '/*'
+                    char = ''
+            elif self.state in ("'", '"'):
+                if char == self.state:
+                    self.state = None
+            elif self.state == '--':
+                if char == '\n':
+                    self.state = None
+            elif self.state == '/*' and pair == '*/':
+                self.state = None
+                char = ''
+            self.previous = char
+        return -1
+
+
+def iter_stream_text(response):
+    # Yields completion text from an invoke_model_with_response_stream EventStream
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if chunk:
+            text = json.loads(chunk['bytes']).get('completion', '')
+            if text:
+                yield text
+
+
+def stream_completion(client, model_id, body, stop_at_statement_end=False, timings=None):
+    # Returns the streamed completion; with stop_at_statement_end the stream is closed as soon
+    # as the first SQL statement is complete. timings receives first_token/total seconds.
+    start = time.perf_counter()
+    response = client.invoke_model_with_response_stream(
+        body=body, modelId=model_id, accept="application/json", contentType="application/json"
+    )
+    scanner = StatementScanner() if stop_at_statement_end else None
+    parts = []
+    try:
+        for text in iter_stream_text(response):
+            if timings is not None and 'first_token' not in timings:
+                timings['first_token'] = time.perf_counter() - start
+            if scanner is not None:
+                end = scanner.feed(text)
+                if end >= 0:
+                    parts.append(text[:end + 1])
+                    break
+            parts.append(text)
+    finally:
+        close = getattr(response['body'], 'close', None)
+        if close is not None:
+            close()
+    if timings is not None:
+        timings['total'] = time.perf_counter() - start
+    return "".join(parts)
+
+
+def invoke_completion(client, model_id, body, timings=None):
+    start = time.perf_counter()
+    response = client.invoke_model(body=body, modelId=model_id, accept="application/json",
+                                   contentType="application/json")
+    completion = json.loads(response.get("body").read()).get("completion")
+    if timings is not None:
+        # Nothing is visible before the whole response arrives
+        timings['first_token'] = timings['total'] = time.perf_counter() - start
+    return completion
+
+
+async def run_async(fn, *args, **kwargs):
+    # Awaitable form of any blocking invocation above
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(invocation_pool, lambda: fn(*args, **kwargs))
+
+
+async def astream_completion(client, model_id, body):
+    # Async generator over streamed completion text; a worker thread reads the EventStream
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    cancelled = threading.Event()
+
+    def reader():
+        response = None
+        try:
+            response = client.invoke_model_with_response_stream(
+                body=body, modelId=model_id, accept="application/json", contentType="application/json"
+            )
+            for text in iter_stream_text(response):
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as error:
+            loop.call_soon_threadsafe(queue.put_nowait, error)
+        finally:
+            close = getattr(response['body'], 'close', None) if response is not None else None
+            if close is not None:
+                close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    future = loop.run_in_executor(invocation_pool, reader)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        await future
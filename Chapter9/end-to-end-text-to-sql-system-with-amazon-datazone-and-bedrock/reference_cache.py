@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sql_cache import normalize_question
+
+# Knowledge base references per question. Entries are keyed by the knowledge base id, its
+# version (which changes when the knowledge base or one of its data sources is updated, e.g.
+# by a sync), the retrieval settings and the normalized question. The version itself is
+# cached for the schema cache TTL, so chunks from before a sync can still be served until
+# that TTL runs out and the new version is read.
+
+KB_REFERENCE_TTL = int(os.environ.get('KB_REFERENCE_TTL', '3600'))
+KB_REFERENCE_CACHE_SIZE = int(os.environ.get('KB_REFERENCE_CACHE_SIZE', '512'))
+
+
+def dedupe_references(texts):
+    # Overlapping chunks and repeated citations often carry the same text; keep the first
+    # (highest ranked) occurrence of each
+    seen = set()
+    references = []
+    for text in texts:
+        key = " ".join(text.split())
+        if key and key not in seen:
+            seen.add(key)
+            references.append(text)
+    return references
+
+
+def knowledge_base_version(bedrock_agent_client, knowledge_base_id):
+    knowledge_base = bedrock_agent_client.get_knowledge_base(knowledgeBaseId=knowledge_base_id)['knowledgeBase']
+    parts = [str(knowledge_base.get('updatedAt'))]
+    paginator = bedrock_agent_client.get_paginator('list_data_sources')
+    for page in paginator.paginate(knowledgeBaseId=knowledge_base_id):
+        for source in page.get('dataSourceSummaries', []):
+            parts.append(f"{source['dataSourceId']}:{source.get('status')}:{source.get('updatedAt')}")
+    return hashlib.sha256(json.dumps(sorted(parts)).encode('utf-8')).hexdigest()[:16]
+
+
+class ReferenceCache:
+    def __init__(self, ttl_seconds=KB_REFERENCE_TTL, max_entries=KB_REFERENCE_CACHE_SIZE, clock=time.time):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, scope, question):
+        # scope: (knowledge base id, version, retrieval settings...)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return list(entry[1])
+            if entry is not None:
+                del self._entries[key]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, scope, question, references):
+        if self.ttl <= 0:
+            return
+        key = (scope, normalize_question(question))
+        with self._lock:
+            self._entries[key] = (self.clock(), tuple(references))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Table schemas are cached per database with a TTL. When an entry expires, the tables are
+# listed again and the schema version (table names plus their Glue UpdateTime) decides
+# whether dependants such as the SQL cache have to be invalidated.
+# SCHEMA_CACHE_PATH persists the cache so a new Lambda container can load it at init instead
+# of calling Glue. It must point to storage that outlives a container: an s3://bucket/key
+# URI, or a file on an EFS mount. /tmp belongs to a single container, where the in-memory
+# cache already survives between invocations, so it warms nothing. Empty disables it.
+
+SCHEMA_CACHE_TTL = int(os.environ.get('SCHEMA_CACHE_TTL', '900'))
+SCHEMA_CACHE_PATH = os.environ.get('SCHEMA_CACHE_PATH', '')
+
+
+def table_version(table):
+    update_time = table.get('UpdateTime') or table.get('CreateTime')
+    return update_time.isoformat() if hasattr(update_time, 'isoformat') else str(update_time)
+
+
+def schema_entry(table):
+    columns = table.get('StorageDescriptor', {}).get('Columns', [])
+    columns = columns + table.get('PartitionKeys', [])
+    return {"Table": table['Name'], "Schema": {column['Name']: column['Type'] for column in columns}}
+
+
+class SchemaCache:
+    def __init__(self, glue_client, ttl_seconds=SCHEMA_CACHE_TTL, cache_path=SCHEMA_CACHE_PATH, clock=time.time,
+                 s3_client=None):
+        self.glue_client = glue_client
+        self.ttl = ttl_seconds
+        self.cache_path = cache_path
+        self.clock = clock
+        self.s3_client = s3_client
+        self._databases = {}
+        self._metadata = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'refreshes': 0, 'version_changes': 0, 'glue_calls': 0}
+        self.load()
+
+    def _s3_location(self):
+        # (bucket, key) for an s3:// cache path, else None
+        if not self.cache_path.startswith('s3://'):
+            return None
+        if self.s3_client is None:
+            import boto3
+            self.s3_client = boto3.client('s3')
+        bucket, _, key = self.cache_path[len('s3://'):].partition('/')
+        return bucket, key
+
+    def load(self):
+        if not self.cache_path:
+            return
+        try:
+            location = self._s3_location()
+            if location is not None:
+                body = self.s3_client.get_object(Bucket=location[0], Key=location[1])['Body'].read()
+                state = json.loads(body)
+            elif os.path.exists(self.cache_path):
+                with open(self.cache_path) as f:
+                    state = json.load(f)
+            else:
+                return
+        except Exception as error:
+            print(f"Ignoring unreadable schema cache {self.cache_path}: {error}")
+            return
+        self._databases = state.get('databases', {})
+        self._metadata = state.get('metadata', {})
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            state = json.dumps({'databases': self._databases, 'metadata': self._metadata})
+        location = self._s3_location()
+        if location is not None:
+            try:
+                self.s3_client.put_object(Bucket=location[0], Key=location[1], Body=state.encode('utf-8'))
+            except Exception as error:
+                print(f"Error saving schema cache to {self.cache_path}: {error}")
+            return
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(state)
+        os.replace(tmp_path, self.cache_path)
+
+    def fetch_tables(self, database_name):
+        # Follows NextToken until Glue has returned every page. Each page's token comes from the
+        # previous response, so the chain is sequential; listing by name prefix in parallel
+        # cannot be checked for completeness and drops tables outside the prefixes.
+        tables = []
+        paginator = self.glue_client.get_paginator('get_tables')
+        for page in paginator.paginate(DatabaseName=database_name):
+            with self._lock:
+                self.stats['glue_calls'] += 1
+            tables.extend(page.get('TableList', []))
+        return tables
+
+    def refresh(self, database_name):
+        tables = self.fetch_tables(database_name)
+        versions = {table['Name']: table_version(table) for table in tables}
+        entry = {
+            'fetched_at': self.clock(),
+            'versions': versions,
+            'schemas': [schema_entry(table) for table in tables]
+        }
+        with self._lock:
+            previous = self._databases.get(database_name)
+            self.stats['refreshes'] += 1
+            if previous is not None and previous['versions'] != versions:
+                self.stats['version_changes'] += 1
+            self._databases[database_name] = entry
+        self.save()
+        return entry
+
+    def get_entry(self, database_name):
+        with self._lock:
+            entry = self._databases.get(database_name)
+            if entry is not None and self.clock() - entry['fetched_at'] < self.ttl:
+                self.stats['hits'] += 1
+                return entry
+        return self.refresh(database_name)
+
+    def get_schemas(self, database_name):
+        return self.get_entry(database_name)['schemas']
+
+    def get_schema_version(self, database_name):
+        # Stable identifier of the current table set; changes whenever any table is altered
+        versions = self.get_entry(database_name)['versions']
+        return hashlib.sha256(json.dumps(versions, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def invalidate(self, database_name=None):
+        with self._lock:
+            if database_name is None:
+                self._databases.clear()
+            else:
+                self._databases.pop(database_name, None)
+
+    def get_metadata(self, key, loader):
+        # Other slow lookups (e.g. the knowledge base id) share the same TTL and warm file
+        with self._lock:
+            entry = self._metadata.get(key)
+            if entry is not None and self.clock() - entry['fetched_at'] < self.ttl:
+                return entry['value']
+        value = loader()
+        if value is None:
+            # A miss (e.g. the knowledge base does not exist yet) is looked up again next time
+            return None
+        with self._lock:
+            self._metadata[key] = {'fetched_at': self.clock(), 'value': value}
+        self.save()
+        return value
@@ -0,0 +1,159 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# Selects the tables and columns relevant to a question before the schema is put into the
+# generate_sql prompt. Tables are ranked with BM25 over their table and column names (table
+# name tokens count double), optionally fused with embedding similarity, and tables referenced
+# through "<name>_id" columns of a selected table are added so joins stay possible.
+
+SCHEMA_TOP_K = int(os.environ.get('SCHEMA_TOP_K', '5'))
+SCHEMA_MAX_COLUMNS = int(os.environ.get('SCHEMA_MAX_COLUMNS', '25'))
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+KEY_SUFFIXES = ('_id', '_key')
+STOPWORDS = {
+    'a', 'all', 'an', 'and', 'are', 'by', 'did', 'do', 'does', 'each', 'for', 'from', 'how', 'in',
+    'is', 'last', 'list', 'many', 'me', 'most', 'much', 'of', 'on', 'per', 'show', 'than', 'that',
+    'the', 'their', 'there', 'to', 'top', 'was', 'were', 'what', 'which', 'who', 'with'
+}
+
+
+def stem(token):
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    # Splits snake_case, camelCase and free text into lower-case stems
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', text)
+    return [stem(t) for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    # Rough prompt size; Claude averages about four characters per token on schema text
+    return math.ceil(len(text) / 4)
+
+
+def format_schema(schemas):
+    return "\n".join([f"Table {s['Table']}: {s['Schema']}" for s in schemas])
+
+
+def referenced_table(column, table_names):
+    for suffix in KEY_SUFFIXES:
+        if column.endswith(suffix):
+            base = column[:-len(suffix)]
+            for candidate in (base, base + 's', base + 'es', base[:-1] + 'ies' if base.endswith('y') else None):
+                if candidate in table_names:
+                    return candidate
+    return None
+
+
+class SchemaIndex:
+    def __init__(self, schemas, embed_fn=None):
+        self.schemas = schemas
+        self.by_name = {s['Table']: s for s in schemas}
+        self.documents = []
+        self.column_tokens = []
+        for s in schemas:
+            table_tokens = tokenize(s['Table'])
+            columns = {column: set(tokenize(column)) for column in s['Schema']}
+            self.column_tokens.append(columns)
+            tokens = table_tokens * 2
+            for column_tokens in columns.values():
+                tokens.extend(column_tokens)
+            self.documents.append(Counter(tokens))
+        lengths = [sum(doc.values()) for doc in self.documents]
+        self.avg_length = sum(lengths) / max(len(lengths), 1)
+        self.lengths = lengths
+        self.postings = {}
+        for i, doc in enumerate(self.documents):
+            for token, tf in doc.items():
+                self.postings.setdefault(token, []).append((i, tf))
+        n = len(self.documents)
+        self.idf = {token: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for token, p in self.postings.items()}
+
+        self.embed_fn = embed_fn
+        self.vectors = None
+        if embed_fn is not None:
+            texts = [f"{s['Table']}: {', '.join(s['Schema'])}" for s in schemas]
+            vectors = np.asarray(embed_fn(texts), dtype=np.float32)
+            self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def lexical_scores(self, tokens):
+        scores = np.zeros(len(self.documents))
+        for token in set(tokens):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self.postings[token]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def rank(self, question):
+        scores = self.lexical_scores(tokenize(question))
+        lexical = [i for i in np.argsort(-scores, kind='stable') if scores[i] > 0]
+        if self.vectors is None:
+            return lexical
+        query = np.asarray(self.embed_fn([question])[0], dtype=np.float32)
+        similarity = self.vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        semantic = list(np.argsort(-similarity, kind='stable')[:max(len(lexical), SCHEMA_TOP_K * 4)])
+        fused = Counter()
+        for ranking in (lexical, semantic):
+            for position, i in enumerate(ranking):
+                fused[i] += 1.0 / (RRF_K + position + 1)
+        return [i for i, _ in fused.most_common()]
+
+    def prune_columns(self, index, question_tokens, max_columns):
+        schema = self.schemas[index]['Schema']
+        if len(schema) <= max_columns:
+            return schema
+        # Keep key columns and the ones mentioned in the question, then fill in table order
+        columns = self.column_tokens[index]
+        keep = [c for c in schema if c.endswith(KEY_SUFFIXES) or c == 'id' or columns[c] & question_tokens]
+        keep = keep[:max_columns]
+        keep += [c for c in schema if c not in keep][:max_columns - len(keep)]
+        return {c: schema[c] for c in schema if c in keep}
+
+    def select(self, question, top_k=SCHEMA_TOP_K, max_columns=SCHEMA_MAX_COLUMNS):
+        ranked = self.rank(question)
+        if not ranked:
+            # Nothing matched the question; fall back to the full schema rather than guessing
+            return self.schemas
+        selected = [self.schemas[i]['Table'] for i in ranked[:top_k]]
+        for table in list(selected):
+            for column in self.by_name[table]['Schema']:
+                target = referenced_table(column, self.by_name)
+                if target is not None and target not in selected:
+                    selected.append(target)
+        question_tokens = set(tokenize(question))
+        positions = {s['Table']: i for i, s in enumerate(self.schemas)}
+        return [{"Table": table, "Schema": self.prune_columns(positions[table], question_tokens, max_columns)}
+                for table in selected]
+
+
+class SchemaIndexCache:
+    # One index per (database, schema version); rebuilt only when the Glue tables change
+    def __init__(self, embed_fn=None):
+        self.embed_fn = embed_fn
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, database_name, version, schemas):
+        with self._lock:
+            cached = self._indexes.get(database_name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        index = SchemaIndex(schemas, self.embed_fn)
+        with self._lock:
+            self._indexes[database_name] = (version, index)
+        return index
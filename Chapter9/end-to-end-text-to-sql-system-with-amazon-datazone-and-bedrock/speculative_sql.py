@@ -0,0 +1,143 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from athena_results import ATHENA_QUERY_TIMEOUT, TERMINAL_STATES, poll_delay
+
+# Speculative mode for run_sql: several candidate queries are generated at once, checked
+# locally against the schema, and the most promising are raced on Athena. The first one to
+# succeed wins and the others are stopped, so a bad first answer no longer costs a full
+# serial generate-and-run cycle.
+
+SQL_CANDIDATES = int(os.environ.get('SQL_CANDIDATES', '1'))
+SQL_CANDIDATE_TEMPERATURE = float(os.environ.get('SQL_CANDIDATE_TEMPERATURE', '0.7'))
+SQL_PARALLEL_RUNS = int(os.environ.get('SQL_PARALLEL_RUNS', '2'))
+
+TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+((?:"[^"]+"|`[^`]+`|[\w$]+)(?:\.(?:"[^"]+"|`[^`]+`|[\w$]+))*)(\s*\()?',
+                             re.IGNORECASE)
+CTE_NAME = re.compile(r'(?:\bwith|,)\s*([\w$]+)\s+as\s*\(', re.IGNORECASE)
+# String literals (with '' escapes) and comments; double-quoted identifiers are kept
+LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+QUERY_START = re.compile(r'[\s(]*(select|with)\b', re.IGNORECASE)
+
+
+def extract_sql(text):
+    # Models sometimes wrap the query in a code fence or add a trailing explanation
+    fenced = re.search(r'```(?:sql)?\s*(.*?)```', text, re.DOTALL | re.IGNORECASE)
+    sql = fenced.group(1) if fenced else text
+    return sql.strip().rstrip(';').strip()
+
+
+def strip_literals(sql):
+    # Blanks out strings and comments so their contents are never read as SQL
+    return LITERAL_OR_COMMENT.sub(lambda m: "''" if m.group(0).startswith("'") else " ", sql)
+
+
+def query_positions(sql):
+    # For every character, whether its innermost parentheses hold a query (or it is at top
+    # level) rather than function arguments, where FROM is part of extract(year FROM d),
+    # trim(BOTH ' ' FROM s) or substring(s FROM 1 FOR 3)
+    stack = [True]
+    positions = []
+    for i, char in enumerate(sql):
+        if char == '(':
+            stack.append(bool(QUERY_START.match(sql, i + 1)))
+        elif char == ')' and len(stack) > 1:
+            stack.pop()
+        positions.append(stack[-1])
+    return positions
+
+
+def referenced_tables(sql):
+    sql = strip_literals(sql)
+    ctes = {name.lower() for name in CTE_NAME.findall(sql)}
+    in_query = query_positions(sql)
+    tables = set()
+    for match in TABLE_REFERENCE.finditer(sql):
+        reference, call = match.groups()
+        if call or not in_query[match.start()]:
+            continue  # table function such as unnest(...), or FROM inside a function call
+        name = reference.split('.')[-1].strip('"`').lower()
+        if name not in ctes:
+            tables.add(name)
+    return tables
+
+
+def validate_sql(sql, table_names):
+    # Cheap local dry run: a read-only statement over tables that exist in the schema
+    if not re.match(r'\s*(select|with|\()', sql, re.IGNORECASE):
+        return False, "Only SELECT queries can be run"
+    code = strip_literals(sql)
+    if code.count('(') != code.count(')'):
+        return False, "Unbalanced parentheses"
+    unknown = referenced_tables(sql) - {name.lower() for name in table_names}
+    if unknown:
+        return False, f"Unknown tables: {', '.join(sorted(unknown))}"
+    return True, ""
+
+
+def generate_candidates(generate_fn, count, max_workers=None):
+    # generate_fn(temperature) returns SQL text; the first candidate keeps temperature 0
+    temperatures = [0.0] + [SQL_CANDIDATE_TEMPERATURE] * (count - 1)
+    with ThreadPoolExecutor(max_workers=max_workers or count) as pool:
+        return list(pool.map(generate_fn, temperatures))
+
+
+def rank_candidates(candidates, table_names):
+    # Returns (valid, rejected): distinct candidates in generation order, plus rejection reasons
+    valid, rejected, seen = [], [], set()
+    for text in candidates:
+        sql = extract_sql(text)
+        key = " ".join(sql.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        ok, reason = validate_sql(sql, table_names)
+        if ok:
+            valid.append(sql)
+        else:
+            rejected.append((sql, reason))
+    return valid, rejected
+
+
+def race_queries(athena_client, start_fn, sqls, timeout=ATHENA_QUERY_TIMEOUT, sleep=time.sleep, clock=time.monotonic):
+    # Starts every query, polls them together and stops the rest once one succeeds.
+    # Returns (winning sql, its QueryExecution) or (None, [(sql, state, reason), ...]).
+    running = {}
+    try:
+        for sql in sqls:
+            running[start_fn(sql)] = sql
+    except Exception:
+        # Do not leave the queries that did start running on Athena
+        for query_execution_id in running:
+            athena_client.stop_query_execution(QueryExecutionId=query_execution_id)
+        raise
+    failures = []
+    deadline = clock() + timeout
+    attempt = 0
+    while running:
+        statistics = None
+        for query_execution_id, sql in list(running.items()):
+            execution = athena_client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+            status = execution['Status']
+            if status['State'] == 'SUCCEEDED':
+                del running[query_execution_id]
+                for loser in running:
+                    athena_client.stop_query_execution(QueryExecutionId=loser)
+                return sql, execution
+            if status['State'] in TERMINAL_STATES:
+                del running[query_execution_id]
+                failures.append((sql, status['State'], status.get('StateChangeReason', 'Unknown')))
+            else:
+                statistics = execution.get('Statistics')
+        remaining = deadline - clock()
+        if running and remaining <= 0:
+            for query_execution_id, sql in running.items():
+                athena_client.stop_query_execution(QueryExecutionId=query_execution_id)
+                failures.append((sql, 'CANCELLED', f'Query timed out after {timeout:.0f} seconds'))
+            break
+        if running:
+            sleep(min(poll_delay(attempt, statistics), remaining))
+            attempt += 1
+    return None, failures
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from schema_retrieval import stem
+
+# Two cache levels in front of run_sql. SQLCache maps a question to SQL that already ran
+# successfully, scoped to the database and schema version so a changed table never reuses
+# stale SQL. A question matches when its normalized text is the same, or when its content
+# words are the same in the same order once filler such as "please tell me" is dropped; one
+# different word ("ascending", "country", "returns") is a different question. Embedding
+# similarity is opt-in: it needs an embedding function and SQL_CACHE_SIMILARITY > 0, and the
+# numbers in the two questions must still agree ("top 5" never reuses the SQL for "top 10").
+# ResultCache keeps Athena result sets by SQL hash for a TTL.
+
+SQL_CACHE_SIZE = int(os.environ.get('SQL_CACHE_SIZE', '1000'))
+# Cosine threshold for reusing SQL across differently worded questions; 0 disables it
+SQL_CACHE_SIMILARITY = float(os.environ.get('SQL_CACHE_SIMILARITY', '0'))
+# Words that never change what a question asks for
+FILLER_WORDS = {'a', 'an', 'the', 'please', 'tell', 'me', 'can', 'could', 'you', 'show', 'give', 'list', 'i',
+                'want', 'to', 'know', 'us'}
+ATHENA_RESULT_TTL = int(os.environ.get('ATHENA_RESULT_TTL', '300'))
+ATHENA_RESULT_CACHE_SIZE = int(os.environ.get('ATHENA_RESULT_CACHE_SIZE', '256'))
+
+
+def normalize_question(question):
+    return " ".join(re.findall(r'[a-z0-9]+', question.lower()))
+
+
+def normalize_sql(sql):
+    return " ".join(sql.strip().rstrip(';').split())
+
+
+def question_tokens(question):
+    # Unlike schema ranking, stopwords stay: "last month" and "this month" must not collide
+    return {stem(t) for t in normalize_question(question).split()}
+
+
+def content_tokens(question):
+    return tuple(stem(t) for t in normalize_question(question).split() if t not in FILLER_WORDS)
+
+
+def sql_hash(database_name, sql):
+    return hashlib.sha256(f"{database_name}\n{normalize_sql(sql)}".encode('utf-8')).hexdigest()
+
+
+def numbers(tokens):
+    return frozenset(t for t in tokens if t.isdigit())
+
+
+class SQLCache:
+    def __init__(self, embed_fn=None, max_entries=SQL_CACHE_SIZE, similarity=SQL_CACHE_SIMILARITY):
+        self.embed_fn = embed_fn
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'content_hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0,
+                      'invalidations': 0}
+
+    @property
+    def semantic(self):
+        return self.embed_fn is not None and self.similarity > 0
+
+    def _vector(self, question):
+        if not self.semantic:
+            return None
+        vector = np.asarray(self.embed_fn([question])[0], dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def get(self, database_name, schema_version, question):
+        # Returns (sql, outcome) with outcome one of exact_hits, content_hits, semantic_hits, misses
+        key = (database_name, schema_version, normalize_question(question))
+        content = content_tokens(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return entry['sql'], 'exact_hits'
+            candidates = [(k, e) for k, e in self._entries.items() if k[:2] == key[:2]]
+            for candidate_key, entry in candidates:
+                if entry['content'] == content:
+                    self._entries.move_to_end(candidate_key)
+                    self.stats['content_hits'] += 1
+                    return entry['sql'], 'content_hits'
+
+        if candidates and self.semantic:
+            vector = self._vector(question)
+            question_numbers = numbers(question_tokens(question))
+            best_key, best_score = None, 0.0
+            for candidate_key, entry in candidates:
+                if entry['numbers'] != question_numbers or entry['vector'] is None:
+                    continue
+                score = float(vector @ entry['vector'])
+                if score >= self.similarity and score > best_score:
+                    best_key, best_score = candidate_key, score
+            with self._lock:
+                entry = self._entries.get(best_key) if best_key is not None else None
+                if entry is not None:
+                    self._entries.move_to_end(best_key)
+                    self.stats['semantic_hits'] += 1
+                    return entry['sql'], 'semantic_hits'
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None, 'misses'
+
+    def put(self, database_name, schema_version, question, sql):
+        # Only SQL that Athena ran successfully should be stored
+        vector = self._vector(question)
+        key = (database_name, schema_version, normalize_question(question))
+        with self._lock:
+            self._entries[key] = {'sql': sql, 'content': content_tokens(question),
+                                  'numbers': numbers(question_tokens(question)), 'vector': vector}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, database_name, schema_version, sql):
+        # Drops every question that maps to SQL which has stopped working
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if k[:2] == (database_name, schema_version) and e['sql'] == sql]
+            for key in stale:
+                del self._entries[key]
+            self.stats['invalidations'] += len(stale)
+
+
+class ResultCache:
+    def __init__(self, ttl_seconds=ATHENA_RESULT_TTL, max_entries=ATHENA_RESULT_CACHE_SIZE, clock=time.time):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, database_name, sql):
+        key = sql_hash(database_name, sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, database_name, sql, result):
+        if self.ttl <= 0:
+            return
+        key = sql_hash(database_name, sql)
+        with self._lock:
+            self._entries[key] = (self.clock(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
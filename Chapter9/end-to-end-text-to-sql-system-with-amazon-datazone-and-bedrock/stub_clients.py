@@ -0,0 +1,276 @@
+import datetime
+import io
+import json
+import re
+import threading
+import time
+import uuid
+
+# Local stand-ins for the boto3 clients used by tools.py. Each call sleeps for a fixed
+# latency and is counted, so benchmarks can compare call counts and wall time offline.
+
+
+class StubClient:
+    def __init__(self, latency_ms=50):
+        self.latency = latency_ms / 1000.0
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency)
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class StubPaginator:
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            if 'NextToken' not in page and 'nextToken' not in page:
+                return
+            kwargs['NextToken' if 'NextToken' in page else 'nextToken'] = page.get('NextToken', page.get('nextToken'))
+
+
+class StubGlue(StubClient):
+    def __init__(self, tables=500, columns=12, page_size=100, latency_ms=80):
+        super().__init__(latency_ms)
+        self.page_size = page_size
+        updated = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.tables = [{
+            'Name': f"{prefix}_table_{i:04d}",
+            'UpdateTime': updated,
+            'StorageDescriptor': {'Columns': [{'Name': f"column_{c}", 'Type': 'string'} for c in range(columns)]},
+            'PartitionKeys': []
+        } for i, prefix in ((i, "abcdefghijklmnopqrstuvwxyz"[i % 26]) for i in range(tables))]
+
+    @classmethod
+    def from_schemas(cls, schemas, **kwargs):
+        glue = cls(tables=0, **kwargs)
+        updated = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        glue.tables = [{
+            'Name': s['Table'],
+            'UpdateTime': updated,
+            'StorageDescriptor': {'Columns': [{'Name': c, 'Type': t} for c, t in s['Schema'].items()]},
+            'PartitionKeys': []
+        } for s in schemas]
+        return glue
+
+    def get_paginator(self, name):
+        return StubPaginator(getattr(self, name))
+
+    def get_tables(self, DatabaseName, Expression=None, NextToken=None):
+        self._call('get_tables')
+        tables = self.tables
+        if Expression:
+            pattern = re.compile(Expression)
+            tables = [t for t in tables if pattern.fullmatch(t['Name'])]
+        start = int(NextToken or 0)
+        page = {'TableList': tables[start:start + self.page_size]}
+        if start + self.page_size < len(tables):
+            page['NextToken'] = str(start + self.page_size)
+        return page
+
+
+class StubBedrockAgent(StubClient):
+    def __init__(self, knowledge_bases=300, page_size=10, target_name='TextToSQLKB', latency_ms=60):
+        super().__init__(latency_ms)
+        self.page_size = page_size
+        names = [f"kb-{i}" for i in range(knowledge_bases - 1)] + [target_name]
+        self.summaries = [{'name': name, 'knowledgeBaseId': f"KB{i:06d}"} for i, name in enumerate(names)]
+        # Bump to simulate a knowledge base sync
+        self.updated_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def get_paginator(self, name):
+        return StubPaginator(getattr(self, name))
+
+    def list_knowledge_bases(self, nextToken=None):
+        self._call('list_knowledge_bases')
+        start = int(nextToken or 0)
+        page = {'knowledgeBaseSummaries': self.summaries[start:start + self.page_size]}
+        if start + self.page_size < len(self.summaries):
+            page['nextToken'] = str(start + self.page_size)
+        return page
+
+    def get_knowledge_base(self, knowledgeBaseId):
+        self._call('get_knowledge_base')
+        return {'knowledgeBase': {'knowledgeBaseId': knowledgeBaseId, 'updatedAt': self.updated_at}}
+
+    def list_data_sources(self, knowledgeBaseId, nextToken=None):
+        self._call('list_data_sources')
+        return {'dataSourceSummaries': [{'dataSourceId': 'DS000001', 'status': 'AVAILABLE',
+                                         'updatedAt': self.updated_at}]}
+
+
+class StubBedrockAgentRuntime(StubClient):
+    # retrieve answers after latency_ms; retrieve_and_generate also waits generate_ms for the
+    # model. Results come from a pool of chunks in which neighbouring chunks repeat text, as
+    # overlapping chunks of one document do.
+    def __init__(self, chunks=200, latency_ms=150, generate_ms=2500):
+        super().__init__(latency_ms)
+        self.generate_seconds = generate_ms / 1000.0
+        self.chunks = [f"Table orders_{i // 2} stores one row per order with store_id, amount and day."
+                       for i in range(chunks)]
+
+    def _results(self, text, count):
+        start = sum(map(ord, text)) % len(self.chunks)
+        return [{'content': {'text': self.chunks[(start + i) % len(self.chunks)]},
+                 'location': {'type': 'S3', 's3Location': {'uri': f"s3://kb/doc-{(start + i) // 2}.txt"}},
+                 'score': 1.0 - i / 100} for i in range(count)]
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration=None):
+        self._call('retrieve')
+        count = (retrievalConfiguration or {}).get('vectorSearchConfiguration', {}).get('numberOfResults', 5)
+        return {'retrievalResults': self._results(retrievalQuery['text'], count)}
+
+    def retrieve_and_generate(self, input, retrieveAndGenerateConfiguration):
+        self._call('retrieve_and_generate')
+        time.sleep(self.generate_seconds)
+        results = self._results(input['text'], 5)
+        return {'output': {'text': "Generated answer"},
+                'citations': [{'retrievedReferences': results[:3]}, {'retrievedReferences': results[2:]}]}
+
+
+class StubEventStream:
+    # Mimics the EventStream body: emits a chunk every token_seconds until closed
+    def __init__(self, pieces, token_seconds):
+        self.pieces = pieces
+        self.token_seconds = token_seconds
+        self.closed = False
+        self.sent = 0
+
+    def __iter__(self):
+        for piece in self.pieces:
+            if self.closed:
+                return
+            time.sleep(self.token_seconds)
+            self.sent += 1
+            yield {'chunk': {'bytes': json.dumps({'completion': piece, 'stop_reason': None}).encode('utf-8')}}
+
+    def close(self):
+        self.closed = True
+
+
+class StubBedrockRuntime(StubClient):
+    # responder(prompt, temperature) returns the completion text for a Claude text-completion
+    # request. latency_ms is the time to first token; token_ms is added per ~4 character token.
+    def __init__(self, responder, latency_ms=800, token_ms=0):
+        super().__init__(latency_ms)
+        self.responder = responder
+        self.token_seconds = token_ms / 1000.0
+        self.streams = []
+
+    def _completion(self, body):
+        request = json.loads(body)
+        return self.responder(request['prompt'], request.get('temperature', 0))
+
+    def invoke_model(self, body, modelId, accept=None, contentType=None):
+        self._call('invoke_model')
+        completion = self._completion(body)
+        time.sleep(self.token_seconds * len(re.findall(r'.{1,4}', completion, re.DOTALL)))
+        return {'body': io.BytesIO(json.dumps({'completion': completion}).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, body, modelId, accept=None, contentType=None):
+        self._call('invoke_model_with_response_stream')
+        pieces = re.findall(r'.{1,4}', self._completion(body), re.DOTALL)
+        stream = StubEventStream(pieces, self.token_seconds)
+        self.streams.append(stream)
+        return {'body': stream}
+
+
+def stub_value(column_type, i):
+    if i % 7 == 3:
+        return None
+    if column_type in ('bigint', 'integer'):
+        return str(i)
+    if column_type == 'double':
+        return f"{i * 1.5}"
+    if column_type == 'date':
+        return (datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365)).isoformat()
+    return f"row-{i}"
+
+
+class StubAthena(StubClient):
+    # Queries run for run_seconds; error(sql) returns a failure reason or None for success
+    def __init__(self, rows=10, columns=None, run_seconds=0.0, page_size=1000, latency_ms=20, error=None,
+                 clock=time.monotonic):
+        super().__init__(latency_ms)
+        self.clock = clock
+        self.rows = rows
+        self.columns = columns or {'id': 'bigint', 'name': 'varchar', 'amount': 'double', 'day': 'date'}
+        self.run_seconds = run_seconds
+        self.page_size = page_size
+        self.error = error or (lambda sql: None)
+        self.executions = {}
+
+    def start_query_execution(self, QueryString, QueryExecutionContext=None, ResultConfiguration=None, **kwargs):
+        self._call('start_query_execution')
+        execution_id = str(uuid.uuid4())
+        output = (ResultConfiguration or {}).get('OutputLocation', 's3://stub-results/')
+        self.executions[execution_id] = {'sql': QueryString, 'started': self.clock(), 'stopped': False,
+                                         'output': f"{output.rstrip('/')}/{execution_id}.csv"}
+        return {'QueryExecutionId': execution_id}
+
+    def stop_query_execution(self, QueryExecutionId):
+        self._call('stop_query_execution')
+        self.executions[QueryExecutionId]['stopped'] = True
+        return {}
+
+    def get_query_execution(self, QueryExecutionId):
+        self._call('get_query_execution')
+        execution = self.executions[QueryExecutionId]
+        elapsed = self.clock() - execution['started']
+        status = {'State': 'RUNNING'}
+        if execution['stopped']:
+            status = {'State': 'CANCELLED', 'StateChangeReason': 'Query was cancelled'}
+        elif elapsed >= self.run_seconds:
+            reason = self.error(execution['sql'])
+            status = {'State': 'FAILED', 'StateChangeReason': reason} if reason else {'State': 'SUCCEEDED'}
+        return {'QueryExecution': {
+            'QueryExecutionId': QueryExecutionId,
+            'Query': execution['sql'],
+            'ResultConfiguration': {'OutputLocation': execution['output']},
+            'Status': status,
+            'Statistics': {'EngineExecutionTimeInMillis': int(elapsed * 1000), 'QueryQueueTimeInMillis': 0}
+        }}
+
+    def row_values(self, i):
+        return [stub_value(column_type, i) for column_type in self.columns.values()]
+
+    def get_query_results(self, QueryExecutionId, NextToken=None, MaxResults=None):
+        self._call('get_query_results')
+        page_size = min(MaxResults or self.page_size, self.page_size)
+        start = int(NextToken or 0)
+        rows = []
+        if start == 0:
+            rows.append({'Data': [{'VarCharValue': c} for c in self.columns]})
+        end = min(start + page_size - len(rows), self.rows)
+        for i in range(start, end):
+            rows.append({'Data': [{} if v is None else {'VarCharValue': v} for v in self.row_values(i)]})
+        result = {'ResultSet': {
+            'Rows': rows,
+            'ResultSetMetadata': {'ColumnInfo': [{'Name': c, 'Type': t} for c, t in self.columns.items()]}
+        }}
+        if end < self.rows:
+            result['NextToken'] = str(end)
+        return result
+
+
+class StubS3(StubClient):
+    # Serves the CSV result objects of a StubAthena in Athena's format (NULL as empty field)
+    def __init__(self, athena, latency_ms=20):
+        super().__init__(latency_ms)
+        self.athena = athena
+
+    def get_object(self, Bucket, Key):
+        self._call('get_object')
+        lines = [",".join(f'"{c}"' for c in self.athena.columns)]
+        for i in range(self.athena.rows):
+            lines.append(",".join('' if v is None else f'"{v}"' for v in self.athena.row_values(i)))
+        return {'Body': io.BytesIO(("\n".join(lines) + "\n").encode('utf-8'))}
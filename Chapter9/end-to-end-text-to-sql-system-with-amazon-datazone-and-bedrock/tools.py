@@ -1,26 +1,91 @@
 import json
 import boto3
 from botocore.client import Config
-import time
 import logging
 import os
 
+from model_invocation import claude_request, invoke_completion, run_async, runtime_config, stream_completion
+from athena_results import iter_csv_rows, iter_result_rows, read_rows, rows_json, wait_for_query
+
+from schema_cache import SchemaCache
+from schema_retrieval import SCHEMA_TOP_K, SchemaIndexCache, format_schema
+from speculative_sql import SQL_CANDIDATES, SQL_PARALLEL_RUNS, generate_candidates, race_queries, rank_candidates
+from sql_cache import ResultCache, SQLCache
+from reference_cache import ReferenceCache, dedupe_references, knowledge_base_version
+
 # Initialize AWS clients
 region = 'us-west-2'
 outputLocation = os.environ.get('outputLocation', 's3://<YOUR_OUTPUT_BUCKET_NAME_HERE>/')
+# Athena-side reuse of earlier results for identical SQL (engine v3); 0 disables it
+resultReuseMinutes = int(os.environ.get('ATHENA_RESULT_REUSE_MINUTES', '0'))
+# Read results from the CSV object in S3 instead of paging get_query_results
+readResultsFromS3 = os.environ.get('ATHENA_READ_CSV', '0') == '1'
+# Upper bound on rows returned to the agent, whose action group response has a size limit;
+# 0 returns every row
+maxResultRows = int(os.environ.get('ATHENA_MAX_ROWS', '1000'))
 kbName = os.environ.get('kbName', 'TextToSQLKB')
+# Stream Claude completions (needs bedrock:InvokeModelWithResponseStream) so SQL generation
+# can stop at the end of the statement
+streamResponses = os.environ.get('MODEL_STREAMING', '0') == '1'
+sqlMaxTokens = int(os.environ.get('SQL_MAX_TOKENS', '1024'))
+# Knowledge base lookups: 'retrieve' fetches the top-k chunks only; 'generate' is the
+# retrieve_and_generate call, which also runs a model whose answer is thrown away.
+# The retrieve mode needs bedrock:Retrieve, and the reference cache also reads the knowledge
+# base version with bedrock:GetKnowledgeBase and bedrock:ListDataSources
+kbRetrievalMode = os.environ.get('KB_RETRIEVAL_MODE', 'retrieve')
+kbTopK = int(os.environ.get('KB_TOP_K', '5'))
 
 datazone = boto3.client('datazone', region_name=region)
 athena_client = boto3.client('athena', region_name=region)
 glue_client = boto3.client('glue', region_name=region)
-bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+s3_client = boto3.client('s3', region_name=region)
+bedrock_runtime = boto3.client('bedrock-runtime', config=runtime_config(), region_name=region)
 bedrock_config = Config(connect_timeout=120, read_timeout=120, retries={'max_attempts': 0})
-bedrock_agent_runtime_client = boto3.client("bedrock-agent-runtime", config=bedrock_config, region_name=region)
-bedrock_agent_client = boto3.client('bedrock-agent', region_name=region)
+# The knowledge base clients are only needed for reference lookups, so they are created on
+# first use instead of during the Lambda cold start
+bedrock_agent_runtime_client = None
+bedrock_agent_client = None
+
+def get_bedrock_agent_runtime_client():
+    global bedrock_agent_runtime_client
+    if bedrock_agent_runtime_client is None:
+        bedrock_agent_runtime_client = boto3.client("bedrock-agent-runtime", config=bedrock_config, region_name=region)
+    return bedrock_agent_runtime_client
+
+def get_bedrock_agent_client():
+    global bedrock_agent_client
+    if bedrock_agent_client is None:
+        bedrock_agent_client = boto3.client('bedrock-agent', region_name=region)
+    return bedrock_agent_client
+
+# Glue schemas and the knowledge base id are cached with a TTL; with SCHEMA_CACHE_PATH set to
+# an s3:// URI or an EFS file, freshly started containers skip the listing calls too
+schema_cache = SchemaCache(glue_client, s3_client=s3_client)
+
+# Optional embedding model (e.g. amazon.titan-embed-text-v1) fused with the lexical schema ranking
+schema_embedding_model = os.environ.get('SCHEMA_EMBEDDING_MODEL', '')
+
+def embed_texts(texts):
+    vectors = []
+    for text in texts:
+        response = bedrock_runtime.invoke_model(
+            body=json.dumps({"inputText": text}), modelId=schema_embedding_model,
+            accept="application/json", contentType="application/json"
+        )
+        vectors.append(json.loads(response.get("body").read())["embedding"])
+    return vectors
 
-# Get Knowledge Base ID
-def get_knowledge_base_id():
-    paginator = bedrock_agent_client.get_paginator('list_knowledge_bases')
+schema_indexes = SchemaIndexCache(embed_texts if schema_embedding_model else None)
+
+# Validated SQL per question and schema version, and Athena results per SQL hash
+sql_cache = SQLCache(embed_texts if schema_embedding_model else None)
+result_cache = ResultCache()
+
+# Knowledge base references per question and knowledge base version
+reference_cache = ReferenceCache()
+
+def find_knowledge_base_id():
+    paginator = get_bedrock_agent_client().get_paginator('list_knowledge_bases')
     response_iterator = paginator.paginate()
     for page in response_iterator:
         for kb in page['knowledgeBaseSummaries']:
@@ -28,12 +93,32 @@ def get_knowledge_base_id():
                 return kb['knowledgeBaseId']
     return None
 
-knowledge_base_id = get_knowledge_base_id()
-
-def fetch_knowledge_base_references(query_text, model_identifier="anthropic.claude-v2", region_code=region):
-    model_arn = f'arn:aws:bedrock:{region_code}::foundation-model/{model_identifier}'
+# Get Knowledge Base ID, resolved on first use rather than at import
+def get_knowledge_base_id():
+    return schema_cache.get_metadata(f"knowledge_base_id:{kbName}", find_knowledge_base_id)
+
+def get_knowledge_base_version(knowledge_base_id):
+    # Refreshed with the schema cache TTL. A failed lookup (e.g. no permission to describe the
+    # knowledge base) is cached as 'unknown' for that TTL too, rather than retried on every
+    # request; the references are then only bounded by their own TTL
+    def load():
+        try:
+            return knowledge_base_version(get_bedrock_agent_client(), knowledge_base_id)
+        except Exception as error:
+            print(f"Error fetching knowledge base version: {error}")
+            return 'unknown'
+    return schema_cache.get_metadata(f"knowledge_base_version:{knowledge_base_id}", load)
+
+def retrieve_references(query_text, knowledge_base_id, top_k):
+    response = get_bedrock_agent_runtime_client().retrieve(
+        knowledgeBaseId=knowledge_base_id,
+        retrievalQuery={'text': query_text},
+        retrievalConfiguration={'vectorSearchConfiguration': {'numberOfResults': top_k}}
+    )
+    return [result.get("content", {}).get("text", "") for result in response.get("retrievalResults", [])]
 
-    response = bedrock_agent_runtime_client.retrieve_and_generate(
+def generate_references(query_text, knowledge_base_id, model_arn):
+    response = get_bedrock_agent_runtime_client().retrieve_and_generate(
         input={'text': query_text},
         retrieveAndGenerateConfiguration={
             'type': 'KNOWLEDGE_BASE',
@@ -55,98 +140,120 @@ def fetch_knowledge_base_references(query_text, model_identifier="anthropic.clau
 
     return reference_texts
 
+def fetch_knowledge_base_references(query_text, model_identifier="anthropic.claude-v2", region_code=region,
+                                    top_k=None, mode=None):
+    mode = mode or kbRetrievalMode
+    top_k = top_k or kbTopK
+    knowledge_base_id = get_knowledge_base_id()
+    model_arn = f'arn:aws:bedrock:{region_code}::foundation-model/{model_identifier}'
+    scope = (knowledge_base_id, get_knowledge_base_version(knowledge_base_id), mode,
+             top_k if mode == 'retrieve' else model_arn)
+
+    references = reference_cache.get(scope, query_text)
+    if references is not None:
+        return references
+    if mode == 'retrieve':
+        references = retrieve_references(query_text, knowledge_base_id, top_k)
+    else:
+        references = generate_references(query_text, knowledge_base_id, model_arn)
+    references = dedupe_references(references)
+    reference_cache.put(scope, query_text, references)
+    return references
+
 def format_claude_prompt(prompt_text: str) -> str:
     return f"\n\nHuman: {prompt_text}\n\nAssistant:"
 
-def invoke_claude(prompt_text):
-    # Configuration for the prompt
-    prompt_settings = {
-        "prompt": format_claude_prompt(prompt_text),
-        "max_tokens_to_sample": 4096,
-        "temperature": 0,
-        "top_k": 250,
-        "top_p": 0.999,
-        "stop_sequences": [],
-    }
-
-    # Convert the configuration to a JSON string
-    request_body = json.dumps(prompt_settings)
-
+def invoke_claude(prompt_text, temperature=0, max_tokens=4096, stop_at_statement_end=False):
+    # Convert the prompt configuration to a JSON string
+    request_body = claude_request(format_claude_prompt(prompt_text), max_tokens, temperature)
     model_id = "anthropic.claude-v2"
-    accept_format = "application/json"
-    content_type = "application/json"
 
-    response = bedrock_runtime.invoke_model(
-        body=request_body, modelId=model_id, accept=accept_format, contentType=content_type
-    )
+    if streamResponses:
+        return stream_completion(bedrock_runtime, model_id, request_body, stop_at_statement_end)
+    return invoke_completion(bedrock_runtime, model_id, request_body)
 
-    response_content = json.loads(response.get("body").read())
-    completion_results = response_content.get("completion")
-    return completion_results
+async def invoke_claude_async(prompt_text, **kwargs):
+    return await run_async(invoke_claude, prompt_text, **kwargs)
 
 def fetch_table_schema(database_name):
     try:
-        schemas = []
-
-        tables_response = glue_client.get_tables(DatabaseName=database_name)
-        table_list = tables_response.get('TableList', [])
-
-        for table in table_list:
-            table_name = table['Name']
-            columns = table['StorageDescriptor']['Columns']
-            schema = {column['Name']: column['Type'] for column in columns}
-            schemas.append({"Table": table_name, "Schema": schema})
-
-        return schemas
+        return schema_cache.get_schemas(database_name)
 
     except Exception as error:
         print(f"Error fetching table schema: {error}")
         return []
 
-def run_athena_query(database_name, query_string):
+def select_schema(database_name, query):
+    # Only the tables and columns relevant to the question go into the prompt
+    schemas = fetch_table_schema(database_name)
+    if SCHEMA_TOP_K <= 0 or not schemas:
+        return schemas
     try:
-        response = athena_client.start_query_execution(
-            QueryString=query_string,
-            QueryExecutionContext={'Database': database_name},
-            ResultConfiguration={'OutputLocation': outputLocation}
-        )
+        version = schema_cache.get_schema_version(database_name)
+        return schema_indexes.get(database_name, version, schemas).select(query)
+    except Exception as error:
+        print(f"Error selecting schema, using all tables: {error}")
+        return schemas
 
-        query_execution_id = response['QueryExecutionId']
+def start_athena_query(database_name, query_string):
+    request = {
+        'QueryString': query_string,
+        'QueryExecutionContext': {'Database': database_name},
+        'ResultConfiguration': {'OutputLocation': outputLocation}
+    }
+    if resultReuseMinutes > 0:
+        request['ResultReuseConfiguration'] = {
+            'ResultReuseByAgeConfiguration': {'Enabled': True, 'MaxAgeInMinutes': resultReuseMinutes}
+        }
+    response = athena_client.start_query_execution(**request)
+    return response['QueryExecutionId']
+
+def read_query_results(query_execution):
+    return read_rows(stream_query_results(query_execution), maxResultRows)
+
+def format_sql_response(sql, sql_results):
+    # Body of the /run_sql action group response; rows are sent as JSON, errors as text
+    if not isinstance(sql_results, list):
+        return {"generated_sql_query": str(sql), "sql_query_results": str(sql_results)}
+    body = {"generated_sql_query": str(sql), "sql_query_results": rows_json(sql_results)}
+    if getattr(sql_results, 'truncated', False):
+        body["sql_query_results_truncated"] = (f"Only the first {len(sql_results)} rows are included; "
+                                               "aggregate or filter the query to see the rest.")
+    return body
 
-        # Wait for the query to complete
-        while True:
-            query_status = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-            status = query_status['QueryExecution']['Status']['State']
+def run_athena_query(database_name, query_string):
+    try:
+        query_execution_id = start_athena_query(database_name, query_string)
 
-            if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                break
-            time.sleep(2)
+        # Wait for the query to complete, backing off between polls up to the deadline
+        query_execution = wait_for_query(athena_client, query_execution_id)
+        status = query_execution['Status']['State']
 
         if status == 'SUCCEEDED':
-            result = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-            return 'SUCCEEDED', result
+            return 'SUCCEEDED', read_query_results(query_execution)
         else:
-            reason = query_status['QueryExecution']['Status'].get('StateChangeReason', 'Unknown')
+            reason = query_execution['Status'].get('StateChangeReason', 'Unknown')
             return status, reason
 
     except Exception as error:
         return 'ERROR', f'Error running Athena query: {error}'
 
-def parse_query_results(query_results):
-    parsed_data = []
-    result_set = query_results.get('ResultSet', {})
-    rows = result_set.get('Rows', [])
-    columns_metadata = result_set.get('ResultSetMetadata', {}).get('ColumnInfo', [])
-    columns = [col['Name'] for col in columns_metadata]
-
-    for row in rows[1:]:  # Skip header row
-        data = row.get('Data', [])
-        row_data = [field.get('VarCharValue', '') for field in data]
-        parsed_data.append(dict(zip(columns, row_data)))
+def run_cached_athena_query(database_name, query_string):
+    result = result_cache.get(database_name, query_string)
+    if result is not None:
+        return 'SUCCEEDED', result
+    code, result = run_athena_query(database_name, query_string)
+    if code == 'SUCCEEDED':
+        result_cache.put(database_name, query_string, result)
+    return code, result
 
-    return parsed_data
+def stream_query_results(query_execution):
+    # Generator over every result row, typed from the ColumnInfo of the result set
+    if readResultsFromS3:
+        return iter_csv_rows(athena_client, s3_client, query_execution)
+    return iter_result_rows(athena_client, query_execution['QueryExecutionId'])
 
-def generate_sql(query, sql_error_message="", db="", schema=""):
+def generate_sql(query, sql_error_message="", db="", schema="", temperature=0):
     details = """It is important that the SQL query complies with Athena (Presto) syntax.
     Use date functions compatible with Athena. For example, use date_add('month', -n, date) to subtract months.
     Ensure that column names and table names are correct."""
@@ -172,33 +279,85 @@ def generate_sql(query, sql_error_message="", db="", schema=""):
         "{query}"
 
         Respond with only the SQL query and nothing else."""
-    sql = invoke_claude(prompt)
+    sql = invoke_claude(prompt, temperature, max_tokens=sqlMaxTokens, stop_at_statement_end=True)
     database = db if db else 'sql-db'
     return database, schema, sql
 
+def run_speculative_sql(query, sql_error_message, database_name, schema):
+    # Generates SQL_CANDIDATES queries at once, drops those that fail the local schema check
+    # and races the first SQL_PARALLEL_RUNS on Athena; returns (sql, code, results or reason)
+    candidates = generate_candidates(
+        lambda temperature: generate_sql(query, sql_error_message, database_name, schema, temperature)[2],
+        SQL_CANDIDATES)
+    table_names = [s['Table'] for s in fetch_table_schema(database_name)]
+    valid, rejected = rank_candidates(candidates, table_names)
+    if not valid:
+        sql, reason = rejected[0]
+        return sql, 'INVALID', reason
+
+    for sql in valid:
+        result = result_cache.get(database_name, sql)
+        if result is not None:
+            return sql, 'SUCCEEDED', result
+    try:
+        sql, outcome = race_queries(athena_client, lambda s: start_athena_query(database_name, s),
+                                    valid[:SQL_PARALLEL_RUNS])
+        if sql is None:
+            return outcome[0]
+        result = read_query_results(outcome)
+    except Exception as error:
+        return valid[0], 'ERROR', f'Error running Athena query: {error}'
+    result_cache.put(database_name, sql, result)
+    return sql, 'SUCCEEDED', result
+
+def generate_and_run_sql(query, sql_error_message, database_name, schema):
+    if SQL_CANDIDATES > 1:
+        sql, code, sql_results = run_speculative_sql(query, sql_error_message, database_name, schema)
+        return database_name, schema, sql, code, sql_results
+    database_name, schema, sql = generate_sql(query, sql_error_message, database_name, schema)
+    code, sql_results = run_cached_athena_query(database_name, sql)
+    return database_name, schema, sql, code, sql_results
+
 
 def run_sql(query):
     database = 'sql-db'  # Replace with your actual database name
-    # Fetch the schema from Glue
-    schemas = fetch_table_schema(database)
+    try:
+        schema_version = schema_cache.get_schema_version(database)
+    except Exception as error:
+        print(f"Error fetching schema version, SQL cache disabled: {error}")
+        schema_version = None
+
+    # SQL generated earlier for the same (or a near-identical) question skips the model
+    if schema_version is not None:
+        sql, _ = sql_cache.get(database, schema_version, query)
+        if sql is not None:
+            code, sql_results = run_cached_athena_query(database, sql)
+            if code == 'SUCCEEDED':
+                return sql, sql_results
+            sql_cache.invalidate(database, schema_version, sql)
+
+    # Fetch the schema from Glue, pruned to the tables relevant to the question
+    schemas = select_schema(database, query)
     print(schemas)
     # Construct the schema information string
-    schema_info = "\n".join([f"Table {s['Table']}: {s['Schema']}" for s in schemas])
+    schema_info = format_schema(schemas)
 
     # Generate the SQL query using the schema
-    database, sql_schema, sql = generate_sql(query, schema=schema_info)
-    code, sql_results = run_athena_query(database, sql)
+    database, sql_schema, sql, code, sql_results = generate_and_run_sql(query, "", database, schema_info)
     retry_max = 3
     retry_counter = 0
 
     while code != 'SUCCEEDED' and retry_counter < retry_max:
         sql_error_message = f"Error: {sql_results}"
-        database, sql_schema, sql = generate_sql(query, sql_error_message, database, sql_schema)
-        code, sql_results = run_athena_query(database, sql)
+        if retry_counter == 0 and SCHEMA_TOP_K > 0:
+            # The pruned schema may have missed a table; corrections see the full schema
+            sql_schema = format_schema(fetch_table_schema(database))
+        database, sql_schema, sql, code, sql_results = generate_and_run_sql(query, sql_error_message, database, sql_schema)
         retry_counter += 1
 
     if code == 'SUCCEEDED':
-        parsed_results = parse_query_results(sql_results)
-        return sql, parsed_results
+        if schema_version is not None:
+            sql_cache.put(database, schema_version, query, sql)
+        return sql, sql_results
     else:
         return sql, sql_results
@@ -0,0 +1,89 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, '..', 'Chapter3', 'bedrock_food_recommender'))
+
+import instrumentation
+from instrumentation import registry, timer
+
+# Overhead of the instrumentation: the raw cost of one timed stage, and end-to-end on the
+# food recommender's /suggest_food with a zero-latency stub model (the worst case, since a
+# real model call dwarfs everything measured here). Runs alternate between metrics on and
+# off so drift affects both equally.
+
+
+class StubBedrockRuntime:
+    def invoke_model(self, body, modelId, accept=None, contentType=None, **kwargs):
+        text = "Try a Thai green curry with jasmine rice."
+        return {'body': io.BytesIO(json.dumps({'completions': [{'data': {'text': text}}]}).encode('utf-8'))}
+
+
+def timer_cost(iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    empty = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with timer("micro"):
+            pass
+    return (time.perf_counter() - start - empty) / iterations * 1e9
+
+
+def request_batch(client, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        client.post('/suggest_food', json={'user_input': f"What should I eat? {i}"})
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=7)
+    args = parser.parse_args()
+
+    cost = timer_cost(200_000)
+    print(f"timer(): {cost:.0f} ns per timed stage")
+
+    from langchain.llms.bedrock import Bedrock
+    import food_recommender
+    food_recommender.ai21_llm = Bedrock(model_id="ai21.j2-ultra", client=StubBedrockRuntime(),
+                                        model_kwargs={"maxTokens": 500, 'temperature': 1.0, 'topP': 0.9})
+
+    def run(enabled, verbose, profile=False):
+        instrumentation.METRICS_ENABLED = enabled
+        food_recommender.VERBOSE_PROMPTS = verbose
+        food_recommender.create_conversation.__globals__['VERBOSE_PROMPTS'] = verbose
+        food_recommender.sessions = food_recommender.SessionStore(food_recommender.create_conversation)
+        if profile:
+            instrumentation.profiler.start()
+        client = food_recommender.app.test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = request_batch(client, args.requests)
+        if profile:
+            instrumentation.profiler.stop()
+        return result
+
+    run(True, False)  # warm up
+    results = {'off': [], 'on': [], 'on+profiler': [], 'verbose': []}
+    for _ in range(args.rounds):
+        results['off'].append(run(False, False))
+        results['on'].append(run(True, False))
+        results['on+profiler'].append(run(True, False, profile=True))
+        results['verbose'].append(run(True, True))
+    baseline = statistics.median(results['off'])
+    for label, values in results.items():
+        median = statistics.median(values)
+        print(f"/suggest_food {label:<12} {median:8.1f} us/request ({(median - baseline) / baseline:+.2%})")
+    # Run-to-run noise is larger than the effect, so also derive it from the measured cost:
+    # each request records two stages (the request itself and the llm call)
+    print(f"estimated overhead: {2 * cost / 1000 / baseline:.3%} of a request")
+    print(f"llm p50/p99 from the histogram: {registry.percentiles()['llm']}")
@@ -0,0 +1,266 @@
+import bisect
+import collections
+import inspect
+import os
+import sys
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Lightweight timing shared by the Flask and Gradio samples. Each stage (embedding, search,
+# render, llm, ...) records into a fixed-bucket histogram: one perf_counter pair, a bisect
+# and two additions under a lock per observation. Metrics are exported in the Prometheus
+# text format, percentiles are estimated from the buckets, and an optional sampling
+# profiler collects stacks from a background thread without tracing every call.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# VERBOSE_PROMPTS=0 stops LangChain chains from printing the full prompt of every request
+VERBOSE_PROMPTS = os.getenv('VERBOSE_PROMPTS', '0') == '1'
+PROFILE_SAMPLING = os.getenv('PROFILE_SAMPLING', '0') == '1'
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '10'))
+# The standalone metrics server also serves /profile, so it stays on loopback unless asked
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PREFIX = 'app'
+
+# Seconds; log-spaced from 1 ms to 60 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def percentile(self, pct):
+        # Linear interpolation inside the bucket that holds the requested rank
+        counts, _, count = self.snapshot()
+        if count == 0:
+            return float('nan')
+        rank = pct / 100.0 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.stages = {}
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram())
+        return histogram
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def snapshot(self):
+        # Request threads add stages and counters while these are read
+        with self._lock:
+            return sorted(self.stages.items()), sorted(self.counters.items())
+
+    def percentiles(self, pcts=(50, 95, 99)):
+        stages, _ = self.snapshot()
+        return {stage: {f"p{p}": histogram.percentile(p) for p in pcts} for stage, histogram in stages}
+
+    def render_prometheus(self):
+        name = f"{METRICS_PREFIX}_stage_seconds"
+        stages, counters = self.snapshot()
+        lines = [f"# HELP {name} Time spent per request stage", f"# TYPE {name} histogram"]
+        for stage, histogram in stages:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        quantile_name = f"{METRICS_PREFIX}_stage_seconds_estimate"
+        lines.append(f"# TYPE {quantile_name} gauge")
+        for stage, values in self.percentiles().items():
+            for key, value in values.items():
+                lines.append(f'{quantile_name}{{stage="{stage}",quantile="0.{key[1:]}"}} {value}')
+        for counter, value in counters:
+            lines.append(f"# TYPE {METRICS_PREFIX}_{counter}_total counter")
+            lines.append(f"{METRICS_PREFIX}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class timer:
+    # Context manager for one stage; a class rather than @contextmanager, which costs a
+    # generator per use
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        if METRICS_ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            registry.observe(self.stage, time.perf_counter() - self.start)
+
+
+def timed(stage):
+    # Decorator form of timer() for plain and async functions
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    registry.observe(stage, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    # Samples the stacks of all other threads every interval and counts collapsed stacks
+    # ("outer;inner;leaf"), the input format of flame graph tools
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS, max_depth=40):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self.stacks.update(stacks)
+                self.samples += 1
+
+    def report(self, top=50):
+        with self._lock:
+            common = self.stacks.most_common(top)
+        return "\n".join(f"{stack} {count}" for stack, count in common) + "\n"
+
+
+profiler = SamplingProfiler()
+if PROFILE_SAMPLING:
+    profiler.start()
+
+
+def register_flask(app):
+    # Times every request and serves /metrics (and /profile when sampling is on)
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        start = g.pop('request_start', None)
+        if start is not None and METRICS_ENABLED and request.endpoint not in ('metrics', 'profile'):
+            # Streamed bodies are still being produced here; this is the time to headers
+            registry.observe(f"request_{request.endpoint}", time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/profile')
+    def profile():
+        return Response(profiler.report(), mimetype='text/plain')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/metrics'):
+            body = registry.render_prometheus()
+        elif self.path.startswith('/profile'):
+            body = profiler.report()
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    # For apps whose server we do not control (Gradio): /metrics on a separate port
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server